@@ -1,7 +1,34 @@
 from http.server import BaseHTTPRequestHandler
 import json
+import os
+import sys
 from datetime import datetime
 
+# Answer from the catalog when the main function is unavailable
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, backend_dir)
+
+from answers import render_catalog_answer
+
+HIGH_DEMAND = "I'm currently experiencing high demand. Please try again in a moment."
+
+try:
+    from snapshot import load_catalog
+    CATALOG = load_catalog(os.path.join(backend_dir, 'data', 'context.csv'))
+except Exception as e:
+    print(f"Fallback could not load the catalog: {str(e)}")
+    CATALOG = None
+
+def catalog_answer(message):
+    """The top catalog matches for the message, or the plain high-demand reply"""
+    if CATALOG is None or not message:
+        return HIGH_DEMAND
+    try:
+        return render_catalog_answer(CATALOG.records(CATALOG.search(message, limit=5)))
+    except Exception as e:
+        print(f"Fallback search failed: {str(e)}")
+        return HIGH_DEMAND
+
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
         self.send_response(200)
@@ -18,13 +45,17 @@ class handler(BaseHTTPRequestHandler):
     def do_POST(self):
         content_length = int(self.headers['Content-Length'])
         post_data = self.rfile.read(content_length)
+        try:
+            message = json.loads(post_data).get('message', '')
+        except Exception:
+            message = ''
         
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
         self.end_headers()
         
-        # Simple fallback response
+        # Answer from the catalog without a model call
         response = {
-            "response": "I'm currently experiencing high demand. Please try again in a moment."
+            "response": catalog_answer(message)
         }
         self.wfile.write(json.dumps(response).encode()) 
\ No newline at end of file
@@ -1,103 +1,244 @@
+import time
+_startup_started = time.perf_counter()
+
 from http.server import BaseHTTPRequestHandler
+import hmac
 import json
 import os
-import csv
+import sys
 from datetime import datetime
 import urllib.request
 import urllib.parse
 
-# Instead of pandas, use basic CSV processing
-NEWSLETTERS = []
+# Shared catalog modules live next to the FastAPI backend
+script_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(script_dir, '..', 'backend')
+sys.path.insert(0, backend_dir)
+
+from catalog import Catalog
+from catalog_manager import CatalogManager
+from readiness import StartupReport
+from streaming import SSE_HEADERS, iter_openai_deltas, sse_event
+from response_cache import ResponseCache, cache_key
+from newsletter_query import handle_query
+from timing import StageTimer, stage
+from static_assets import StaticAssets
+from metrics import CONTENT_TYPE, REQUEST_ID_HEADER, PipelineMetrics, request_id
+from deadline import CHAT_DEADLINE_SECONDS, DEADLINE_RESERVE_SECONDS, Deadline, LatencyWindow, hedged_sync, stage_timeout
+from answers import render_catalog_answer
+from context_packer import count_tokens
+from rate_limiter import TokenBudget
+from intent_router import IntentRouter
+
+# Time each cold-start stage
+STARTUP = StartupReport(started=_startup_started)
+STARTUP.record('import', time.perf_counter() - _startup_started)
+
+# Load the prebuilt snapshot (memory-mapped) or fall back to parsing the CSV
 try:
     # Get the absolute path to the CSV file
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    csv_path = os.path.join(script_dir, '..', 'backend', 'data', 'context.csv')
-    
-    # Load CSV data without pandas
-    with open(csv_path, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            NEWSLETTERS.append(row)
-    print(f"Successfully loaded {len(NEWSLETTERS)} newsletters")
+    csv_path = os.path.join(backend_dir, 'data', 'context.csv')
+    # Deployed bundles are immutable, so polling is opt-in; /api/admin/reload always works
+    CATALOGS = CatalogManager(csv_path, poll_interval=float(os.environ.get('CATALOG_POLL_SECONDS', '0')), report=STARTUP)
+    print(f"Successfully loaded {len(CATALOGS.current)} newsletters")
 except Exception as e:
     print(f"Error loading CSV: {str(e)}")
     # Provide some default data if CSV loading fails
-    NEWSLETTERS = [
-        {"Name": "Sample Tech Newsletter", "Category": "Tech", "Subscribers": "10000", "Price": "$500"},
-        {"Name": "Sample Finance Newsletter", "Category": "Finance & Investing", "Subscribers": "5000", "Price": "$300"}
-    ]
+    CATALOGS = CatalogManager(csv_path, catalog=Catalog([
+        {"Newsletter Name": "Sample Tech Newsletter", "Category": "Tech", "Subscribers": "10000", "One Send Price": "$500"},
+        {"Newsletter Name": "Sample Finance Newsletter", "Category": "Finance & Investing", "Subscribers": "5000", "One Send Price": "$300"}
+    ]), poll_interval=0)
+CATALOGS.start()
+
+# Count row tokens and pack the per-category context blocks before the first request,
+# unless the snapshot already carried them
+with STARTUP.stage('context_blocks'):
+    CATALOGS.current.context_blocks
+
+# Read the frontend pages once per instance; encodings load or compress on first request
+with STARTUP.stage('static_assets'):
+    STATIC_ASSETS = StaticAssets(os.path.join(script_dir, '..', 'frontend'))
+STARTUP.finish()
+
+# Answers for repeat questions survive across requests on a warm instance
+RESPONSE_CACHE = ResponseCache(
+    max_entries=int(os.environ.get('RESPONSE_CACHE_SIZE', '512')),
+    ttl=float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '3600'))
+)
+RESPONSE_CACHE.sync_version(CATALOGS.current.version)
+CATALOGS.subscribe(lambda catalog: RESPONSE_CACHE.sync_version(catalog.version))
+print(f"Startup timings: {STARTUP.summary()}")
+
+# Stage latencies, token counts, cache hits and LLM errors, served on /metrics
+METRICS = PipelineMetrics()
+METRICS.registry.gauge('response_cache_entries', "Answers held in the response cache.",
+                       lambda: RESPONSE_CACHE.stats()["entries"])
+
+# Rank this many rows, then pack as many as fit in the prompt's token budget
+CONTEXT_MAX_ROWS = int(os.environ.get('CONTEXT_MAX_ROWS', '40'))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', '1500'))
+# keyword, semantic or hybrid; see catalog.RETRIEVAL_MODES
+RETRIEVAL_MODE = os.environ.get('RETRIEVAL_MODE', 'hybrid')
+
+# List and lookup questions are answered from templates without a model call
+INTENT_ROUTER = IntentRouter()
+
+def route_message(catalog, message):
+    """Return a templated answer for list and lookup questions, or None to ask the model"""
+    with stage('route'):
+        routed = INTENT_ROUTER.route(catalog, message)
+    if INTENT_ROUTER.enabled:
+        METRICS.intent_route(routed.intent if routed else None)
+    return routed.text if routed else None
+
+def search_newsletters(catalog, query, category=None, limit=20):
+    """Return the row indices of the newsletters matching the query's filters, ranked by relevance"""
+    return catalog.search(query, category=category, limit=limit, mode=RETRIEVAL_MODE)
 
-def search_newsletters(query, category=None):
-    """Simple search function to replace pandas filtering"""
-    results = []
-    query = query.lower()
+def build_context(catalog, query, category=None):
+    """Pack the most relevant newsletters into a compact table within the token budget.
+
+    Returns the table and the ranked newsletters, which a degraded answer is rendered from.
+    """
+    indices = search_newsletters(catalog, query, category, limit=CONTEXT_MAX_ROWS)
+    # Prebuilt per catalog version: row token costs, and whole blocks for category-only rankings
+    context = catalog.context_blocks.pack(indices, category, CONTEXT_TOKEN_BUDGET)
+    return context.text, catalog.records(indices)
+
+# Model calls never outlive the request's deadline; this caps them when none is set
+LLM_TIMEOUT_SECONDS = float(os.environ.get('LLM_TIMEOUT_SECONDS', '30'))
+# Recent answer latencies decide when a slow call gets a hedged backup
+LLM_LATENCY = LatencyWindow()
+# This instance's share of the tokens-per-minute quota; hedges only run while it has room
+RATE_LIMIT_TOKENS_PER_MINUTE = float(os.environ.get('RATE_LIMIT_TOKENS_PER_MINUTE', '20000'))
+LLM_BUDGET = TokenBudget(RATE_LIMIT_TOKENS_PER_MINUTE, RATE_LIMIT_TOKENS_PER_MINUTE / 60.0)
+ANSWER_MAX_TOKENS = 500
+
+def build_openai_request(message, context=None, stream=False):
+    """Build the chat completion request for the OpenAI API"""
+    api_key = os.environ.get('OPENAI_API_KEY')
+    if not api_key:
+        raise ValueError("OpenAI API key not found in environment variables.")
     
-    for newsletter in NEWSLETTERS:
-        # Filter by category if specified
-        if category and newsletter.get('Category') != category:
-            continue
-        
-        # Simple keyword matching
-        if (query in newsletter.get('Name', '').lower() or 
-            query in newsletter.get('Description', '').lower() or
-            query in newsletter.get('Category', '').lower()):
-            results.append(newsletter)
+    # OPENAI_BASE_URL points the handler at a proxy or the benchmark stub
+    url = os.environ.get('OPENAI_BASE_URL', 'https://api.openai.com/v1').rstrip('/') + "/chat/completions"
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+    
+    # Prepare the prompt
+    system_message = "You are a helpful AI assistant that provides information about newsletters. Format the response in a clear, structured way with categories, subscriber counts, prices, and audience information. Always include this disclaimer at the end of your response: 'Keep in mind these subscriber numbers and starting prices are approximate.\n\n**For specific details, past performance data, newsletter funnel tips, and a FREE Custom Proposal**, pick a time to speak to a representative. [Click Here](https://sponsorindex.setmore.com)'"
+    
+    # Add context if available
+    if context:
+        context_str = f"Here's information about some newsletters that might be relevant to your question:\n{context}"
+        message = f"{message}\n\nContext: {context_str}"
     
-    return results[:20]  # Limit to 20 results
+    data = {
+        "model": "gpt-3.5-turbo",
+        "messages": [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": message}
+        ],
+        "max_tokens": ANSWER_MAX_TOKENS
+    }
+    if stream:
+        data["stream"] = True
+        # The final chunk then carries the request's token usage
+        data["stream_options"] = {"include_usage": True}
+    
+    return urllib.request.Request(
+        url, 
+        data=json.dumps(data).encode('utf-8'),
+        headers=headers,
+        method='POST'
+    )
 
-def call_openai_api(message, context=None):
-    """Make a call to OpenAI API"""
-    try:
-        api_key = os.environ.get('OPENAI_API_KEY')
-        if not api_key:
-            return "Error: OpenAI API key not found in environment variables."
-        
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
-        
-        # Prepare the prompt
-        system_message = "You are a helpful AI assistant that provides information about newsletters. Format the response in a clear, structured way with categories, subscriber counts, prices, and audience information. Always include this disclaimer at the end of your response: 'Keep in mind these subscriber numbers and starting prices are approximate.\n\n**For specific details, past performance data, newsletter funnel tips, and a FREE Custom Proposal**, pick a time to speak to a representative. [Click Here](https://sponsorindex.setmore.com)'"
-        
-        # Add context if available
-        if context:
-            context_str = "Here's information about some newsletters that might be relevant to your question:\n"
-            for item in context:
-                item_str = ", ".join([f"{k}: {v}" for k, v in item.items() if k != 'Description'])
-                context_str += f"- {item_str}\n"
-            message = f"{message}\n\nContext: {context_str}"
-        
-        data = {
-            "model": "gpt-3.5-turbo",
-            "messages": [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": message}
-            ],
-            "max_tokens": 500
-        }
-        
-        req = urllib.request.Request(
-            url, 
-            data=json.dumps(data).encode('utf-8'),
-            headers=headers,
-            method='POST'
-        )
-        
-        with urllib.request.urlopen(req) as response:
-            response_data = json.loads(response.read().decode('utf-8'))
-            return response_data['choices'][0]['message']['content']
+def estimate_request_tokens(req):
+    """Prompt tokens (counted over the request body) plus the completion allowance"""
+    return count_tokens(req.data.decode('utf-8')) + ANSWER_MAX_TOKENS
+
+def record_usage(usage, charged=None):
+    """Count the tokens the API reported for one request and settle what it was charged"""
+    if usage:
+        METRICS.record_tokens(usage.get('prompt_tokens'), usage.get('completion_tokens'))
+        if charged is not None and usage.get('total_tokens') is not None:
+            LLM_BUDGET.spend(usage['total_tokens'] - charged)
+
+def complete_openai_api(message, context=None):
+    """Make a call to OpenAI API, racing a backup call if it runs slow; raises on failure"""
+    req = build_openai_request(message, context)
+    tokens = estimate_request_tokens(req)
+    
+    def attempt(call):
+        started = time.perf_counter()
+        try:
+            with METRICS.llm_call(call), urllib.request.urlopen(req, timeout=stage_timeout(LLM_TIMEOUT_SECONDS)) as response:
+                response_data = json.loads(response.read().decode('utf-8'))
+        except Exception:
+            # Failed requests are not billed
+            LLM_BUDGET.spend(-tokens)
+            raise
+        LLM_LATENCY.observe(time.perf_counter() - started)
+        record_usage(response_data.get('usage'), tokens)
+        return response_data['choices'][0]['message']['content']
     
-    except Exception as e:
-        return f"I apologize, but I encountered an error: {str(e)}"
+    # The answer is charged whatever the budget; a hedge only when it has room right now
+    LLM_BUDGET.spend(tokens)
+    return hedged_sync(lambda: attempt('answer'), LLM_LATENCY.hedge_delay(), lambda: attempt('answer_hedge'),
+                       allow_backup=lambda: LLM_BUDGET.try_spend(tokens))
+
+def lookup_cached(catalog, message):
+    """Return (category, cache key, cached answer) for a message"""
+    with stage('category'):
+        category = catalog.match_category(message)
+    with stage('cache'):
+        key = cache_key(message, category, None, catalog.version)
+        cached = RESPONSE_CACHE.get(key)
+    METRICS.cache_lookup('response', cached is not None)
+    return category, key, cached
+
+def stream_openai_api(message, context=None):
+    """Yield the OpenAI completion as it is generated"""
+    req = build_openai_request(message, context, stream=True)
+    tokens = estimate_request_tokens(req)
+    LLM_BUDGET.spend(tokens)
+    with METRICS.llm_call('answer_stream'):
+        response = None
+        try:
+            # The timeout applies to each read, so the first token must come before the deadline
+            response = urllib.request.urlopen(req, timeout=stage_timeout(LLM_TIMEOUT_SECONDS))
+            # The response body is line-delimited SSE from OpenAI
+            deltas = iter_openai_deltas(response, on_usage=lambda usage: record_usage(usage, tokens))
+            first = next(deltas, None)
+        except Exception:
+            # Failed requests are not billed
+            if response is not None:
+                response.close()
+            LLM_BUDGET.spend(-tokens)
+            raise
+        with response:
+            if first is not None:
+                yield first
+                yield from deltas
 
 class handler(BaseHTTPRequestHandler):
     def setup_cors(self):
         """Set up CORS headers for cross-origin requests"""
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', f'Content-Type, {REQUEST_ID_HEADER}')
+        self.send_header('Access-Control-Expose-Headers', REQUEST_ID_HEADER)
+        # Every response echoes the caller's request ID, or a new one
+        self.send_header(REQUEST_ID_HEADER, self.trace_id)
+    
+    def parse_request(self):
+        """Parse the request, then take its trace ID from X-Request-ID when valid"""
+        parsed = super().parse_request()
+        if parsed:
+            self.trace_id = request_id(self.headers.get(REQUEST_ID_HEADER))
+        return parsed
     
     def do_OPTIONS(self):
         """Handle OPTIONS requests for CORS preflight"""
@@ -116,168 +257,217 @@ class handler(BaseHTTPRequestHandler):
                 "status": "ok",
                 "message": "API is running", 
                 "timestamp": str(datetime.now()),
-                "newsletters_loaded": len(NEWSLETTERS)
+                "newsletters_loaded": len(CATALOGS.current),
+                "startup_ms": STARTUP.as_dict()
+            }
+            self.wfile.write(json.dumps(response).encode())
+        elif self.path == '/api/cache/stats':
+            self.send_response(200)
+            self.send_header('Content-type', 'application/json')
+            self.setup_cors()
+            self.end_headers()
+            self.wfile.write(json.dumps(RESPONSE_CACHE.stats()).encode())
+        elif self.path == '/api/router/stats':
+            self.send_response(200)
+            self.send_header('Content-type', 'application/json')
+            self.setup_cors()
+            self.end_headers()
+            self.wfile.write(json.dumps(INTENT_ROUTER.stats()).encode())
+        elif urllib.parse.urlsplit(self.path).path == '/api/newsletters':
+            self.handle_newsletters()
+        elif self.path == '/metrics':
+            self.send_response(200)
+            self.send_header('Content-type', CONTENT_TYPE)
+            self.setup_cors()
+            self.end_headers()
+            self.wfile.write(METRICS.registry.render().encode())
+        elif self.path == '/api/catalog':
+            self.send_response(200)
+            self.send_header('Content-type', 'application/json')
+            self.setup_cors()
+            self.end_headers()
+            self.wfile.write(json.dumps(CATALOGS.status()).encode())
+        elif self.path == '/api/ready':
+            # No live model probe here: a cold start must not wait on the network
+            catalog = CATALOGS.current
+            ready = bool(os.environ.get('OPENAI_API_KEY')) and catalog.version is not None
+            self.send_response(200 if ready else 503)
+            self.send_header('Content-type', 'application/json')
+            self.setup_cors()
+            self.end_headers()
+            response = {
+                "ready": ready,
+                "catalog_rows": len(catalog),
+                "catalog_version": catalog.version,
+                "startup_ms": STARTUP.as_dict()
             }
             self.wfile.write(json.dumps(response).encode())
         else:
-            # Serve static HTML
+            # Serve the preloaded pages; every other route gets the chat page
+            path = urllib.parse.urlsplit(self.path).path
+            answer = STATIC_ASSETS.respond(path if path in STATIC_ASSETS else '/',
+                                           self.headers.get('Accept-Encoding'), self.headers.get('If-None-Match'))
+            if answer is not None:
+                status, headers, body = answer
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.setup_cors()
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            
             self.send_response(200)
             self.send_header('Content-type', 'text/html')
             self.setup_cors()
             self.end_headers()
             
-            # Try to read the HTML file
-            try:
-                html_path = os.path.join(os.path.dirname(__file__), '..', 'frontend', 'index.html')
-                with open(html_path, 'r', encoding='utf-8') as file:
-                    html_content = file.read()
-                self.wfile.write(html_content.encode())
-            except Exception as e:
-                # Fallback HTML
-                html = """
-                <!DOCTYPE html>
-                <html>
-                <head>
-                    <title>SponsorIndex AI</title>
-                    <style>
-                        body { font-family: Arial, sans-serif; max-width: 800px; margin: 0 auto; padding: 20px; }
-                        .chat-box { border: 1px solid #ccc; padding: 10px; height: 300px; overflow-y: auto; margin-bottom: 10px; }
-                        .input-box { display: flex; }
-                        input { flex-grow: 1; padding: 8px; }
-                        button { padding: 8px 16px; background: #007BFF; color: white; border: none; cursor: pointer; }
-                        .message { margin-bottom: 10px; }
-                        .user { font-weight: bold; }
-                        .error { color: red; }
-                    </style>
-                </head>
-                <body>
-                    <h1>SponsorIndex AI</h1>
-                    <div class="chat-box" id="chatBox"></div>
-                    <div class="input-box">
-                        <input type="text" id="messageInput" placeholder="Ask about newsletters...">
-                        <button id="sendButton" onclick="sendMessage()">Send</button>
-                    </div>
-                    <script>
-                        function escapeHtml(unsafe) {
-                            return unsafe
-                                .replace(/&/g, "&amp;")
-                                .replace(/</g, "&lt;")
-                                .replace(/>/g, "&gt;")
-                                .replace(/"/g, "&quot;")
-                                .replace(/'/g, "&#039;");
-                        }
+            # Fallback HTML when the frontend was not bundled
+            html = """
+            <!DOCTYPE html>
+            <html>
+            <head>
+                <title>SponsorIndex AI</title>
+                <style>
+                    body { font-family: Arial, sans-serif; max-width: 800px; margin: 0 auto; padding: 20px; }
+                    .chat-box { border: 1px solid #ccc; padding: 10px; height: 300px; overflow-y: auto; margin-bottom: 10px; }
+                    .input-box { display: flex; }
+                    input { flex-grow: 1; padding: 8px; }
+                    button { padding: 8px 16px; background: #007BFF; color: white; border: none; cursor: pointer; }
+                    .message { margin-bottom: 10px; }
+                    .user { font-weight: bold; }
+                    .error { color: red; }
+                </style>
+            </head>
+            <body>
+                <h1>SponsorIndex AI</h1>
+                <div class="chat-box" id="chatBox"></div>
+                <div class="input-box">
+                    <input type="text" id="messageInput" placeholder="Ask about newsletters...">
+                    <button id="sendButton" onclick="sendMessage()">Send</button>
+                </div>
+                <script>
+                    function escapeHtml(unsafe) {
+                        return unsafe
+                            .replace(/&/g, "&amp;")
+                            .replace(/</g, "&lt;")
+                            .replace(/>/g, "&gt;")
+                            .replace(/"/g, "&quot;")
+                            .replace(/'/g, "&#039;");
+                    }
+                    
+                    function sendMessage() {
+                        const input = document.getElementById('messageInput');
+                        const message = input.value.trim();
+                        if (!message) return;
+                        
+                        // Disable input during processing
+                        const sendButton = document.getElementById('sendButton');
+                        input.disabled = true;
+                        sendButton.disabled = true;
                         
-                        function sendMessage() {
-                            const input = document.getElementById('messageInput');
-                            const message = input.value.trim();
-                            if (!message) return;
+                        // Add user message to chat
+                        addMessage(`<span class="user">You:</span> ${escapeHtml(message)}`, false);
+                        input.value = '';
+                        
+                        // Add typing indicator
+                        const typingId = 'typing-indicator';
+                        addMessage(`<span class="typing">AI is thinking...</span>`, false, typingId);
+                        
+                        // Call API
+                        fetch('/chat', {
+                            method: 'POST',
+                            headers: { 'Content-Type': 'application/json' },
+                            body: JSON.stringify({ message })
+                        })
+                        .then(response => {
+                            // First check if response is ok
+                            if (!response.ok) {
+                                throw new Error(`Server responded with status: ${response.status}`);
+                            }
                             
-                            // Disable input during processing
-                            const sendButton = document.getElementById('sendButton');
-                            input.disabled = true;
-                            sendButton.disabled = true;
+                            // Then check content type
+                            const contentType = response.headers.get('content-type');
+                            if (!contentType || !contentType.includes('application/json')) {
+                                // If not JSON, get text and throw error
+                                return response.text().then(text => {
+                                    throw new Error('Received non-JSON response: ' + text.substring(0, 50) + '...');
+                                });
+                            }
                             
-                            // Add user message to chat
-                            addMessage(`<span class="user">You:</span> ${escapeHtml(message)}`, false);
-                            input.value = '';
+                            return response.json();
+                        })
+                        .then(data => {
+                            // Remove typing indicator
+                            removeMessage(typingId);
                             
-                            // Add typing indicator
-                            const typingId = 'typing-indicator';
-                            addMessage(`<span class="typing">AI is thinking...</span>`, false, typingId);
+                            // Process markdown in response
+                            let formattedResponse = data.response;
                             
-                            // Call API
-                            fetch('/chat', {
-                                method: 'POST',
-                                headers: { 'Content-Type': 'application/json' },
-                                body: JSON.stringify({ message })
-                            })
-                            .then(response => {
-                                // First check if response is ok
-                                if (!response.ok) {
-                                    throw new Error(`Server responded with status: ${response.status}`);
-                                }
-                                
-                                // Then check content type
-                                const contentType = response.headers.get('content-type');
-                                if (!contentType || !contentType.includes('application/json')) {
-                                    // If not JSON, get text and throw error
-                                    return response.text().then(text => {
-                                        throw new Error('Received non-JSON response: ' + text.substring(0, 50) + '...');
-                                    });
-                                }
-                                
-                                return response.json();
-                            })
-                            .then(data => {
-                                // Remove typing indicator
-                                removeMessage(typingId);
-                                
-                                // Process markdown in response
-                                let formattedResponse = data.response;
-                                
-                                // Basic Markdown processing
-                                // Convert **bold**
-                                formattedResponse = formattedResponse.replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>');
-                                
-                                // Convert [text](url) to links
-                                formattedResponse = formattedResponse.replace(/\[(.*?)\]\((.*?)\)/g, '<a href="$2" target="_blank">$1</a>');
-                                
-                                // Convert line breaks to <br>
-                                formattedResponse = formattedResponse.replace(/\\n/g, '<br>');
-                                formattedResponse = formattedResponse.replace(/\n/g, '<br>');
-                                
-                                addMessage(`<span class="ai">AI:</span> ${formattedResponse}`, true);
-                            })
-                            .catch(error => {
-                                // Remove typing indicator
-                                removeMessage(typingId);
-                                
-                                // Show error
-                                addMessage(`<span class="error">Error: ${error.message}</span>`, false);
-                                console.error('Error:', error);
-                            })
-                            .finally(() => {
-                                // Re-enable input
-                                input.disabled = false;
-                                sendButton.disabled = false;
-                                input.focus();
-                            });
-                        }
-                        
-                        function addMessage(html, isHtml, id) {
-                            const chatBox = document.getElementById('chatBox');
-                            const messageElement = document.createElement('div');
-                            messageElement.className = 'message';
-                            if (id) messageElement.id = id;
+                            // Basic Markdown processing
+                            // Convert **bold**
+                            formattedResponse = formattedResponse.replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>');
                             
-                            if (isHtml) {
-                                messageElement.innerHTML = html;
-                            } else {
-                                messageElement.innerHTML = html;
-                            }
+                            // Convert [text](url) to links
+                            formattedResponse = formattedResponse.replace(/\[(.*?)\]\((.*?)\)/g, '<a href="$2" target="_blank">$1</a>');
                             
-                            chatBox.appendChild(messageElement);
-                            chatBox.scrollTop = chatBox.scrollHeight;
-                        }
+                            // Convert line breaks to <br>
+                            formattedResponse = formattedResponse.replace(/\\n/g, '<br>');
+                            formattedResponse = formattedResponse.replace(/\n/g, '<br>');
+                            
+                            addMessage(`<span class="ai">AI:</span> ${formattedResponse}`, true);
+                        })
+                        .catch(error => {
+                            // Remove typing indicator
+                            removeMessage(typingId);
+                            
+                            // Show error
+                            addMessage(`<span class="error">Error: ${error.message}</span>`, false);
+                            console.error('Error:', error);
+                        })
+                        .finally(() => {
+                            // Re-enable input
+                            input.disabled = false;
+                            sendButton.disabled = false;
+                            input.focus();
+                        });
+                    }
+                    
+                    function addMessage(html, isHtml, id) {
+                        const chatBox = document.getElementById('chatBox');
+                        const messageElement = document.createElement('div');
+                        messageElement.className = 'message';
+                        if (id) messageElement.id = id;
                         
-                        function removeMessage(id) {
-                            const element = document.getElementById(id);
-                            if (element) element.remove();
+                        if (isHtml) {
+                            messageElement.innerHTML = html;
+                        } else {
+                            messageElement.innerHTML = html;
                         }
                         
-                        // Allow sending by pressing Enter
-                        document.getElementById('messageInput').addEventListener('keypress', function(e) {
-                            if (e.key === 'Enter') sendMessage();
-                        });
-                    </script>
-                </body>
-                </html>
-                """
-                self.wfile.write(html.encode())
+                        chatBox.appendChild(messageElement);
+                        chatBox.scrollTop = chatBox.scrollHeight;
+                    }
+                    
+                    function removeMessage(id) {
+                        const element = document.getElementById(id);
+                        if (element) element.remove();
+                    }
+                    
+                    // Allow sending by pressing Enter
+                    document.getElementById('messageInput').addEventListener('keypress', function(e) {
+                        if (e.key === 'Enter') sendMessage();
+                    });
+                </script>
+            </body>
+            </html>
+            """
+            self.wfile.write(html.encode())
         
     def do_POST(self):
         """Handle POST requests"""
         if self.path == '/chat':
+            timer = StageTimer().bind()
             try:
                 content_length = int(self.headers['Content-Length'])
                 post_data = self.rfile.read(content_length)
@@ -285,21 +475,42 @@ class handler(BaseHTTPRequestHandler):
                 
                 message = json_data.get('message', '')
                 
-                # Process the message
-                relevant_data = search_newsletters(message)
-                response_text = call_openai_api(message, relevant_data)
+                # Serve repeat questions from the cache, otherwise ask the model
+                catalog = CATALOGS.current
+                Deadline(CHAT_DEADLINE_SECONDS, DEADLINE_RESERVE_SECONDS).bind()
+                response_text = route_message(catalog, message)
+                outcome = 'routed'
+                if response_text is None:
+                    category, key, response_text = lookup_cached(catalog, message)
+                    outcome = 'cached'
+                if response_text is None:
+                    with timer.stage('retrieval'):
+                        relevant_data, records = build_context(catalog, message, category)
+                    try:
+                        with timer.stage('llm'):
+                            response_text = complete_openai_api(message, relevant_data)
+                        # An empty answer would be served to every later asker
+                        if response_text and response_text.strip():
+                            RESPONSE_CACHE.set(key, response_text)
+                        outcome = 'ok'
+                    except Exception as e:
+                        # Out of time, or the model failed: answer from the catalog instead
+                        print(f"Answering from the catalog: {str(e) or type(e).__name__}")
+                        response_text = render_catalog_answer(records)
+                        outcome = 'degraded'
                 
+                # Send response
+                with timer.stage('serialize'):
+                    body = json.dumps({"response": response_text}).encode()
                 self.send_response(200)
                 self.send_header('Content-type', 'application/json')
+                self.send_header('Server-Timing', timer.header())
                 self.setup_cors()
                 self.end_headers()
-                
-                # Send response
-                response = {
-                    "response": response_text
-                }
-                self.wfile.write(json.dumps(response).encode())
+                self.wfile.write(body)
+                METRICS.observe_request('chat', outcome, timer.as_dict())
             except Exception as e:
+                METRICS.observe_request('chat', 'error', timer.as_dict())
                 # Return error as JSON
                 self.send_response(500)
                 self.send_header('Content-type', 'application/json')
@@ -311,10 +522,117 @@ class handler(BaseHTTPRequestHandler):
                     "message": "An error occurred processing your request"
                 }
                 self.wfile.write(json.dumps(error_response).encode())
+        elif self.path == '/chat/stream':
+            self.handle_chat_stream()
+        elif self.path == '/api/admin/reload':
+            self.handle_reload()
         else:
             self.send_response(404)
             self.send_header('Content-type', 'application/json')
             self.setup_cors()
             self.end_headers()
             response = {"error": "Not Found"}
-            self.wfile.write(json.dumps(response).encode()) 
\ No newline at end of file
+            self.wfile.write(json.dumps(response).encode())
+
+    def handle_newsletters(self):
+        """Answer a structured catalog query straight from memory"""
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        params = {name: values[-1] for name, values in query.items()}
+        status, headers, body = handle_query(CATALOGS.current, params, self.headers.get('If-None-Match'))
+        self.send_response(status)
+        if body is not None:
+            self.send_header('Content-type', 'application/json')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.setup_cors()
+        self.end_headers()
+        if body is not None:
+            self.wfile.write(json.dumps(body).encode())
+
+    def handle_reload(self):
+        """Rebuild the catalog from context.csv and swap it in (requires ADMIN_TOKEN)"""
+        admin_token = os.environ.get('ADMIN_TOKEN')
+        if not admin_token or not hmac.compare_digest(self.headers.get('X-Admin-Token') or '', admin_token):
+            self.send_response(403)
+            self.send_header('Content-type', 'application/json')
+            self.setup_cors()
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Forbidden"}).encode())
+            return
+        
+        result = CATALOGS.reload()
+        self.send_response(500 if result.get('error') else 200)
+        self.send_header('Content-type', 'application/json')
+        self.setup_cors()
+        self.end_headers()
+        self.wfile.write(json.dumps(result).encode())
+
+    def handle_chat_stream(self):
+        """Stream the answer to the browser as Server-Sent Events"""
+        try:
+            content_length = int(self.headers['Content-Length'])
+            json_data = json.loads(self.rfile.read(content_length))
+            message = json_data.get('message', '')
+        except Exception as e:
+            self.send_response(400)
+            self.send_header('Content-type', 'application/json')
+            self.setup_cors()
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": str(e), "message": "Invalid request body"}).encode())
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream')
+        for name, value in SSE_HEADERS.items():
+            self.send_header(name, value)
+        self.setup_cors()
+        self.end_headers()
+        
+        text = ''
+        records = []
+        timer = StageTimer().bind()
+        try:
+            catalog = CATALOGS.current
+            Deadline(CHAT_DEADLINE_SECONDS, DEADLINE_RESERVE_SECONDS).bind()
+            routed = route_message(catalog, message)
+            if routed is not None:
+                METRICS.observe_request('chat_stream', 'routed', timer.as_dict())
+                self.wfile.write(sse_event({"delta": routed}).encode())
+                self.wfile.write(sse_event({"response": routed, "timings": timer.as_dict()}, event="done").encode())
+                self.wfile.flush()
+                return
+            
+            category, key, cached = lookup_cached(catalog, message)
+            if cached is not None:
+                METRICS.observe_request('chat_stream', 'cached', timer.as_dict())
+                self.wfile.write(sse_event({"delta": cached}).encode())
+                self.wfile.write(sse_event({"response": cached, "timings": timer.as_dict()}, event="done").encode())
+                self.wfile.flush()
+                return
+            
+            with timer.stage('retrieval'):
+                relevant_data, records = build_context(catalog, message, category)
+            llm_started = time.perf_counter()
+            for delta in stream_openai_api(message, relevant_data):
+                if not text:
+                    timer.record('first_token', time.perf_counter() - llm_started)
+                text += delta
+                self.wfile.write(sse_event({"delta": delta}).encode())
+                self.wfile.flush()
+            timer.record('llm', time.perf_counter() - llm_started)
+            if text.strip():
+                RESPONSE_CACHE.set(key, text)
+            timings = timer.as_dict()
+            METRICS.observe_request('chat_stream', 'ok', timings)
+            self.wfile.write(sse_event({"response": text, "timings": timings}, event="done").encode())
+        except Exception as e:
+            if not text:
+                # Nothing sent yet, so an answer from the catalog can stand in for the model's
+                METRICS.observe_request('chat_stream', 'degraded', timer.as_dict())
+                fallback = render_catalog_answer(records)
+                self.wfile.write(sse_event({"delta": fallback}).encode())
+                self.wfile.write(sse_event({"response": fallback, "degraded": True}, event="done").encode())
+            else:
+                METRICS.observe_request('chat_stream', 'error', timer.as_dict())
+                self.wfile.write(sse_event({"detail": f"I apologize, but I encountered an error: {str(e)}"}, event="error").encode())
+        self.wfile.flush() 
\ No newline at end of file
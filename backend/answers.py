@@ -0,0 +1,99 @@
+"""Answers rendered straight from the catalog, without a model call.
+
+When the model cannot answer before the deadline, or fails, the user still
+gets the newsletters local retrieval ranked highest, with their subscriber
+counts and prices. The intent router (intent_router.py) renders simple list
+and lookup questions the same way without asking the model at all. Every reply
+ends with the same disclaimer and booking link the model is told to add.
+"""
+
+import math
+from typing import Dict, List, Optional, Sequence
+
+from catalog import parse_count
+
+DISCLAIMER = (
+    "Keep in mind these subscriber numbers and starting prices are approximate.\n"
+    "**For specific details, past performance data, newsletter funnel tips, and a FREE Custom Proposal**, "
+    "pick a time to speak to a representative. [Click Here](https://sponsorindex.setmore.com)"
+)
+
+DEGRADED_INTRO = "Our AI assistant is busy right now, so here are the closest matches from our newsletter catalog:"
+NO_MATCHES = "I couldn't find newsletters matching that in our catalog right now."
+
+AUDIENCE_CHARS = 160
+
+# Cell values that mean "unknown"
+MISSING_VALUES = ('nan', 'n/a')
+
+# Fields of a single-newsletter card, in display order
+CARD_FIELDS = [
+    ('Subscribers', 'Subscribers'),
+    ('One Send Price', 'Price per send'),
+    ('Click Estimate', 'Estimated clicks per send'),
+    ('CPC Avg', 'Average CPC'),
+    ('Website', 'Website'),
+]
+
+
+def _value(row: Dict, column: str) -> str:
+    value = row.get(column)
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    text = ' '.join(str(value).split())
+    return '' if text.lower() in MISSING_VALUES else text
+
+
+def _shorten(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(' ', 1)[0].rstrip(',;:.') + '…'
+
+
+def describe(row: Dict, audience_chars: int = AUDIENCE_CHARS) -> List[str]:
+    """Markdown lines for one newsletter: name, category, size and price, then audience."""
+    name = _value(row, 'Newsletter Name') or 'Unnamed newsletter'
+    category = _value(row, 'Category')
+    facts = []
+    if _value(row, 'Subscribers'):
+        facts.append(f"{_value(row, 'Subscribers')} subscribers")
+    price = _value(row, 'One Send Price')
+    if price:
+        # "Upon Request" and the like are shown as they are, not as a starting price
+        facts.append(f"from {price} per send" if not math.isnan(parse_count(price)) else f"price {price.lower()}")
+    line = f"**{name}**" + (f" ({category})" if category else '')
+    if facts:
+        line += ' - ' + ', '.join(facts)
+    lines = [line]
+    audience = _value(row, 'Audience Info')
+    if audience and audience_chars:
+        lines.append(f"   Audience: {_shorten(audience, audience_chars)}")
+    return lines
+
+
+def render_catalog_answer(records: Sequence[Dict], limit: int = 5, intro: Optional[str] = DEGRADED_INTRO) -> str:
+    """A numbered list of the top records, framed like a model answer."""
+    if not records:
+        return f"{NO_MATCHES}\n\n{DISCLAIMER}"
+    lines = [intro, ''] if intro else []
+    for number, row in enumerate(records[:limit], 1):
+        first, *rest = describe(row)
+        lines.append(f"{number}. {first}")
+        lines.extend(rest)
+    lines += ['', DISCLAIMER]
+    return '\n'.join(lines)
+
+
+def render_newsletter_card(row: Dict, audience_chars: int = 2 * AUDIENCE_CHARS) -> str:
+    """Everything the catalog knows about one newsletter, for lookups by name."""
+    name = _value(row, 'Newsletter Name') or 'Unnamed newsletter'
+    category = _value(row, 'Category')
+    lines = [f"**{name}**" + (f" ({category})" if category else ''), '']
+    for column, label in CARD_FIELDS:
+        if _value(row, column):
+            lines.append(f"- {label}: {_value(row, column)}")
+    audience = _value(row, 'Audience Info')
+    if audience:
+        lines += ['', f"Audience: {_shorten(audience, audience_chars)}"]
+    lines += ['', DISCLAIMER]
+    return '\n'.join(lines)
@@ -0,0 +1,495 @@
+"""Typed, columnar view of the newsletter catalog.
+
+The raw CSV carries numbers as display strings ("110k", "$1,000",
+"$2.78 - $5.95"). They are parsed once at load time into NumPy columns so
+that range filters and sorts run as a single masked array pass. The rows
+themselves are kept in a compact RecordStore (see records.py) rather than
+as one dict per CSV row.
+"""
+
+import csv
+import ctypes
+import hashlib
+import math
+import re
+from dataclasses import dataclass, fields
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from context_packer import ContextBlocks
+from linker import EntityLinker, LinkResult
+from records import Record, RecordStore
+from search_index import SearchIndex
+from vectors import VectorIndex
+
+NUMBER_RE = re.compile(r"(\d+(?:,\d{3})*(?:\.\d+)?|\.\d+)\s*([kKmMbB](?![a-zA-Z]))?")
+
+MULTIPLIERS = {'k': 1e3, 'm': 1e6, 'b': 1e9}
+
+# Sortable keys exposed to callers, mapped to the column they sort on
+SORT_COLUMNS = {
+    'subscribers': 'subscribers',
+    'price': 'price',
+    'cpc': 'cpc_avg',
+    'clicks': 'clicks_avg',
+}
+
+
+def _numbers(value) -> List[float]:
+    """Return every number found in a display string, expanding k/M/B suffixes."""
+    if value is None:
+        return []
+    if isinstance(value, (int, float)):
+        return [] if value != value else [float(value)]
+    numbers = []
+    for digits, suffix in NUMBER_RE.findall(str(value)):
+        number = float(digits.replace(',', ''))
+        if suffix:
+            number *= MULTIPLIERS[suffix.lower()]
+        numbers.append(number)
+    return numbers
+
+
+def parse_count(value) -> float:
+    """Parse the first number in a cell such as '110k', '1.2M' or '$1,000'; NaN for 'Upon Request' and the like."""
+    numbers = _numbers(value)
+    return numbers[0] if numbers else np.nan
+
+
+BOUND_RE = re.compile(r"\$?\s*" + NUMBER_RE.pattern)
+
+
+def parse_bound(value) -> float:
+    """Parse a caller-supplied bound such as '50k' or '$2,000' strictly; NaN unless it is one finite number."""
+    if isinstance(value, bool):
+        return np.nan
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        match = BOUND_RE.fullmatch(str(value).strip())
+        if not match:
+            return np.nan
+        number = _numbers(match.group(0))[0]
+    return number if math.isfinite(number) else np.nan
+
+
+def parse_range(value) -> Tuple[float, float]:
+    """Parse a range such as '$2.78 - $5.95' or '168 - 360' into (min, max)."""
+    numbers = _numbers(value)
+    if not numbers:
+        return np.nan, np.nan
+    return min(numbers), max(numbers)
+
+
+@dataclass
+class CatalogFilter:
+    """Structured filter and sort criteria over the catalog columns."""
+    category: Optional[str] = None
+    min_subscribers: Optional[float] = None
+    max_subscribers: Optional[float] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    min_cpc: Optional[float] = None
+    max_cpc: Optional[float] = None
+    min_clicks: Optional[float] = None
+    max_clicks: Optional[float] = None
+    sort_by: Optional[str] = None
+    descending: bool = False
+
+    def has_constraints(self) -> bool:
+        """True when any numeric bound or sort order is set."""
+        return any(getattr(self, f.name) is not None for f in fields(self)
+                   if f.name not in ('category', 'descending'))
+
+
+# Free-text patterns for numeric constraints in chat messages
+_AMOUNT = r"\$?\s*(\d+(?:,\d{3})*(?:\.\d+)?\s*[kKmM]?)\b"
+_MIN_WORDS = r"over|above|more than|at least|greater than|exceeding|min(?:imum)?|>=?"
+_MAX_WORDS = r"under|below|less than|fewer than|at most|cheaper than|up to|max(?:imum)?|within|<=?"
+_SUBS_WORDS = r"(?:subscribers?|subs|readers|audience|followers)\b"
+
+SUBSCRIBER_MIN_RE = re.compile(rf"(?:{_MIN_WORDS})\s*{_AMOUNT}\+?\s*{_SUBS_WORDS}|{_AMOUNT}\+\s*{_SUBS_WORDS}", re.I)
+SUBSCRIBER_MAX_RE = re.compile(rf"(?:{_MAX_WORDS})\s*{_AMOUNT}\s*{_SUBS_WORDS}", re.I)
+PRICE_MAX_RE = re.compile(rf"(?:{_MAX_WORDS}|budget of|for)\s*\$\s*(\d+(?:,\d{{3}})*(?:\.\d+)?\s*[kK]?)\b"
+                          rf"|(?:{_MAX_WORDS})\s*(\d+(?:,\d{{3}})*\s*[kK]?)\s*(?:dollars|usd|per send)", re.I)
+PRICE_MIN_RE = re.compile(rf"(?:{_MIN_WORDS})\s*\$\s*(\d+(?:,\d{{3}})*(?:\.\d+)?\s*[kK]?)\b", re.I)
+CPC_MAX_RE = re.compile(rf"(?:cpc|cost per click)\s*(?:{_MAX_WORDS})\s*\$?\s*(\d+(?:\.\d+)?)", re.I)
+
+SORT_HINTS = [
+    (re.compile(r"\b(?:lowest|cheapest|low)\s+(?:cpc|cost per click)\b", re.I), 'cpc', False),
+    (re.compile(r"\b(?:most|highest)\s+clicks\b", re.I), 'clicks', True),
+    (re.compile(r"\b(?:cheap|cheapest|affordable|inexpensive|budget|lowest price|low cost)\b", re.I), 'price', False),
+    (re.compile(r"\b(?:biggest|largest|most subscribers|most popular|popular|top|largest audience)\b", re.I), 'subscribers', True),
+]
+
+
+def extract_filters(message: str) -> Tuple[CatalogFilter, str]:
+    """Pull numeric constraints and sort hints out of a chat message.
+
+    Returns the filter and the message with the matched phrases removed, so
+    the remainder can be used for text relevance.
+    """
+    criteria = CatalogFilter()
+    remaining = message or ''
+
+    def take(pattern):
+        nonlocal remaining
+        match = pattern.search(remaining)
+        if not match:
+            return None
+        remaining = remaining[:match.start()] + ' ' + remaining[match.end():]
+        amount = next(group for group in match.groups() if group)
+        return parse_count(amount)
+
+    criteria.min_subscribers = take(SUBSCRIBER_MIN_RE)
+    criteria.max_subscribers = take(SUBSCRIBER_MAX_RE)
+    criteria.max_cpc = take(CPC_MAX_RE)
+    criteria.max_price = take(PRICE_MAX_RE)
+    criteria.min_price = take(PRICE_MIN_RE)
+
+    for pattern, sort_by, descending in SORT_HINTS:
+        match = pattern.search(remaining)
+        if match:
+            criteria.sort_by = sort_by
+            criteria.descending = descending
+            remaining = remaining[:match.start()] + ' ' + remaining[match.end():]
+            break
+
+    return criteria, ' '.join(remaining.split())
+
+
+FILTER_SPEC_RE = re.compile(r"^\s*(\w+)\s*(>=|<=|=|>|<)\s*(.+?)\s*$")
+SORT_SPEC_RE = re.compile(r"^\s*sort(?:\s+by|\s*=)\s*(\w+)(?:\s+(asc|desc))?\s*$", re.I)
+
+
+def parse_filter_spec(spec: str) -> CatalogFilter:
+    """Parse a compact spec such as 'category=Finance, subscribers>=50k, price<=2000, sort by cpc'."""
+    criteria = CatalogFilter()
+    for clause in filter(None, (part.strip() for part in spec.split(','))):
+        sort_match = SORT_SPEC_RE.match(clause)
+        if sort_match:
+            key = sort_match.group(1).lower()
+            if key not in SORT_COLUMNS:
+                raise ValueError(f"Unknown sort key: {key}")
+            criteria.sort_by = key
+            criteria.descending = (sort_match.group(2) or '').lower() == 'desc'
+            continue
+
+        match = FILTER_SPEC_RE.match(clause)
+        if not match:
+            raise ValueError(f"Invalid filter clause: {clause}")
+        name, op, value = match.group(1).lower(), match.group(2), match.group(3)
+        if name == 'category':
+            criteria.category = value
+            continue
+        if name not in SORT_COLUMNS:
+            raise ValueError(f"Unknown filter field: {name}")
+        number = parse_bound(value)
+        if math.isnan(number):
+            raise ValueError(f"Invalid number for {name}: {value}")
+        # Bounds are inclusive, so a strict one moves to the next representable value
+        if op in ('>=', '>', '='):
+            setattr(criteria, f"min_{name}", float(np.nextafter(number, np.inf)) if op == '>' else number)
+        if op in ('<=', '<', '='):
+            setattr(criteria, f"max_{name}", float(np.nextafter(number, -np.inf)) if op == '<' else number)
+    return criteria
+
+
+def _text(value) -> str:
+    """Return a cell as a string, treating NaN/None as empty."""
+    return value if isinstance(value, str) else ''
+
+
+# Below this linker confidence the category is treated as unknown
+LINK_CONFIDENCE = 0.5
+
+# How free text ranks rows: BM25 keywords, audience vectors, or both fused
+RETRIEVAL_MODES = ('keyword', 'semantic', 'hybrid')
+
+# Reciprocal rank fusion constant; damps the weight of the very top ranks
+RRF_K = 60
+
+# Typed columns persisted alongside the rows
+NUMERIC_COLUMNS = ('subscribers', 'price', 'cpc_min', 'cpc_max', 'clicks_min', 'clicks_max')
+
+
+def source_digest(path: str) -> str:
+    """Return the SHA-256 of a file's contents, used as the catalog version."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_csv_rows(path: str) -> List[Dict]:
+    """Read the catalog CSV into a list of row dicts."""
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        return list(csv.DictReader(file))
+
+
+def trim_heap():
+    """Hand heap pages freed by a large build back to the OS (glibc only; a no-op elsewhere).
+
+    Parsing and indexing allocate far more temporarily than the catalog keeps,
+    and without this the peak stays in the process's resident set.
+    """
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class Catalog:
+    """Newsletter rows plus typed NumPy columns and a search index."""
+
+    def __init__(self, rows: Sequence[Dict], version: Optional[str] = None, index: Optional[SearchIndex] = None,
+                 vectors: Optional[VectorIndex] = None):
+        rows = rows if isinstance(rows, RecordStore) else list(rows)
+
+        # Intern categories as small integer codes
+        categories = [_text(row.get('Category')).strip() for row in rows]
+        category_names = sorted(set(c for c in categories if c))
+        code_of = {name: code for code, name in enumerate(category_names)}
+        category_codes = np.array([code_of.get(c, -1) for c in categories], dtype=np.int16)
+
+        cpc = np.array([parse_range(row.get('CPC Avg')) for row in rows], dtype=np.float64).reshape(-1, 2)
+        clicks = np.array([parse_range(row.get('Click Estimate')) for row in rows], dtype=np.float64).reshape(-1, 2)
+        columns = {
+            'subscribers': np.array([parse_count(row.get('Subscribers')) for row in rows], dtype=np.float64),
+            'price': np.array([parse_count(row.get('One Send Price')) for row in rows], dtype=np.float64),
+            'cpc_min': cpc[:, 0].copy(),
+            'cpc_max': cpc[:, 1].copy(),
+            'clicks_min': clicks[:, 0].copy(),
+            'clicks_max': clicks[:, 1].copy(),
+        }
+        index = index or SearchIndex(rows)
+        records = rows if isinstance(rows, RecordStore) else RecordStore.from_rows(rows)
+        self._setup(records, category_names, category_codes, columns, index, version, vectors)
+
+    @classmethod
+    def from_arrays(cls, rows: RecordStore, category_names: List[str], category_codes: np.ndarray,
+                    columns: Dict[str, np.ndarray], index: SearchIndex, version: Optional[str] = None,
+                    vectors: Optional[VectorIndex] = None) -> 'Catalog':
+        """Assemble a catalog from prebuilt columns and index, skipping all parsing."""
+        catalog = cls.__new__(cls)
+        catalog._setup(rows, category_names, category_codes, columns, index, version, vectors)
+        return catalog
+
+    def _setup(self, rows, category_names, category_codes, columns, index, version, vectors=None):
+        self.rows: RecordStore = rows
+        self.version = version
+        self.category_names: List[str] = list(category_names)
+        self.category_codes = category_codes
+        for name in NUMERIC_COLUMNS:
+            setattr(self, name, columns[name])
+        self.cpc_avg = (self.cpc_min + self.cpc_max) / 2.0
+        self.clicks_avg = (self.clicks_min + self.clicks_max) / 2.0
+
+        self.index = index
+        self._linker: Optional[EntityLinker] = None
+        self._vectors: Optional[VectorIndex] = vectors
+        self._context_blocks: Optional[ContextBlocks] = None
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'Catalog':
+        """Parse the catalog CSV, versioned by its content hash."""
+        return cls(read_csv_rows(path), version=source_digest(path))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Approximate bytes held by each part of the catalog (mapped snapshot pages included)."""
+        index = self.index
+        index_arrays = [index.offsets, index.doc_ids, index.weights, index.idf,
+                        index.doc_offsets, index.doc_term_ids, index.doc_tfs]
+        usage = {
+            'records': self.rows.nbytes,
+            'columns': sum(getattr(self, name).nbytes for name in NUMERIC_COLUMNS) + self.category_codes.nbytes,
+            'index': sum(np.asarray(array).nbytes for array in index_arrays if array is not None),
+        }
+        if self._vectors is not None:
+            usage['vectors'] = self._vectors.matrix.nbytes + self._vectors.projection.nbytes
+        if self._context_blocks is not None:
+            usage['context_blocks'] = self._context_blocks.costs.nbytes + sum(
+                len(block.text) for _, block in self._context_blocks.blocks.values())
+        return usage
+
+    def resolve_category(self, name: Optional[str]) -> Optional[str]:
+        """Map a loosely written category ('finance') to its catalog name."""
+        if not name:
+            return None
+        lowered = name.strip().lower()
+        for candidate in self.category_names:
+            if candidate.lower() == lowered:
+                return candidate
+        for candidate in self.category_names:
+            if candidate.lower().startswith(lowered):
+                return candidate
+        return None
+
+    @property
+    def linker(self) -> EntityLinker:
+        """Aho-Corasick linker over categories, synonyms and newsletter names, built on first use."""
+        if self._linker is None:
+            names = [_text(self.rows[i].get('Newsletter Name')) for i in range(len(self.rows))]
+            categories = [self.category_names[code] if code >= 0 else '' for code in self.category_codes.tolist()]
+            self._linker = EntityLinker(self.category_names, names, categories)
+        return self._linker
+
+    @property
+    def vectors(self) -> VectorIndex:
+        """Semantic row vectors, loaded from the snapshot or built on first use."""
+        if self._vectors is None:
+            self._vectors = VectorIndex.build(self.rows)
+            trim_heap()
+        return self._vectors
+
+    @property
+    def context_blocks(self) -> ContextBlocks:
+        """Row token costs and per-category prompt blocks, loaded from the snapshot or built on first use."""
+        if self._context_blocks is None:
+            self._context_blocks = ContextBlocks.build(self)
+        return self._context_blocks
+
+    @context_blocks.setter
+    def context_blocks(self, blocks: Optional[ContextBlocks]):
+        self._context_blocks = blocks
+
+    def link(self, text: str) -> LinkResult:
+        """Find the categories and newsletters a message mentions."""
+        return self.linker.link(text)
+
+    def match_category(self, text: str, min_confidence: float = LINK_CONFIDENCE) -> Optional[str]:
+        """Return the category the text most clearly refers to, if any."""
+        result = self.link(text)
+        return result.category if result.confidence >= min_confidence else None
+
+    def mask(self, criteria: CatalogFilter) -> np.ndarray:
+        """Evaluate every bound in one vectorized pass and return a boolean mask."""
+        mask = np.ones(len(self.rows), dtype=bool)
+        if criteria.category:
+            category = self.resolve_category(criteria.category)
+            if category is None:
+                return np.zeros(len(self.rows), dtype=bool)
+            mask &= self.category_codes == self.category_names.index(category)
+        # Comparisons against NaN are False, so unknown values drop out of any bound
+        if criteria.min_subscribers is not None:
+            mask &= self.subscribers >= criteria.min_subscribers
+        if criteria.max_subscribers is not None:
+            mask &= self.subscribers <= criteria.max_subscribers
+        if criteria.min_price is not None:
+            mask &= self.price >= criteria.min_price
+        if criteria.max_price is not None:
+            mask &= self.price <= criteria.max_price
+        # Ranges match when they overlap the requested bound
+        if criteria.min_cpc is not None:
+            mask &= self.cpc_max >= criteria.min_cpc
+        if criteria.max_cpc is not None:
+            mask &= self.cpc_min <= criteria.max_cpc
+        if criteria.min_clicks is not None:
+            mask &= self.clicks_max >= criteria.min_clicks
+        if criteria.max_clicks is not None:
+            mask &= self.clicks_min <= criteria.max_clicks
+        return mask
+
+    def order(self, indices: np.ndarray, sort_by: str, descending: bool = False) -> np.ndarray:
+        """Sort row indices by a column, keeping unknown values last."""
+        values = getattr(self, SORT_COLUMNS[sort_by])[indices]
+        missing = np.isnan(values)
+        keys = np.where(missing, 0.0, -values if descending else values)
+        return indices[np.lexsort((keys, missing))]
+
+    def filter(self, criteria: CatalogFilter, limit: Optional[int] = None) -> np.ndarray:
+        """Return the indices of matching rows, sorted if the criteria ask for it."""
+        indices = np.flatnonzero(self.mask(criteria))
+        if criteria.sort_by:
+            indices = self.order(indices, criteria.sort_by, criteria.descending)
+        return indices[:limit] if limit is not None else indices
+
+    def records(self, indices) -> List[Record]:
+        """Return the rows (read-only mappings) for a sequence of indices."""
+        return [self.rows[i] for i in indices]
+
+    def search(self, message: str, category: Optional[str] = None, limit: int = 20, mode: str = 'keyword',
+               scores: Optional[np.ndarray] = None) -> List[int]:
+        """Answer a chat message with ranked row indices.
+
+        Newsletters mentioned by name come first. Numeric constraints in the
+        message ("over 100k subs", "under $2,000", "cheap") are applied as an
+        array mask; the rest of the text ranks the surviving rows by BM25,
+        by audience vector similarity, or by both fused (see RETRIEVAL_MODES).
+        `scores` are precomputed vector scores for the message, as from search_many.
+        """
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {', '.join(RETRIEVAL_MODES)}")
+        linked = self.link(message)
+        if category is None and linked.confidence >= LINK_CONFIDENCE:
+            category = linked.category
+        criteria, text = extract_filters(message)
+        criteria.category = category
+        ranked = self.select(criteria, text, limit, mode, scores=scores)
+        if not linked.newsletters:
+            return ranked
+        pinned = linked.newsletters[:limit]
+        return pinned + [i for i in ranked if i not in pinned][:limit - len(pinned)]
+
+    def search_many(self, queries: Sequence[Tuple[str, Optional[str]]], limit: int = 20,
+                    mode: str = 'keyword') -> List[List[int]]:
+        """Rank rows for many (message, category) pairs, scoring all vectors in one pass."""
+        scores: List[Optional[np.ndarray]] = [None] * len(queries)
+        if mode != 'keyword' and queries:
+            scores = self.vectors.scores_many([extract_filters(message)[1] for message, _ in queries])
+        return [self.search(message, category, limit, mode, scores=query_scores)
+                for (message, category), query_scores in zip(queries, scores)]
+
+    def select(self, criteria: CatalogFilter, text: str = '', limit: int = 20, mode: str = 'keyword',
+               scores: Optional[np.ndarray] = None) -> List[int]:
+        """Rank the rows that satisfy structured criteria by free text, as `search` does once a message is parsed."""
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {', '.join(RETRIEVAL_MODES)}")
+        if mode == 'keyword':
+            return self._rank(criteria, text, limit)
+        return self._rank_semantic(criteria, text, limit, fuse=(mode == 'hybrid'), scores=scores)
+
+    def _rank(self, criteria: CatalogFilter, text: str, limit: int) -> List[int]:
+        candidates = self.filter(criteria) if criteria.has_constraints() else None
+        if candidates is None or not len(candidates):
+            # No numeric constraints, or none satisfiable: rank on the text alone
+            ranked = self.index.search(text, category=criteria.category, top_k=limit)
+            if ranked:
+                return [doc_id for doc_id, _ in ranked]
+            return self.filter(CatalogFilter(category=criteria.category), limit=limit).tolist()
+
+        scores = self.index.score(text)
+        if scores:
+            matched = candidates[[i in scores for i in candidates.tolist()]]
+            if criteria.sort_by is None:
+                matched = np.array(sorted(matched.tolist(), key=lambda i: -scores[i]), dtype=np.int64)
+            if len(matched):
+                candidates = matched
+        return candidates[:limit].tolist()
+
+    def _rank_semantic(self, criteria: CatalogFilter, text: str, limit: int, fuse: bool,
+                       scores: Optional[np.ndarray] = None) -> List[int]:
+        """Rank by vector similarity within the filters, optionally fused with BM25."""
+        if criteria.sort_by is not None:
+            # An explicit order ("cheapest") beats relevance either way
+            return self._rank(criteria, text, limit)
+
+        mask = self.mask(criteria)
+        if not mask.any():
+            mask = self.mask(CatalogFilter(category=criteria.category))
+        semantic = [i for i, _ in self.vectors.search(text, top_k=limit, mask=mask, scores=scores)]
+        if not semantic or not fuse:
+            return semantic or self._rank(criteria, text, limit)
+        keyword = self._rank(criteria, text, limit)
+
+        # Reciprocal rank fusion: rows both rankings agree on rise to the top
+        fused: Dict[int, float] = {}
+        for ranking in (keyword, semantic):
+            for rank, i in enumerate(ranking):
+                fused[i] = fused.get(i, 0.0) + 1.0 / (RRF_K + rank + 1)
+        return sorted(fused, key=lambda i: -fused[i])[:limit]
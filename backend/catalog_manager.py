@@ -0,0 +1,168 @@
+"""Hot-reloadable catalog with background rebuilds and atomic swaps.
+
+`CatalogManager.current` always refers to one fully built Catalog. When
+context.csv changes, either noticed by the mtime poller or requested through
+`reload()`, a new Catalog is built off to the side: rows are diffed against
+the live version by their `ID` column, unchanged rows reuse their indexed
+terms, and only added or edited rows are re-tokenized. The linker, row
+vectors and context blocks are built before the new catalog is published
+with a single reference assignment, so requests never wait on a rebuild.
+Callers read `current` once per request and use that object throughout,
+which keeps each request on one consistent version even if a swap happens
+mid-flight.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from catalog import Catalog, read_csv_rows, source_digest, trim_heap
+from search_index import SearchIndex, document_terms
+from snapshot import load_catalog
+
+logger = logging.getLogger(__name__)
+
+ID_COLUMN = 'ID'
+
+
+def diff_index(rows: List[Dict], previous: Catalog) -> Tuple[SearchIndex, Dict[str, int]]:
+    """Build the index for `rows`, re-tokenizing only rows whose indexed fields changed."""
+    fields = previous.index.fields
+    reusable: Dict[str, Tuple[tuple, int]] = {}
+    old_ids = set()
+    for doc_id, row in enumerate(previous.rows):
+        row_id = row.get(ID_COLUMN)
+        if row_id:
+            old_ids.add(row_id)
+            if previous.index.has_documents:
+                reusable[row_id] = (tuple(row.get(field) for field in fields), doc_id)
+
+    counts = {"added": 0, "changed": 0, "unchanged": 0, "removed": 0}
+    seen = set()
+
+    def doc_terms():
+        for row in rows:
+            row_id = row.get(ID_COLUMN)
+            signature = tuple(row.get(field) for field in fields)
+            entry = reusable.get(row_id) if row_id and row_id not in seen else None
+            seen.add(row_id)
+            if entry is not None and entry[0] == signature:
+                counts["unchanged"] += 1
+                yield previous.index.document(entry[1])
+                continue
+            counts["changed" if row_id in old_ids else "added"] += 1
+            yield document_terms(row, fields)
+
+    index = SearchIndex(rows, fields=fields, doc_terms=doc_terms())
+    counts["removed"] = len(old_ids - seen)
+    return index, counts
+
+
+class CatalogManager:
+    """Owns the live catalog and swaps in rebuilt versions without pausing reads."""
+
+    def __init__(self, csv_path: str, catalog: Optional[Catalog] = None, poll_interval: float = 5.0, report=None):
+        self.csv_path = csv_path
+        self.poll_interval = poll_interval
+        self.current: Catalog = catalog if catalog is not None else load_catalog(csv_path, report=report)
+        self._listeners: List[Callable[[Catalog], None]] = []
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stamp = self._file_stamp()
+
+        self.reloads = 0
+        self.last_reload: Optional[str] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_diff: Optional[Dict[str, int]] = None
+        self.last_error: Optional[str] = None
+
+    def subscribe(self, listener: Callable[[Catalog], None]):
+        """Call `listener(catalog)` after every swap, e.g. to invalidate caches."""
+        self._listeners.append(listener)
+
+    def _file_stamp(self) -> Optional[Tuple[float, int]]:
+        try:
+            stat = os.stat(self.csv_path)
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
+
+    def start(self):
+        """Poll the CSV's mtime in a daemon thread; a zero interval disables polling."""
+        if self.poll_interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._poll, name="catalog-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_interval):
+            stamp = self._file_stamp()
+            if stamp is None or stamp == self._stamp:
+                continue
+            self._stamp = stamp
+            self.reload()
+
+    def reload(self, force: bool = False) -> Dict:
+        """Rebuild from the CSV if its content changed and swap it in; returns a summary."""
+        with self._reload_lock:
+            start = time.perf_counter()
+            try:
+                digest = source_digest(self.csv_path)
+                previous = self.current
+                if digest == previous.version and not force:
+                    return {"reloaded": False, "version": digest}
+
+                rows = read_csv_rows(self.csv_path)
+                index, counts = diff_index(rows, previous)
+                catalog = Catalog(rows, version=digest, index=index)
+                # The catalog keeps its own compact copy of the rows
+                del rows
+                # Build the linker, row vectors and context blocks now rather than on the first request
+                catalog.linker
+                catalog.vectors
+                catalog.context_blocks
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Catalog reload failed, keeping version {str(self.current.version)[:12]}: {str(e)}")
+                return {"reloaded": False, "error": str(e), "version": self.current.version}
+
+            # Publishing is a single reference assignment
+            self.current = catalog
+            trim_heap()
+            self._stamp = self._file_stamp()
+            for listener in self._listeners:
+                try:
+                    listener(catalog)
+                except Exception as e:
+                    logger.error(f"Catalog swap listener failed: {str(e)}")
+
+            self.reloads += 1
+            self.last_reload = str(datetime.now())
+            self.last_duration_ms = round((time.perf_counter() - start) * 1000.0, 1)
+            self.last_diff = counts
+            self.last_error = None
+            logger.info(f"Catalog reloaded: {len(catalog)} rows, version {digest[:12]}, {counts}, {self.last_duration_ms}ms")
+            return {"reloaded": True, "version": digest, "rows": len(catalog), "diff": counts,
+                    "duration_ms": self.last_duration_ms}
+
+    def status(self) -> Dict:
+        return {
+            "version": self.current.version,
+            "rows": len(self.current),
+            "reloads": self.reloads,
+            "last_reload": self.last_reload,
+            "last_duration_ms": self.last_duration_ms,
+            "last_diff": self.last_diff,
+            "last_error": self.last_error,
+            "polling": self._thread is not None and self._thread.is_alive(),
+            "memory_bytes": self.current.memory_usage(),
+            "context_blocks": self.current.context_blocks.stats(),
+        }
@@ -0,0 +1,87 @@
+"""The newsletter catalog as a tool the model can call.
+
+In the `tools` pipeline mode a chat message is not classified by the model
+first. Retrieval runs without a category, unless the linker finds one, and
+the model gets the packed context plus one function, `search_catalog`. When
+the context covers the question, the model answers straight away in a single
+round-trip. When it does not, the model asks for a structured search
+(category, subscriber and price bounds, sort order, audience text). That
+search runs in-process against the loaded Catalog and comes back as the same
+compact table the context uses.
+"""
+
+import json
+from typing import Dict, Tuple
+
+from catalog import SORT_COLUMNS, Catalog, CatalogFilter, parse_bound
+from context_packer import PackedContext
+
+TOOL_NAME = 'search_catalog'
+
+# CatalogFilter bounds the tool accepts, with their descriptions
+NUMERIC_ARGUMENTS = {
+    'min_subscribers': "Minimum subscriber count",
+    'max_subscribers': "Maximum subscriber count",
+    'min_price': "Minimum price of one send, in USD",
+    'max_price': "Maximum price of one send, in USD",
+    'min_cpc': "Minimum cost per click, in USD",
+    'max_cpc': "Maximum cost per click, in USD",
+}
+
+NO_RESULTS = "No newsletters in the catalog match these criteria."
+
+
+def tool_schema(catalog: Catalog) -> Dict:
+    """The OpenAI tool definition of `search_catalog` over this catalog's categories."""
+    properties = {
+        'query': {"type": "string", "description": "Audience, topic or newsletter name to match, e.g. 'parents of toddlers'"},
+        'category': {"type": "string", "enum": list(catalog.category_names)},
+    }
+    for name, description in NUMERIC_ARGUMENTS.items():
+        properties[name] = {"type": "number", "description": description}
+    properties['sort_by'] = {"type": "string", "enum": list(SORT_COLUMNS)}
+    properties['descending'] = {"type": "boolean", "description": "Sort from the highest value down"}
+    return {
+        "type": "function",
+        "function": {
+            "name": TOOL_NAME,
+            "description": "Search the newsletter catalog. Call it only when the provided context does not cover "
+                           "the question, e.g. for a different category, size or budget.",
+            "parameters": {"type": "object", "properties": properties},
+        },
+    }
+
+
+def parse_arguments(catalog: Catalog, arguments: str) -> Tuple[CatalogFilter, str]:
+    """Turn the model's JSON arguments into criteria and search text; invalid fields are ignored."""
+    try:
+        values = json.loads(arguments or '{}')
+    except ValueError:
+        values = {}
+    if not isinstance(values, dict):
+        values = {}
+
+    criteria = CatalogFilter(category=catalog.resolve_category(values.get('category')))
+    for name in NUMERIC_ARGUMENTS:
+        if values.get(name) is not None:
+            number = parse_bound(values[name])
+            if number == number:
+                setattr(criteria, name, number)
+    if values.get('sort_by') in SORT_COLUMNS:
+        criteria.sort_by = values['sort_by']
+        criteria.descending = bool(values.get('descending', False))
+    query = values.get('query')
+    return criteria, query if isinstance(query, str) else ''
+
+
+def run_tool(catalog: Catalog, name: str, arguments: str, limit: int, budget: int, mode: str) -> PackedContext:
+    """Execute one tool call in-process and pack the matching rows."""
+    if name != TOOL_NAME:
+        return PackedContext(text=f"Unknown tool: {name}")
+    criteria, query = parse_arguments(catalog, arguments)
+    if criteria.has_constraints() and not catalog.mask(criteria).any():
+        # Unlike chat search, never relax the bounds the model asked for
+        return PackedContext(text=NO_RESULTS)
+    indices = catalog.select(criteria, query, limit=limit, mode=mode)
+    context = catalog.context_blocks.pack(indices, criteria.category, budget)
+    return context if context.rows else PackedContext(text=NO_RESULTS)
@@ -0,0 +1,258 @@
+"""Token-budgeted packing of catalog rows into the model prompt.
+
+Rows arrive ranked by relevance. Only the columns an answer needs are kept,
+rendered as one pipe-separated line per newsletter under a single header,
+and rows are added greedily until the token budget is spent. Columns that
+are empty for every packed row are dropped, and a category shared by all
+rows is stated once instead of on every line.
+
+Nothing about a row's line depends on the user. `ContextBlocks` therefore
+runs once per catalog version and counts every row's tokens. It also packs
+the block each category gets when a message has nothing else to rank by,
+plus one block for the whole catalog. A request whose ranking matches one
+of these blocks reuses the prebuilt text and token count. Any other request
+still packs its own rows, but does not re-tokenize candidates.
+"""
+
+import math
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# (catalog column, header shown to the model), in display order
+CONTEXT_FIELDS: List[Tuple[str, str]] = [
+    ('Newsletter Name', 'Name'),
+    ('Category', 'Category'),
+    ('Subscribers', 'Subscribers'),
+    ('One Send Price', 'Price'),
+    ('CPC Avg', 'CPC'),
+    ('Click Estimate', 'Clicks'),
+    ('Open rates', 'Open rate'),
+    ('CTR', 'CTR'),
+    ('Website', 'Website'),
+    ('Audience Info', 'Audience'),
+]
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '1500'))
+# Ranked rows considered for one context block
+CONTEXT_MAX_ROWS = int(os.getenv('CONTEXT_MAX_ROWS', '40'))
+AUDIENCE_CHARS = int(os.getenv('CONTEXT_AUDIENCE_CHARS', '200'))
+
+# gpt-3.5-turbo and gpt-4 share this encoding
+TOKENIZER_ENCODING = 'cl100k_base'
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """Load the tiktoken encoding once; None when tiktoken is unavailable."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception:
+            # Not installed, or the BPE file could not be fetched
+            _encoding = None
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with the model's tokenizer, or estimate ~4 characters per token."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+def tokenizer_name() -> str:
+    """Which counter count_tokens uses, so stored token counts can be checked against it."""
+    return TOKENIZER_ENCODING if _get_encoding() is not None else 'chars/4'
+
+
+def _clean(value) -> str:
+    """Flatten a cell to one line; NaN and blanks become empty."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    text = ' '.join(str(value).split()).replace('|', '/')
+    return '' if text.lower() == 'nan' else text
+
+
+def _shorten(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(' ', 1)[0].rstrip(',;:.') + '…'
+
+
+@dataclass
+class PackedContext:
+    """The context block sent to the model and what went into it."""
+    text: str = ''
+    rows: int = 0
+    tokens: int = 0
+    candidates: int = 0
+
+    def __str__(self) -> str:
+        return self.text
+
+
+def _render(rows: List[Dict[str, str]], columns: List[Tuple[str, str]]) -> List[str]:
+    return [' | '.join(row[column] for column, _ in columns) for row in rows]
+
+
+def row_cells(row: Dict) -> Dict[str, str]:
+    """The cleaned, shortened context cells of one catalog row."""
+    cell = {column: _clean(row.get(column)) for column, _ in CONTEXT_FIELDS}
+    cell['Audience Info'] = _shorten(cell['Audience Info'], AUDIENCE_CHARS)
+    return cell
+
+
+def line_cost(cell: Dict[str, str]) -> int:
+    """Tokens a row's line takes with every column shown, plus its newline."""
+    return count_tokens(' | '.join(cell[column] for column, _ in CONTEXT_FIELDS)) + 1
+
+
+def _pack(cells: List[Dict[str, str]], costs: Sequence[int], budget: int) -> PackedContext:
+    """Greedily fit rows, in rank order, into the budget and render the table."""
+    if not cells:
+        return PackedContext()
+
+    # Columns empty for every candidate are never shown
+    columns = [(column, header) for column, header in CONTEXT_FIELDS if any(cell[column] for cell in cells)]
+    header = ' | '.join(title for _, title in columns)
+    used = count_tokens(header) + 1
+
+    # Greedily take rows in rank order while they fit
+    packed = []
+    for cell, cost in zip(cells, costs):
+        if used + cost > budget:
+            continue
+        packed.append(cell)
+        used += cost
+
+    # Tighten the table for the rows actually kept
+    columns = [(column, header) for column, header in columns if any(cell[column] for cell in packed)]
+    preamble = []
+    categories = {cell['Category'] for cell in packed}
+    if len(categories) == 1 and ('Category', 'Category') in columns:
+        preamble.append(f"Category: {categories.pop()}")
+        columns.remove(('Category', 'Category'))
+    lines = preamble + [' | '.join(title for _, title in columns)] + _render(packed, columns)
+    text = '\n'.join(lines) if packed else ''
+    return PackedContext(text=text, rows=len(packed), tokens=count_tokens(text), candidates=len(cells))
+
+
+def pack_context(rows: Sequence[Dict], budget: Optional[int] = None) -> PackedContext:
+    """Serialize ranked rows as a compact table that fits in `budget` tokens."""
+    budget = DEFAULT_TOKEN_BUDGET if budget is None else budget
+    cells = [row_cells(row) for row in rows]
+    return _pack(cells, [line_cost(cell) for cell in cells], budget)
+
+
+def _groups(catalog, max_rows: int) -> Dict[Optional[str], Tuple[int, ...]]:
+    """Rows of each prebuilt block: with nothing to rank by, search returns a category's
+    rows (or the catalog's) in order."""
+    groups = {None: tuple(range(min(len(catalog.rows), max_rows)))}
+    for code, name in enumerate(catalog.category_names):
+        groups[name] = tuple(np.flatnonzero(catalog.category_codes == code)[:max_rows].tolist())
+    return groups
+
+
+def _settings(budget: int, max_rows: int) -> Dict:
+    """Everything a stored block's text and token counts depend on besides the rows."""
+    return {
+        'budget': budget,
+        'max_rows': max_rows,
+        'tokenizer': tokenizer_name(),
+        'fields': [column for column, _ in CONTEXT_FIELDS],
+        'audience_chars': AUDIENCE_CHARS,
+    }
+
+
+class ContextBlocks:
+    """Per-version token costs of every row, and the prebuilt block of every category.
+
+    Built from a Catalog: `rows`, `category_names` and `category_codes` are all it reads.
+    """
+
+    def __init__(self, rows: Sequence[Dict], costs: np.ndarray,
+                 blocks: Dict[Optional[str], Tuple[Tuple[int, ...], PackedContext]], budget: int,
+                 max_rows: int = CONTEXT_MAX_ROWS):
+        self.rows = rows
+        self.costs = costs
+        self.blocks = blocks
+        self.budget = budget
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def build(cls, catalog, budget: Optional[int] = None, max_rows: int = CONTEXT_MAX_ROWS) -> 'ContextBlocks':
+        budget = DEFAULT_TOKEN_BUDGET if budget is None else budget
+        rows = catalog.rows
+        costs = np.fromiter((line_cost(row_cells(row)) for row in rows), dtype=np.int32, count=len(rows))
+
+        blocks = {}
+        for name, indices in _groups(catalog, max_rows).items():
+            cells = [row_cells(rows[i]) for i in indices]
+            blocks[name] = (indices, _pack(cells, costs[list(indices)].tolist(), budget))
+        return cls(rows, costs, blocks, budget, max_rows)
+
+    def sections(self) -> Tuple[Dict, Dict[str, np.ndarray]]:
+        """The header entry and raw arrays that store these blocks in a snapshot."""
+        names = list(self.blocks)
+        packed = [self.blocks[name][1] for name in names]
+        texts = [block.text.encode('utf-8') for block in packed]
+        # Per block: text start, text end, rows, tokens, candidates
+        table, position = [], 0
+        for block, text in zip(packed, texts):
+            table.append([position, position + len(text), block.rows, block.tokens, block.candidates])
+            position += len(text)
+        table = np.array(table, dtype=np.int64).reshape(-1, 5)
+        spec = {'categories': names, **_settings(self.budget, self.max_rows)}
+        arrays = {
+            'context:costs': np.asarray(self.costs, dtype=np.int32),
+            'context:texts': np.frombuffer(b''.join(texts), dtype=np.uint8),
+            'context:blocks': table.ravel(),
+        }
+        return spec, arrays
+
+    @classmethod
+    def from_sections(cls, catalog, spec: Dict, section) -> Optional['ContextBlocks']:
+        """Blocks stored by `sections`; None when they were packed under other settings."""
+        expected = _settings(DEFAULT_TOKEN_BUDGET, CONTEXT_MAX_ROWS)
+        if any(spec.get(key) != value for key, value in expected.items()):
+            return None
+        texts = section('context:texts').tobytes()
+        table = section('context:blocks').reshape(-1, 5).tolist()
+        groups = _groups(catalog, CONTEXT_MAX_ROWS)
+        blocks = {}
+        for name, (start, end, rows, tokens, candidates) in zip(spec['categories'], table):
+            text = texts[start:end].decode('utf-8')
+            blocks[name] = (groups[name], PackedContext(text=text, rows=rows, tokens=tokens, candidates=candidates))
+        return cls(catalog.rows, section('context:costs'), blocks, DEFAULT_TOKEN_BUDGET)
+
+    def block(self, category: Optional[str] = None) -> Optional[PackedContext]:
+        """The prebuilt block for a category; None is the whole catalog."""
+        entry = self.blocks.get(category)
+        return entry[1] if entry is not None else None
+
+    def pack(self, indices: Sequence[int], category: Optional[str] = None,
+             budget: Optional[int] = None) -> PackedContext:
+        """Pack ranked row indices, reusing the category's block when the ranking is its default."""
+        budget = self.budget if budget is None else budget
+        indices = [int(i) for i in indices]
+        entry = self.blocks.get(category)
+        if budget == self.budget and entry is not None and entry[0] == tuple(indices):
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return _pack([row_cells(self.rows[i]) for i in indices], self.costs[indices].tolist(), budget)
+
+    def stats(self) -> Dict:
+        return {"blocks": len(self.blocks), "hits": self.hits, "misses": self.misses}
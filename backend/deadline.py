@@ -0,0 +1,177 @@
+"""Per-request deadlines, and hedged model calls for the slow tail.
+
+A chat request gets a `Deadline` when it arrives. Like the StageTimer, it is
+bound to the request's context, so every stage below can size its own
+timeout from the time that is left:
+
+    deadline = Deadline(CHAT_DEADLINE_SECONDS, DEADLINE_RESERVE_SECONDS).bind()
+    ...
+    await asyncio.wait_for(call(), timeout=stage_timeout(cap=2.0))
+
+The budget sits under the platform limit (Vercel's maxDuration). A reserve is
+held back so that, when the model is too slow, there is still time to render
+an answer from the catalog instead of ending in a 504.
+
+`hedged()` starts a second, identical call when the first is still running
+after a high percentile of recent call latencies, and returns whichever
+finishes first. A rare slow call then no longer sets the response time, at
+the cost of a few percent more calls. `hedged_sync()` does the same with
+threads for the blocking serverless handler.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+
+T = TypeVar('T')
+
+# Vercel stops functions at maxDuration (10 s); answer comfortably before that
+CHAT_DEADLINE_SECONDS = float(os.getenv('CHAT_DEADLINE_SECONDS', '9'))
+# Held back from every stage for rendering a degraded answer
+DEADLINE_RESERVE_SECONDS = float(os.getenv('DEADLINE_RESERVE_SECONDS', '0.5'))
+# Hedge calls slower than this percentile of recent ones; 0 disables hedging
+HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', '0.95'))
+
+# The deadline of the request being handled
+_current: ContextVar[Optional['Deadline']] = ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request has no time left for another stage."""
+
+
+class Deadline:
+    """The time budget of one request."""
+
+    def __init__(self, budget: float, reserve: float = 0.0):
+        self.budget = budget
+        self.reserve = reserve
+        self.started = time.monotonic()
+
+    def bind(self) -> 'Deadline':
+        """Make this the current request's deadline for `stage_timeout()`."""
+        _current.set(self)
+        return self
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self) -> float:
+        """Seconds left for work, not counting the reserve."""
+        return self.budget - self.reserve - self.elapsed()
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Timeout for the next stage: the time left, bounded by the stage's own cap."""
+        left = self.remaining()
+        if left <= 0:
+            raise DeadlineExceeded(f"Deadline of {self.budget:.1f}s reached after {self.elapsed():.2f}s")
+        return left if cap is None else min(cap, left)
+
+
+def current() -> Optional[Deadline]:
+    return _current.get()
+
+
+def stage_timeout(cap: Optional[float] = None) -> Optional[float]:
+    """Timeout for a stage of the current request; just `cap` when no deadline is bound."""
+    deadline = _current.get()
+    return cap if deadline is None else deadline.timeout(cap)
+
+
+class LatencyWindow:
+    """Durations of recent calls, for choosing when to hedge."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """The q-th quantile of recent durations; None until enough calls were seen."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def hedge_delay(self, q: float = HEDGE_PERCENTILE) -> Optional[float]:
+        """When to start a backup call, or None to not hedge.
+
+        No hedge is sent unless the backup could finish before the deadline.
+        """
+        if q <= 0:
+            return None
+        delay = self.percentile(q)
+        deadline = current()
+        if delay is None or (deadline is not None and deadline.remaining() < 2 * delay):
+            return None
+        return delay
+
+
+async def hedged(call: Callable[[], Awaitable[T]], delay: Optional[float],
+                 backup: Optional[Callable[[], Optional[Awaitable[T]]]] = None) -> T:
+    """Await `call()`; if it is still running after `delay`, race a backup call.
+
+    `backup` defaults to `call` and may return None to skip the hedge, e.g.
+    when the token budget has no room for it. The first success wins and the
+    other call is cancelled, so calls must settle what they hold (such as a
+    token reservation) on cancellation. If both fail, the primary call's
+    error is raised.
+    """
+    first = asyncio.ensure_future(call())
+    tasks = [first]
+    try:
+        if delay is None:
+            return await first
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        second = None if done else (backup or call)()
+        if second is None:
+            return await first
+        tasks.append(asyncio.ensure_future(second))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+        raise first.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def hedged_sync(call: Callable[[], T], delay: Optional[float], backup: Optional[Callable[[], T]] = None,
+                allow_backup: Optional[Callable[[], bool]] = None) -> T:
+    """Thread-based `hedged()` for blocking calls.
+
+    `allow_backup` is asked when the hedge is due; False skips it. A losing
+    call cannot be interrupted; it runs on until its own timeout.
+    """
+    if delay is None:
+        return call()
+    pool = ThreadPoolExecutor(max_workers=2)
+    try:
+        # Copy the context so the calls see the request's deadline and timer
+        first = pool.submit(contextvars.copy_context().run, call)
+        done, _ = wait([first], timeout=delay)
+        if done or (allow_backup is not None and not allow_backup()):
+            return first.result()
+        pending = {first, pool.submit(contextvars.copy_context().run, backup or call)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+        raise first.exception()
+    finally:
+        pool.shutdown(wait=False)
@@ -0,0 +1,11 @@
+"""HTTP caching helpers shared by the newsletter query API and the static pages."""
+
+from typing import Optional
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names this ETag, weakly or with "*"."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or f"W/{etag}" in candidates
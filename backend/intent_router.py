@@ -0,0 +1,184 @@
+"""Deterministic answers for list and lookup questions, in front of the model.
+
+Much chat traffic is a plain catalog query: "list travel newsletters",
+"newsletters with over 500k subscribers", "how much does 3pulse.com cost".
+The router parses a message with the same pieces retrieval uses (numeric
+filters and sort hints from extract_filters, categories and newsletter names
+from the linker). It answers from a markdown template only when nothing else
+is left in the message but filler words. Anything open-ended ("newsletters for
+my vegan snack brand") goes to the model as before, so a miss costs one linker
+pass and a hit skips the model entirely.
+"""
+
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from answers import render_catalog_answer, render_newsletter_card
+from catalog import Catalog, CatalogFilter, extract_filters
+from linker import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Set INTENT_ROUTER=0 to send every question to the model
+ROUTER_ENABLED = os.getenv('INTENT_ROUTER', '1') == '1'
+# Newsletters listed in a routed answer
+ROUTER_LIST_LIMIT = int(os.getenv('INTENT_ROUTER_LIST_LIMIT', '10'))
+
+LIST = 'list'
+LOOKUP = 'lookup'
+INTENTS = (LIST, LOOKUP)
+
+# Words that carry no constraint in a list request ("show me all the ... newsletters, please")
+FILLER_WORDS = frozenset('''
+    a all an and any are can could do find for from get give have i in is list me
+    my newsletter newsletters of on options please related see show some that the
+    there to us want what which with would you your
+'''.split())
+
+# Extra words a lookup of one named newsletter may use ("how much does X cost per send?")
+LOOKUP_WORDS = frozenset('''
+    about ad ads audience big cost costs does how info information is it its large
+    many much one per placement price priced prices pricing rate rates reach
+    readers send sponsor sponsorship subs subscriber subscribers tell what's whats who
+    click clicks cpc details charge charges
+'''.split())
+
+WORD_RE = re.compile(r"[a-z0-9$']+")
+
+# How a routed list is ordered, keyed by (sort_by, descending)
+ORDER_LABELS = {
+    ('subscribers', True): 'largest first',
+    ('subscribers', False): 'smallest first',
+    ('price', False): 'cheapest first',
+    ('price', True): 'most expensive first',
+    ('cpc', False): 'lowest CPC first',
+    ('cpc', True): 'highest CPC first',
+    ('clicks', True): 'most clicks first',
+    ('clicks', False): 'fewest clicks first',
+}
+
+
+@dataclass
+class RoutedAnswer:
+    """A templated reply and the intent that produced it."""
+    intent: str
+    text: str
+    rows: int
+
+
+def _count(value: float) -> str:
+    if value >= 1e6:
+        return f"{value / 1e6:g}M"
+    if value >= 1e3:
+        return f"{value / 1e3:g}k"
+    return f"{value:g}"
+
+
+def _money(value: float) -> str:
+    return f"${value:,.2f}" if value < 10 and value != int(value) else f"${value:,.0f}"
+
+
+def describe_criteria(criteria: CatalogFilter) -> str:
+    """The numeric bounds as a phrase, e.g. ' with at least 500k subscribers and at most $2,000 per send'."""
+    phrases = []
+    if criteria.min_subscribers is not None:
+        phrases.append(f"at least {_count(criteria.min_subscribers)} subscribers")
+    if criteria.max_subscribers is not None:
+        phrases.append(f"at most {_count(criteria.max_subscribers)} subscribers")
+    if criteria.min_price is not None:
+        phrases.append(f"a price of at least {_money(criteria.min_price)} per send")
+    if criteria.max_price is not None:
+        phrases.append(f"a price of at most {_money(criteria.max_price)} per send")
+    if criteria.min_cpc is not None:
+        phrases.append(f"a CPC of at least {_money(criteria.min_cpc)}")
+    if criteria.max_cpc is not None:
+        phrases.append(f"a CPC of at most {_money(criteria.max_cpc)}")
+    return ' with ' + ' and '.join(phrases) if phrases else ''
+
+
+def leftover_words(text: str, spans: List) -> List[str]:
+    """Words of a normalized message outside the linked spans."""
+    pieces, position = [], 0
+    for start, end in spans:
+        pieces.append(text[position:start])
+        position = end
+    pieces.append(text[position:])
+    return WORD_RE.findall(' '.join(pieces))
+
+
+class IntentRouter:
+    """Answers list and lookup questions from templates and counts how often it could."""
+
+    def __init__(self, enabled: bool = ROUTER_ENABLED, list_limit: int = ROUTER_LIST_LIMIT):
+        self.enabled = enabled
+        self.list_limit = list_limit
+        self._lock = threading.Lock()
+        self.routed: Dict[str, int] = {intent: 0 for intent in INTENTS}
+        self.passed = 0
+
+    def route(self, catalog: Catalog, message: str) -> Optional[RoutedAnswer]:
+        """Return a templated answer, or None when the question needs the model."""
+        if not self.enabled:
+            return None
+        try:
+            answer = self._route(catalog, message)
+        except Exception as e:
+            # A template bug must never cost the user an answer; the model still has it
+            logger.error(f"Intent router failed on {message!r}: {str(e)}")
+            answer = None
+        with self._lock:
+            if answer is None:
+                self.passed += 1
+            else:
+                self.routed[answer.intent] += 1
+        return answer
+
+    def _route(self, catalog: Catalog, message: str) -> Optional[RoutedAnswer]:
+        criteria, remaining = extract_filters(message)
+        linked = catalog.link(remaining)
+        words = leftover_words(normalize_text(remaining), linked.spans)
+
+        if linked.newsletters:
+            # One named newsletter and nothing but a question about it
+            if len(linked.newsletters) > 1 or criteria.has_constraints():
+                return None
+            if any(word not in FILLER_WORDS and word not in LOOKUP_WORDS for word in words):
+                return None
+            return RoutedAnswer(LOOKUP, render_newsletter_card(catalog.rows[linked.newsletters[0]]), 1)
+
+        if any(word not in FILLER_WORDS for word in words) or len(linked.categories) > 1:
+            return None
+        criteria.category = linked.category
+        if criteria.category is None and not criteria.has_constraints():
+            return None  # "list newsletters" alone is too broad for a template
+        if criteria.sort_by is None:
+            criteria.sort_by, criteria.descending = 'subscribers', True
+
+        indices = catalog.filter(criteria)
+        if not len(indices):
+            # The model can suggest near misses; a template could only say "none"
+            return None
+        shown = min(len(indices), self.list_limit)
+        noun = f"{criteria.category} newsletters" if criteria.category else "newsletters"
+        count = f"the {len(indices)}" if shown == len(indices) else f"{shown} of the {len(indices)}"
+        intro = (f"Here are {count} {noun}{describe_criteria(criteria)} in our catalog, "
+                 f"{ORDER_LABELS[(criteria.sort_by, criteria.descending)]}:")
+        records = catalog.records(indices[:shown].tolist())
+        return RoutedAnswer(LIST, render_catalog_answer(records, limit=shown, intro=intro), shown)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            routed = sum(self.routed.values())
+            messages = routed + self.passed
+            return {
+                "enabled": self.enabled,
+                "messages": messages,
+                "routed": routed,
+                "to_model": self.passed,
+                "hit_rate": round(routed / messages, 4) if messages else 0.0,
+                "intents": dict(self.routed),
+            }
@@ -0,0 +1,201 @@
+"""Single-pass entity and category linking with an Aho-Corasick automaton.
+
+One automaton is compiled per catalog over every category name, a curated
+synonym list and every newsletter name. Linking a message is one linear scan
+of its characters, regardless of how many patterns there are, and yields the
+categories and specific newsletters it mentions together with a confidence
+score that tells the caller whether an LLM fallback is worth paying for.
+"""
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Curated synonyms, keyed by catalog category. Entries whose category is not
+# in the loaded catalog are skipped.
+SYNONYMS: Dict[str, List[str]] = {
+    'Finance & Investing': ['finance', 'financial', 'investing', 'investors', 'investment', 'stocks',
+                            'stock market', 'personal finance', 'wealth', 'trading', 'traders', 'fintech',
+                            'money', 'retirement', 'markets'],
+    'Crypto': ['cryptocurrency', 'cryptocurrencies', 'bitcoin', 'btc', 'ethereum', 'web3', 'blockchain',
+               'defi', 'nft', 'nfts'],
+    'AI': ['artificial intelligence', 'machine learning', 'llm', 'llms', 'chatgpt', 'genai',
+           'generative ai', 'gpt'],
+    'Tech': ['technology', 'gadgets', 'tech news', 'consumer tech', 'software'],
+    'DEV/IT': ['developer', 'developers', 'programming', 'programmers', 'coding', 'devops', 'software engineers',
+               'it pros', 'sysadmin', 'cybersecurity'],
+    'Marketing': ['marketers', 'advertising', 'growth marketing', 'seo', 'social media', 'adtech', 'martech'],
+    'Business': ['b2b', 'executives', 'entrepreneurs', 'leadership', 'management', 'small business'],
+    'Startups': ['startup', 'founders', 'venture capital', 'vc', 'saas founders'],
+    'Ecom': ['ecommerce', 'e-commerce', 'online store', 'shopify', 'dtc', 'd2c', 'retail'],
+    'Health & Wellness': ['health', 'wellness', 'nutrition', 'mental health', 'healthcare'],
+    'Sports & Fitness': ['sports', 'fitness', 'workout', 'running', 'athletes', 'gym'],
+    'Food & Drink': ['food', 'drinks', 'cooking', 'recipes', 'restaurants', 'wine', 'coffee'],
+    'Travel': ['travelers', 'travellers', 'vacation', 'trips', 'tourism'],
+    'Family': ['parents', 'parenting', 'moms', 'dads', 'kids', 'new parents', 'mothers', 'fathers'],
+    'HR': ['human resources', 'recruiting', 'recruiters', 'hiring', 'talent'],
+    'Education': ['teachers', 'students', 'learning', 'edtech', 'schools'],
+    'Design': ['designers', 'ux', 'ui', 'graphic design'],
+    'Entertainment': ['movies', 'tv', 'pop culture', 'celebrities', 'streaming'],
+    'Games': ['gaming', 'gamers', 'video games'],
+    'Real Estate': ['real estate investors', 'property', 'housing', 'realtors'],
+    'Self-Improvement': ['productivity', 'self improvement', 'personal growth', 'self-help'],
+    'Lifestyle': ['fashion', 'lifestyle brands'],
+    'Beauty': ['skincare', 'cosmetics', 'makeup'],
+    'Pets': ['dogs', 'cats', 'pet owners'],
+    'Music': ['musicians', 'music fans'],
+    'Photography': ['photographers', 'cameras'],
+    'Faith & Spirituality': ['faith', 'spirituality', 'christian', 'religion'],
+    'Automotive': ['cars', 'auto', 'car enthusiasts'],
+    'Construction': ['contractors', 'builders'],
+    'Law': ['legal', 'lawyers', 'attorneys'],
+    'Medical': ['doctors', 'physicians', 'clinicians'],
+}
+
+# How much each kind of hit counts towards a category
+CATEGORY_WEIGHT = 1.0
+SYNONYM_WEIGHT = 0.8
+NEWSLETTER_WEIGHT = 0.6
+
+CATEGORY = 'category'
+SYNONYM = 'synonym'
+NEWSLETTER = 'newsletter'
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace; patterns and messages share this form."""
+    return ' '.join((text or '').lower().split())
+
+
+class AhoCorasick:
+    """Character-level Aho-Corasick automaton mapping patterns to payloads."""
+
+    def __init__(self):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.outputs: List[List[int]] = [[]]
+        self.patterns: List[Tuple[str, object]] = []
+
+    def add(self, pattern: str, payload):
+        node = 0
+        for char in pattern:
+            next_node = self.goto[node].get(char)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][char] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            node = next_node
+        self.outputs[node].append(len(self.patterns))
+        self.patterns.append((pattern, payload))
+
+    def build(self):
+        """Compute failure links breadth-first."""
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """Yield (start, end, pattern id) for every occurrence in one pass."""
+        node = 0
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for pattern_id in outputs[node]:
+                end = position + 1
+                yield end - len(self.patterns[pattern_id][0]), end, pattern_id
+
+
+@dataclass
+class LinkResult:
+    """Categories and newsletters found in a message."""
+    categories: List[Tuple[str, float]] = field(default_factory=list)
+    newsletters: List[int] = field(default_factory=list)
+    confidence: float = 0.0
+    # (start, end) of each linked phrase in the message's normalize_text() form
+    spans: List[Tuple[int, int]] = field(default_factory=list)
+
+    @property
+    def category(self) -> Optional[str]:
+        return self.categories[0][0] if self.categories else None
+
+
+def _is_boundary(text: str, index: int) -> bool:
+    return index < 0 or index >= len(text) or not text[index].isalnum()
+
+
+class EntityLinker:
+    """Finds category names, synonyms and newsletter names in a message."""
+
+    def __init__(self, category_names: Sequence[str], newsletter_names: Sequence[str],
+                 newsletter_categories: Sequence[str]):
+        self.newsletter_categories = list(newsletter_categories)
+        self.automaton = AhoCorasick()
+        known = set(category_names)
+
+        for name in category_names:
+            self.automaton.add(normalize_text(name), (CATEGORY, name, None))
+        for category, synonyms in SYNONYMS.items():
+            if category in known:
+                for synonym in synonyms:
+                    self.automaton.add(normalize_text(synonym), (SYNONYM, category, None))
+        for row_id, name in enumerate(newsletter_names):
+            pattern = normalize_text(name)
+            if len(pattern) < 4:
+                continue
+            # Single dictionary words ("Blind", "Fortune") only count when
+            # written with the newsletter's own capitalization
+            exact = name.strip() if (' ' not in pattern and pattern.isalpha()) else None
+            self.automaton.add(pattern, (NEWSLETTER, row_id, exact))
+        self.automaton.build()
+
+    def link(self, message: str) -> LinkResult:
+        """Link a message in one pass over its characters."""
+        original = ' '.join((message or '').split())
+        text = original.lower()
+
+        # Keep whole-word matches only, longest first, without overlaps
+        candidates = []
+        for start, end, pattern_id in self.automaton.iter_matches(text):
+            if not (_is_boundary(text, start - 1) and _is_boundary(text, end)):
+                continue
+            kind, value, exact = self.automaton.patterns[pattern_id][1]
+            if exact is not None and original[start:end] != exact:
+                continue
+            candidates.append((end - start, start, end, kind, value))
+        candidates.sort(key=lambda item: (-item[0], item[1]))
+
+        taken: List[Tuple[int, int]] = []
+        scores: Dict[str, float] = {}
+        newsletters: List[int] = []
+        for _, start, end, kind, value in candidates:
+            if any(start < other_end and other_start < end for other_start, other_end in taken):
+                continue
+            taken.append((start, end))
+            if kind == NEWSLETTER:
+                if value not in newsletters:
+                    newsletters.append(value)
+                category, weight = self.newsletter_categories[value], NEWSLETTER_WEIGHT
+            else:
+                category = value
+                weight = CATEGORY_WEIGHT if kind == CATEGORY else SYNONYM_WEIGHT
+            if category:
+                scores[category] = max(scores.get(category, 0.0), weight)
+
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        confidence = ranked[0][1] if ranked else 0.0
+        if len(ranked) > 1 and ranked[1][1] == ranked[0][1]:
+            # Two equally strong categories: the message is ambiguous
+            confidence /= 2.0
+        return LinkResult(categories=ranked, newsletters=newsletters, confidence=confidence, spans=sorted(taken))
@@ -0,0 +1,47 @@
+"""Process-wide async OpenAI client with a pooled, keep-alive HTTP transport.
+
+Creating an `openai.OpenAI()` per call pays a fresh TCP/TLS handshake every
+time. The client here is created lazily on first use and then shared by every
+request in the process, so connections are reused across chats.
+"""
+
+import logging
+import os
+from typing import Optional
+
+import httpx
+import openai
+
+logger = logging.getLogger(__name__)
+
+MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '100'))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', '20'))
+KEEPALIVE_EXPIRY = float(os.getenv('LLM_KEEPALIVE_SECONDS', '60'))
+REQUEST_TIMEOUT = float(os.getenv('LLM_TIMEOUT_SECONDS', '30'))
+
+_client: Optional[openai.AsyncOpenAI] = None
+
+
+def get_client() -> openai.AsyncOpenAI:
+    """Return the shared async client, creating it on first use."""
+    global _client
+    if _client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=5.0),
+        )
+        _client = openai.AsyncOpenAI(http_client=http_client, max_retries=1)
+        logger.info(f"Created shared async OpenAI client (max {MAX_CONNECTIONS} connections)")
+    return _client
+
+
+async def close_client():
+    """Close the shared client's connection pool on shutdown."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
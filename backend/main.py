@@ -1,9 +1,11 @@
-from fastapi import FastAPI, HTTPException
+import time
+_startup_started = time.perf_counter()
+
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-import pandas as pd
 import numpy as np
 import os
 import sys
@@ -12,13 +14,40 @@ import logging
 import traceback
 from dotenv import load_dotenv
 import json
-import time
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+import asyncio
+import hmac
+from typing import List, Dict, Optional, Tuple
 import openai
 import io
 import pkgutil
 
+# Make the shared catalog modules importable however the app is launched
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from catalog import LINK_CONFIDENCE, RETRIEVAL_MODES, Catalog
+from catalog_manager import CatalogManager
+from catalog_tools import run_tool, tool_schema
+from readiness import ClientReadiness, StartupReport
+from llm import close_client, get_client
+from streaming import SSE_HEADERS, sse_event
+from response_cache import ResponseCache, cache_key, context_fingerprint
+from shared_state import open_state
+from rate_limiter import AsyncTokenBucket, RateLimitTimeout, Reservation
+from singleflight import Flight, SingleFlight
+from context_packer import PackedContext, count_tokens
+from sessions import Session, SessionStore
+from newsletter_query import handle_query
+from timing import StageTimer, record_stage, stage
+from static_assets import StaticAssets
+from metrics import CONTENT_TYPE, REQUEST_ID_HEADER, PipelineMetrics, request_id
+from deadline import (CHAT_DEADLINE_SECONDS, DEADLINE_RESERVE_SECONDS, Deadline, DeadlineExceeded,
+                      LatencyWindow, hedged, stage_timeout)
+from answers import render_catalog_answer
+from intent_router import IntentRouter, RoutedAnswer
+
+# Time each startup stage so slow cold starts can be attributed
+startup_report = StartupReport(started=_startup_started)
+startup_report.record('import', time.perf_counter() - _startup_started)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -36,8 +65,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[REQUEST_ID_HEADER],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Tag each request with an ID (the caller's X-Request-ID if valid) and echo it back."""
+    request.state.request_id = request_id(request.headers.get(REQUEST_ID_HEADER))
+    response = await call_next(request)
+    response.headers[REQUEST_ID_HEADER] = request.state.request_id
+    return response
+
 # Mount static files
 try:
     # Check if the frontend directory exists at the expected path
@@ -52,284 +90,813 @@ except Exception as e:
 
 # Load data
 try:
-    # Simplify CSV loading for Vercel - focus on speed
-    is_vercel = os.environ.get('VERCEL') == '1'
-    
-    if is_vercel:
-        # When deployed on Vercel: read CSV from the packaged data
-        logger.info("Running on Vercel, loading CSV from package data")
-        
-        # For Vercel, the CSV file should be accessible relative to the current file
-        csv_path = os.path.join(os.path.dirname(__file__), 'data', 'context.csv')
-        
-        # Use a more memory-efficient approach for Vercel
-        df = pd.read_csv(csv_path, dtype={'Category': 'category'})
-    else:
-        # Local development: read directly from file system
-        logger.info("Running locally, loading CSV from file system")
-        df = pd.read_csv('backend/data/context.csv')
-        
-    logger.info(f"Successfully loaded {len(df)} rows from context.csv")
+    # The CSV ships next to this file both locally and on Vercel
+    csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'context.csv')
+
+    # Memory-map the prebuilt snapshot when it matches the CSV, else parse the CSV.
+    # Later edits to the CSV are rebuilt in the background and swapped in.
+    catalog_manager = CatalogManager(
+        csv_path,
+        poll_interval=float(os.getenv('CATALOG_POLL_SECONDS', '5')),
+        report=startup_report,
+    )
+    logger.info(f"Successfully loaded {len(catalog_manager.current)} rows from context.csv (version {catalog_manager.current.version[:12]})")
 except Exception as e:
     logger.error(f"Error loading CSV file: {str(e)}")
     raise
 
+# Count row tokens and pack the per-category context blocks before the first request,
+# unless the snapshot already carried them
+with startup_report.stage('context_blocks'):
+    catalog_manager.current.context_blocks
+
+# Keep the chat page and embed chat box in memory; encodings load or compress on first request
+with startup_report.stage('static_assets'):
+    static_assets = StaticAssets(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'frontend'))
+
 # Get available categories
-available_categories = df['Category'].unique().tolist()
-logger.info(f"Available categories: {available_categories}")
-
-# Add token tracking
-class TokenTracker:
-    def __init__(self):
-        self.tokens_used = 0
-        self.last_reset = datetime.now()
-        self.rate_limit = 20000  # tokens per minute
-        
-    def add_tokens(self, count):
-        now = datetime.now()
-        if now - self.last_reset > timedelta(minutes=1):
-            self.tokens_used = 0
-            self.last_reset = now
-        self.tokens_used += count
-        
-    def can_make_request(self, estimated_tokens):
-        now = datetime.now()
-        if now - self.last_reset > timedelta(minutes=1):
-            self.tokens_used = 0
-            self.last_reset = now
-        return (self.tokens_used + estimated_tokens) <= self.rate_limit
-    
-    def wait_if_needed(self):
-        if self.tokens_used >= self.rate_limit:
-            wait_time = 60 - (datetime.now() - self.last_reset).total_seconds()
-            if wait_time > 0:
-                time.sleep(wait_time)
-            self.tokens_used = 0
-            self.last_reset = datetime.now()
+logger.info(f"Available categories: {catalog_manager.current.category_names}")
+
+# Share the token budget, caches and sessions across worker processes when configured
+try:
+    shared_state = open_state(os.getenv('SHARED_STATE_URL'))
+except Exception as e:
+    logger.error(f"Error opening shared state: {str(e)}")
+    raise
+
+# Share the provider's tokens-per-minute quota through a continuously refilling bucket
+RATE_LIMIT_TOKENS_PER_MINUTE = float(os.getenv('RATE_LIMIT_TOKENS_PER_MINUTE', '20000'))
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv('RATE_LIMIT_MAX_WAIT_SECONDS', '20'))
+token_bucket = AsyncTokenBucket(
+    capacity=RATE_LIMIT_TOKENS_PER_MINUTE,
+    refill_per_second=RATE_LIMIT_TOKENS_PER_MINUTE / 60.0,
+    state=shared_state,
+)
+
+# Memoize model category classifications for messages the linker can't place
+category_memo = ResponseCache(max_entries=4096, ttl=float(os.getenv('CATEGORY_MEMO_TTL_SECONDS', '86400')),
+                              state=shared_state, namespace='categories')
+
+# Cache answers for repeat questions; keys include the catalog version
+response_cache = ResponseCache(
+    max_entries=int(os.getenv('RESPONSE_CACHE_SIZE', '1024')),
+    ttl=float(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '3600')),
+    state=shared_state,
+)
+
+def sync_caches(catalog: Catalog):
+    """Drop answers and classifications computed from a previous catalog version."""
+    response_cache.sync_version(catalog.version)
+    category_memo.sync_version(catalog.version)
+
+sync_caches(catalog_manager.current)
+catalog_manager.subscribe(sync_caches)
+
+# Admin endpoints are disabled unless a token is configured
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+# Keep each conversation server-side; older turns are folded into a summary
+sessions = SessionStore(
+    max_sessions=int(os.getenv('SESSION_MAX', '10000')),
+    ttl=float(os.getenv('SESSION_TTL_SECONDS', '21600')),
+    history_budget=int(os.getenv('SESSION_HISTORY_TOKENS', '1000')),
+    state=shared_state,
+)
+
+# Coalesce concurrent identical chats and classifications into one LLM call
+chat_flights = SingleFlight()
+category_flights = SingleFlight()
+
+# Recent answer latencies decide when a slow call gets a hedged backup
+llm_latency = LatencyWindow()
+# A model classification may take at most this much of a request's deadline
+CATEGORY_TIMEOUT_SECONDS = float(os.getenv('CATEGORY_TIMEOUT_SECONDS', '2'))
+
+# Stage latencies, token counts, cache hits and LLM errors, served on /metrics
+metrics = PipelineMetrics()
+metrics.registry.gauge('rate_limit_queue_depth', "Requests waiting for rate limit budget.",
+                       lambda: token_bucket.stats()["queue_depth"])
+metrics.registry.gauge('rate_limit_available_tokens', "Tokens currently available in the bucket.",
+                       lambda: token_bucket.stats()["available_tokens"])
+metrics.registry.gauge('response_cache_entries', "Answers held in the response cache.",
+                       lambda: response_cache.stats()["entries"])
+metrics.registry.gauge('single_flight_in_flight', "Distinct chat answers currently being generated.",
+                       lambda: chat_flights.stats()["in_flight"])
+metrics.registry.gauge('sessions_active', "Chat sessions held in memory.",
+                       lambda: sessions.stats()["sessions"])
+
+# Candidate rows ranked for the prompt, and the tokens they may take up
+CONTEXT_MAX_ROWS = int(os.getenv('CONTEXT_MAX_ROWS', '40'))
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '1500'))
+# keyword (BM25), semantic (audience vectors) or hybrid (both, rank-fused)
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'hybrid')
+if RETRIEVAL_MODE not in RETRIEVAL_MODES:
+    raise ValueError(f"RETRIEVAL_MODE must be one of {', '.join(RETRIEVAL_MODES)}")
 
-token_tracker = TokenTracker()
+# How a message the linker cannot place reaches its answer:
+#   classify  a model call picks the category, then a second call answers (two round-trips)
+#   retrieve  retrieval runs across all categories and one call answers
+#   tools     as retrieve, and the model may call search_catalog, which runs in-process
+#             (one round-trip unless it does; streams behave as retrieve)
+PIPELINE_MODES = ('classify', 'retrieve', 'tools')
+PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'classify')
+if PIPELINE_MODE not in PIPELINE_MODES:
+    raise ValueError(f"PIPELINE_MODE must be one of {', '.join(PIPELINE_MODES)}")
+
+# Batch questions per request, and batch LLM calls in flight across all batches
+BATCH_MAX_QUESTIONS = int(os.getenv('BATCH_MAX_QUESTIONS', '50'))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '8'))
+# Batch calls may queue for the token budget longer than interactive chats
+BATCH_MAX_WAIT_SECONDS = float(os.getenv('BATCH_MAX_WAIT_SECONDS', '120'))
+batch_slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+# List and lookup questions are answered from templates without a model call
+intent_router = IntentRouter()
 
 def estimate_tokens(text):
-    # Rough estimation: 1 token ≈ 4 characters
-    return len(text) // 4
+    # Counted with the model's tokenizer when tiktoken is installed
+    return count_tokens(text)
 
 def validate_api_key():
+    """Check the OpenAI API key without spending completion tokens; raises on failure."""
+    # Load API key
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY environment variable not set")
+
+    # Validate API key format
+    if not api_key.startswith("sk-"):
+        raise ValueError("Invalid API key format")
+
+    logger.info(f"API key loaded successfully")
+    logger.info(f"API key length: {len(api_key)} characters")
+    logger.info(f"API key prefix: {api_key[:7]}...")
+
+    # Listing models authenticates the key without a chat completion
+    openai.api_key = api_key
+    client = openai.OpenAI(max_retries=0, timeout=10.0)
     try:
-        # Load API key
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY environment variable not set")
-        
-        # Validate API key format
-        if not api_key.startswith("sk-"):
-            raise ValueError("Invalid API key format")
-        
-        logger.info(f"API key loaded successfully")
-        logger.info(f"API key length: {len(api_key)} characters")
-        logger.info(f"API key prefix: {api_key[:7]}...")
-        
-        # Initialize OpenAI client
-        openai.api_key = api_key
-        client = openai.OpenAI()
-        
-        # Test with minimal request
-        try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": "Hi"}],
-                max_tokens=10
-            )
-            logger.info("OpenAI client initialized successfully and API key validated")
-            return True
-        except Exception as e:
-            if "rate_limit_error" in str(e):
-                logger.warning("Rate limit hit during API key validation, waiting 60 seconds...")
-                time.sleep(60)
-                # Try one more time after waiting
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[{"role": "user", "content": "Hi"}],
-                    max_tokens=10
-                )
-                logger.info("OpenAI client initialized successfully after rate limit wait")
-                return True
-            raise e
-            
-    except Exception as e:
-        logger.error(f"OpenAI API Error: {str(e)}")
-        if "rate_limit_error" in str(e):
-            logger.error("This might be due to an invalid API key or insufficient credits")
+        client.models.list()
+    except openai.RateLimitError:
+        # The key authenticated; we are only throttled right now
+        logger.warning("Rate limit hit during API key validation, treating key as valid")
+
+# Validate the API key in the background after startup and cache the result
+client_readiness = ClientReadiness(
+    validate_api_key,
+    ttl=float(os.getenv('READINESS_TTL_SECONDS', '300')),
+    failure_ttl=float(os.getenv('READINESS_RETRY_SECONDS', '30')),
+)
+
+@app.on_event("startup")
+async def on_startup():
+    """Report startup timings and kick off client validation without blocking."""
+    startup_report.finish()
+    logger.info(f"Startup timings: {startup_report.summary()}")
+    client_readiness.start()
+    catalog_manager.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Release pooled LLM connections."""
+    catalog_manager.stop()
+    await close_client()
+    if shared_state is not None:
+        shared_state.close()
+
+SYSTEM_PROMPT = "You are a helpful AI assistant that provides information about newsletters. Format the response in a clear, structured way with categories, subscriber counts, prices, and audience information. Always include this disclaimer at the end of your response: 'Keep in mind these subscriber numbers and starting prices are approximate.\n**For specific details, past performance data, newsletter funnel tips, and a FREE Custom Proposal**, pick a time to speak to a representative. [Click Here](https://sponsorindex.setmore.com)'"
+
+def estimate_message_tokens(messages: List[Dict], max_tokens: int) -> int:
+    """Estimate prompt tokens plus the completion allowance a request can spend."""
+    return sum(estimate_tokens(str(m.get("content", ""))) + 4 for m in messages) + max_tokens
+
+async def reserve_tokens(messages: List[Dict], max_tokens: int, max_wait: Optional[float] = None) -> Reservation:
+    """Wait in the token bucket's queue; raises RateLimitTimeout past the deadline."""
+    try:
+        reservation = await token_bucket.acquire(
+            estimate_message_tokens(messages, max_tokens),
+            # Never wait past the request's deadline
+            timeout=stage_timeout(max_wait if max_wait is not None else RATE_LIMIT_MAX_WAIT_SECONDS),
+        )
+    except RateLimitTimeout:
+        metrics.rate_limit_timeouts.inc()
         raise
+    metrics.rate_limit_wait.observe(reservation.waited)
+    if reservation.waited > 0:
+        record_stage('rate_limit_wait', reservation.waited)
+        logger.info(f"Waited {reservation.waited:.2f}s for {reservation.tokens:.0f} tokens of rate limit budget")
+    return reservation
 
-# Validate API key on startup
-validate_api_key()
+def record_usage(reservation: Reservation, usage):
+    """Settle a reservation against the usage reported by the API."""
+    if usage is not None:
+        token_bucket.reconcile(reservation, usage.total_tokens)
+        metrics.record_tokens(usage.prompt_tokens, usage.completion_tokens)
 
-def chunk_context(data: list, chunk_size: int = 10, category: str = None) -> list:
-    """Split the context data into chunks."""
-    if category:
-        filtered_data = data[data['Category'] == category]
-    else:
-        filtered_data = data
+def build_messages(message: str, context: PackedContext, conversation_history: Optional[List[Dict]] = []) -> List[Dict]:
+    """Assemble the system prompt, history and context-bearing question."""
+    # Prepare messages for OpenAI
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    
+    # Add conversation history
+    messages.extend(conversation_history)
+    
+    # Add current context and message
+    context_str = f"Based on the following context about newsletters, please answer this question: {message}\n\nContext:\n{context.text}"
+    messages.append({"role": "user", "content": context_str})
+    return messages
+
+def error_reply(e: Exception) -> str:
+    """Turn an LLM failure into the apology shown to the user."""
+    if isinstance(e, (openai.RateLimitError, RateLimitTimeout)) or "rate_limit_error" in str(e):
+        return "I apologize, but I'm currently experiencing high demand. Please try again in a few moments."
+    return "I apologize, but I encountered an error processing your request. Please try again later."
+
+async def complete_with_context(message: str, context: PackedContext, conversation_history: Optional[List[Dict]] = [],
+                                max_wait: Optional[float] = None) -> str:
+    """Ask the model to answer the message from the context; raises on LLM errors."""
+    messages = build_messages(message, context, conversation_history)
+    # In tools mode the model may search the catalog itself instead of answering from the context
+    tools = [tool_schema(catalog_manager.current)] if PIPELINE_MODE == 'tools' else None
+    
+    # Adjust max_tokens based on conversation length for faster initial responses
+    dynamic_max_tokens = 200 if len(conversation_history) < 2 else 500
+    reservation = await reserve_tokens(messages, dynamic_max_tokens, max_wait)
+    
+    async def attempt(reservation: Reservation, call: str, messages: List[Dict], tools: Optional[List[Dict]] = None):
+        started = time.perf_counter()
+        # Make API call on the shared pooled client
+        try:
+            with metrics.llm_call(call):
+                response = await get_client().chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=messages,
+                    max_tokens=dynamic_max_tokens,
+                    temperature=0.7,
+                    tools=tools or openai.NOT_GIVEN
+                )
+        except asyncio.CancelledError:
+            # Lost a hedge race or ran out of time mid-call: the prompt was sent, no answer was read
+            token_bucket.reconcile(reservation, estimate_message_tokens(messages, 0))
+            raise
+        except Exception:
+            # Requests that fail or never reach the API are not billed
+            token_bucket.release(reservation)
+            raise
+        llm_latency.observe(time.perf_counter() - started)
+        
+        # Update token usage with what the request actually cost
+        record_usage(reservation, response.usage)
+        return response
+    
+    def launch(reservation: Reservation, call: str) -> asyncio.Future:
+        task = asyncio.ensure_future(attempt(reservation, call, messages, tools))
+        # A task cancelled before it started sent nothing (a no-op once attempt() settled it)
+        task.add_done_callback(lambda task: token_bucket.release(reservation) if task.cancelled() else None)
+        return task
     
-    # Convert DataFrame to list of dictionaries
-    data_list = filtered_data.to_dict('records')
+    def backup():
+        # Hedge only when the budget has room for a second call right now
+        hedge_reservation = token_bucket.try_acquire(reservation.tokens)
+        return launch(hedge_reservation, 'answer_hedge') if hedge_reservation is not None else None
     
-    # Split into chunks
-    chunks = []
-    for i in range(0, len(data_list), chunk_size):
-        chunk = data_list[i:i + chunk_size]
-        chunks.append(chunk)
+    # A call slower than most recent ones races an identical backup
+    response = await hedged(lambda: launch(reservation, 'answer'), llm_latency.hedge_delay(), backup)
     
-    return chunks
+    reply = response.choices[0].message
+    if reply.tool_calls:
+        # Run the requested searches in-process, then answer from their results without tools
+        with stage('tool_calls'):
+            messages = messages + tool_call_messages(reply)
+        reservation = await reserve_tokens(messages, dynamic_max_tokens, max_wait)
+        response = await attempt(reservation, 'answer_tool', messages)
+    
+    # Extract response content
+    return response.choices[0].message.content
+
+def tool_call_messages(reply) -> List[Dict]:
+    """The assistant's tool calls followed by one tool message with each call's result."""
+    catalog = catalog_manager.current
+    calls = [{"id": call.id, "type": "function",
+              "function": {"name": call.function.name, "arguments": call.function.arguments}}
+             for call in reply.tool_calls]
+    messages = [{"role": "assistant", "content": reply.content, "tool_calls": calls}]
+    for call in reply.tool_calls:
+        result = run_tool(catalog, call.function.name, call.function.arguments,
+                          CONTEXT_MAX_ROWS, CONTEXT_TOKEN_BUDGET, RETRIEVAL_MODE)
+        logger.info(f"Tool call {call.function.name}({call.function.arguments}) returned {result.rows} rows")
+        messages.append({"role": "tool", "tool_call_id": call.id, "content": result.text})
+    return messages
 
-def process_with_context(message: str, context_chunks: list, conversation_history: Optional[List[Dict]] = []):
-    """Process the message with context chunks and conversation history."""
+async def process_with_context(message: str, context: PackedContext, conversation_history: Optional[List[Dict]] = []):
+    """Process the message with its packed context and conversation history."""
     try:
-        # Estimate tokens for the request
-        estimated_tokens = estimate_tokens(message)
-        for chunk in context_chunks:
-            estimated_tokens += estimate_tokens(str(chunk))
-        
-        # Check if we can make the request
-        if not token_tracker.can_make_request(estimated_tokens):
-            wait_time = 60 - (datetime.now() - token_tracker.last_reset).total_seconds()
-            if wait_time > 0:
-                logger.info(f"Rate limit approaching, waiting {wait_time:.1f} seconds...")
-                time.sleep(wait_time)
-            token_tracker.tokens_used = 0
-            token_tracker.last_reset = datetime.now()
-        
-        # Prepare messages for OpenAI
-        messages = [
-            {"role": "system", "content": "You are a helpful AI assistant that provides information about newsletters. Format the response in a clear, structured way with categories, subscriber counts, prices, and audience information. Always include this disclaimer at the end of your response: 'Keep in mind these subscriber numbers and starting prices are approximate.\n**For specific details, past performance data, newsletter funnel tips, and a FREE Custom Proposal**, pick a time to speak to a representative. [Click Here](https://sponsorindex.setmore.com)'"}
-        ]
-        
-        # Add conversation history
-        messages.extend(conversation_history)
-        
-        # Add current context and message
-        context_str = f"Based on the following context about newsletters, please answer this question: {message}\n\nContext:\n{context_chunks[0]}"
-        messages.append({"role": "user", "content": context_str})
-        
-        # Make API call
-        client = openai.OpenAI()
-        
-        # Adjust max_tokens based on conversation length for faster initial responses
-        dynamic_max_tokens = 200 if len(conversation_history) < 2 else 500
-        
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            max_tokens=dynamic_max_tokens,
-            temperature=0.7
-        )
-        
-        # Extract response content
-        response_content = response.choices[0].message.content
-        
-        # Update token usage
-        token_tracker.add_tokens(estimated_tokens)
-        
-        return response_content
+        return await complete_with_context(message, context, conversation_history)
     except Exception as e:
         logger.error(f"Error in process_with_context: {str(e)}")
-        if "rate_limit_error" in str(e):
-            return "I apologize, but I'm currently experiencing high demand. Please try again in a few moments."
-        return "I apologize, but I encountered an error processing your request. Please try again later."
+        return error_reply(e)
+
+async def stream_with_context(message: str, context: PackedContext, conversation_history: Optional[List[Dict]] = []):
+    """Like process_with_context, but yield the answer as the model produces it."""
+    messages = build_messages(message, context, conversation_history)
+    dynamic_max_tokens = 200 if len(conversation_history) < 2 else 500
+    reservation = await reserve_tokens(messages, dynamic_max_tokens)
+    
+    with metrics.llm_call('answer_stream'):
+        try:
+            stream = await get_client().chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=messages,
+                max_tokens=dynamic_max_tokens,
+                temperature=0.7,
+                stream=True,
+                # The final chunk then carries the request's token usage
+                stream_options={"include_usage": True}
+            )
+        except asyncio.CancelledError:
+            # The prompt was sent but no answer was read
+            token_bucket.reconcile(reservation, estimate_message_tokens(messages, 0))
+            raise
+        except Exception:
+            # Requests that fail or never reach the API are not billed
+            token_bucket.release(reservation)
+            raise
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    record_usage(reservation, chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Cancelled, failed or closed before the usage chunk: charge the prompt
+            # (a no-op once record_usage settled the reservation)
+            token_bucket.reconcile(reservation, estimate_message_tokens(messages, 0))
 
-def detect_category(message: str) -> Optional[str]:
+async def detect_category(catalog: Catalog, message: str) -> Optional[str]:
     """Detect the category from the message."""
     try:
-        # Simple keyword matching for faster category detection
-        message_lower = message.lower()
-        
-        # Check for direct category matches first before calling the API
-        for category in available_categories:
-            if category.lower() in message_lower:
-                logger.info(f"Direct keyword match found for category: {category}")
-                return category
+        # Link category names, synonyms and newsletter names in one local pass
+        linked = catalog.link(message)
+        if linked.confidence >= LINK_CONFIDENCE:
+            logger.info(f"Linker matched category {linked.category} (confidence {linked.confidence:.2f})")
+            return linked.category
+        if PIPELINE_MODE != 'classify':
+            # Retrieval copes without a category; skip the extra model round-trip
+            return None
         
-        # Prepare messages for OpenAI
-        messages = [
-            {"role": "system", "content": f"You are a category detection system. Your task is to identify which category from the following list best matches the user's message. If no category matches well, respond with 'None'. Available categories: {available_categories}"},
-            {"role": "user", "content": message}
-        ]
+        # Low confidence: reuse an earlier model classification of the same message
+        memo_key = cache_key(message, None, None, catalog.version)
+        memoized = await category_memo.get_async(memo_key)
+        metrics.cache_lookup('category_memo', memoized is not None)
+        if memoized is not None:
+            return memoized or None
         
-        # Make API call with minimal tokens
-        client = openai.OpenAI()
-        response = client.chat.completions.create(
+        # Concurrent requests for the same message share one classification
+        return await asyncio.wait_for(category_flights.do(memo_key, lambda: classify_category(catalog, message, memo_key)),
+                                      timeout=stage_timeout(CATEGORY_TIMEOUT_SECONDS))
+    except (asyncio.TimeoutError, DeadlineExceeded):
+        logger.warning("Category detection ran out of time, continuing without a category")
+        return None
+    except Exception as e:
+        logger.error(f"Error in detect_category: {str(e)}")
+        return None
+
+async def classify_category(catalog: Catalog, message: str, memo_key: str) -> Optional[str]:
+    """Ask the model for the message's category and memoize the answer."""
+    # Prepare messages for OpenAI
+    messages = [
+        {"role": "system", "content": f"You are a category detection system. Your task is to identify which category from the following list best matches the user's message. If no category matches well, respond with 'None'. Available categories: {catalog.category_names}"},
+        {"role": "user", "content": message}
+    ]
+    
+    # Make API call with minimal tokens
+    reservation = await reserve_tokens(messages, 20)
+    with metrics.llm_call('category'):
+        response = await get_client().chat.completions.create(
             model="gpt-3.5-turbo",
             messages=messages,
             max_tokens=20,
             temperature=0.2
         )
-        
-        # Extract category
-        category = response.choices[0].message.content.strip()
-        
-        # Validate category
-        if category in available_categories:
-            return category
-        return None
-    except Exception as e:
-        logger.error(f"Error in detect_category: {str(e)}")
-        return None
+    record_usage(reservation, response.usage)
+    
+    # Extract category
+    category = response.choices[0].message.content.strip()
+    
+    # Validate category
+    if category not in catalog.category_names:
+        category = None
+    await category_memo.set_async(memo_key, category or '')
+    return category
 
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = None
+    # Only read from older clients that still send the whole conversation
+    conversation_history: Optional[List[Dict]] = []
+
+class BatchQuestion(BaseModel):
+    message: str
+    category: Optional[str] = None
     conversation_history: Optional[List[Dict]] = []
 
+class BatchRequest(BaseModel):
+    questions: List[BatchQuestion]
+
 @app.get("/")
-async def read_root():
-    """Serve the frontend file."""
-    try:
-        logger.info("Serving frontend file")
-        return FileResponse("frontend/index.html", media_type="text/html")
-    except Exception as e:
-        logger.error(f"Error serving frontend: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/index.html")
+@app.get("/chat-box.html")
+async def read_root(request: Request):
+    """Serve a preloaded frontend page, compressed and revalidated by ETag."""
+    answer = static_assets.respond(request.url.path, request.headers.get('accept-encoding'),
+                                   request.headers.get('if-none-match'))
+    if answer is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    status, headers, body = answer
+    return Response(content=body, status_code=status, headers=headers)
+
+def route_message(catalog: Catalog, message: str) -> Optional[RoutedAnswer]:
+    """Answer list and lookup questions from a template; None sends the message to the model."""
+    routed = intent_router.route(catalog, message)
+    if intent_router.enabled:
+        metrics.intent_route(routed.intent if routed else None)
+    if routed is not None:
+        logger.info(f"Intent router answered with the {routed.intent} template ({routed.rows} rows)")
+    return routed
+
+def prepare_context(catalog: Catalog, message: str, category: Optional[str]) -> Tuple[PackedContext, List[Dict]]:
+    """Rank the catalog rows for a message and pack the best into the token budget.
+
+    Returns the packed context and the ranked rows, which a degraded answer is rendered from.
+    """
+    # Named newsletters first, then numeric filters and text relevance
+    indices = catalog.search(message, category=category, limit=CONTEXT_MAX_ROWS, mode=RETRIEVAL_MODE)
+    records = catalog.records(indices)
+    # Prebuilt per version: row token costs, and whole blocks for category-only rankings
+    context = catalog.context_blocks.pack(indices, category, CONTEXT_TOKEN_BUDGET)
+    logger.info(f"Packed {context.rows} of {context.candidates} candidate rows into {context.tokens} context tokens")
+    return context, records
+
+def failure_reason(e: Exception) -> str:
+    return str(e) or type(e).__name__
+
+async def open_session(request: ChatRequest) -> Session:
+    """Resume the request's session, adopting any history an older client sent."""
+    session = await sessions.get_async(request.session_id)
+    if request.conversation_history:
+        history = list(request.conversation_history)
+        # Older clients include the new message as the last turn
+        if history[-1].get('role') == 'user' and history[-1].get('content') == request.message:
+            history = history[:-1]
+        await sessions.seed_async(session, history)
+    return session
+
+async def lookup_cached(catalog: Catalog, message: str, conversation_history: Optional[List[Dict]]):
+    """Detect the category and check the response cache; returns (category, key, cached answer)."""
+    with stage('category'):
+        category = await detect_category(catalog, message)
+    logger.info(f"Detected category: {category}")
+    
+    with stage('cache'):
+        key = cache_key(message, category, conversation_history, catalog.version)
+        cached = await response_cache.get_async(key)
+    metrics.cache_lookup('response', cached is not None)
+    return category, key, cached
+
+def answer_flight(key: str, message: str, context: PackedContext, conversation_history: Optional[List[Dict]],
+                  stream: bool = False, max_wait: Optional[float] = None) -> Flight:
+    """Join the in-flight answer for this question and context, or start it."""
+    async def produce(flight: Flight) -> str:
+        if stream:
+            text = ''
+            async for delta in stream_with_context(message, context, conversation_history):
+                text += delta
+                flight.publish(delta)
+        else:
+            text = await complete_with_context(message, context, conversation_history, max_wait)
+        # Cache here so the answer is kept even if the first caller disconnected;
+        # an empty answer would be served to every later asker
+        if text and text.strip():
+            await response_cache.set_async(key, text)
+        return text
+    
+    flight_key = f"{key}:{context_fingerprint(context.text)}"
+    return chat_flights.join(flight_key, produce)
+
+def timed_response(endpoint: str, outcome: str, timer: StageTimer, content: Dict, trace_id: str) -> JSONResponse:
+    """Serialize a chat reply, attach its Server-Timing header and record its metrics."""
+    with timer.stage('serialize'):
+        response = JSONResponse(content=content)
+    timings = timer.as_dict()
+    response.headers["Server-Timing"] = timer.header()
+    metrics.observe_request(endpoint, outcome, timings)
+    logger.info(f"Chat {trace_id} {outcome} in {timings['total']}ms ({timer.header()})")
+    return response
 
 @app.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """Handle chat requests."""
+    trace_id = http_request.state.request_id
+    timer = StageTimer().bind()
+    deadline = Deadline(CHAT_DEADLINE_SECONDS, DEADLINE_RESERVE_SECONDS).bind()
     try:
-        logger.info(f"Received chat message: {request.message}")
+        logger.info(f"Received chat message {trace_id}: {request.message}")
         
-        # Detect category
-        category = detect_category(request.message)
-        logger.info(f"Detected category: {category}")
+        # One catalog version for the whole request, even if a reload lands meanwhile
+        catalog = catalog_manager.current
+        session = await open_session(request)
+        with timer.stage('route'):
+            routed = route_message(catalog, request.message)
+        if routed is not None:
+            await sessions.record_async(session, request.message, routed.text)
+            return timed_response('chat', 'routed', timer, {"response": routed.text, "session_id": session.session_id}, trace_id)
         
-        # Split context into chunks
-        context_chunks = chunk_context(df, chunk_size=20, category=category)
-        logger.info(f"Split context into {len(context_chunks)} chunks")
+        history = session.history()
+        category, key, cached = await lookup_cached(catalog, request.message, history)
+        if cached is not None:
+            logger.info("Serving chat message from response cache")
+            await sessions.record_async(session, request.message, cached)
+            return timed_response('chat', 'cached', timer, {"response": cached, "session_id": session.session_id}, trace_id)
         
-        # Process the message
-        response = process_with_context(
-            request.message,
-            context_chunks,
-            request.conversation_history
-        )
+        with timer.stage('retrieval'):
+            context, records = prepare_context(catalog, request.message, category)
         
-        logger.info("Successfully processed chat message")
-        return {"response": response}
+        # Process the message; identical concurrent chats share one call
+        outcome = 'ok'
+        try:
+            with timer.stage('llm'):
+                flight = answer_flight(key, request.message, context, history)
+                # A late answer still lands in the cache for the next asker
+                response = await asyncio.wait_for(flight.result(), timeout=deadline.timeout())
+        except Exception as e:
+            # Out of time, or the model failed: answer from the catalog instead
+            logger.warning(f"Answering chat {trace_id} from the catalog: {failure_reason(e)}")
+            response = render_catalog_answer(records)
+            outcome = 'degraded'
+        await sessions.record_async(session, request.message, response)
+        
+        return timed_response('chat', outcome, timer, {"response": response, "session_id": session.session_id}, trace_id)
         
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
+        metrics.observe_request('chat', 'error', timer.as_dict())
         return JSONResponse(
             status_code=500,
             content={"detail": f"Error processing request: {str(e)}"}
         )
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """Handle chat requests, streaming model tokens as Server-Sent Events."""
+    trace_id = http_request.state.request_id
+    logger.info(f"Received streaming chat message {trace_id}: {request.message}")
+
+    async def events():
+        text = ''
+        catalog = catalog_manager.current
+        # Headers are already sent, so stage timings ride on the done event
+        timer = StageTimer().bind()
+        deadline = Deadline(CHAT_DEADLINE_SECONDS, DEADLINE_RESERVE_SECONDS).bind()
+        session = await open_session(request)
+        records = []
+        try:
+            with timer.stage('route'):
+                routed = route_message(catalog, request.message)
+            if routed is not None:
+                await sessions.record_async(session, request.message, routed.text)
+                metrics.observe_request('chat_stream', 'routed', timer.as_dict())
+                yield sse_event({"delta": routed.text})
+                yield sse_event({"response": routed.text, "session_id": session.session_id, "timings": timer.as_dict()}, event="done")
+                return
+            
+            history = session.history()
+            category, key, cached = await lookup_cached(catalog, request.message, history)
+            if cached is not None:
+                logger.info("Serving streamed chat message from response cache")
+                await sessions.record_async(session, request.message, cached)
+                metrics.observe_request('chat_stream', 'cached', timer.as_dict())
+                yield sse_event({"delta": cached})
+                yield sse_event({"response": cached, "session_id": session.session_id, "timings": timer.as_dict()}, event="done")
+                return
+            
+            with timer.stage('retrieval'):
+                context, records = prepare_context(catalog, request.message, category)
+            flight = answer_flight(key, request.message, context, history, stream=True)
+            llm_started = time.perf_counter()
+            chunks = flight.iter_chunks().__aiter__()
+            try:
+                # The first token must arrive before the deadline; after that the answer may finish
+                delta = await asyncio.wait_for(chunks.__anext__(), timeout=deadline.timeout())
+                timer.record('first_token', time.perf_counter() - llm_started)
+                while True:
+                    text += delta
+                    yield sse_event({"delta": delta})
+                    delta = await chunks.__anext__()
+            except StopAsyncIteration:
+                pass
+            timer.record('llm', time.perf_counter() - llm_started)
+            await sessions.record_async(session, request.message, text)
+            timings = timer.as_dict()
+            metrics.observe_request('chat_stream', 'ok', timings)
+            yield sse_event({"response": text, "session_id": session.session_id, "timings": timings}, event="done")
+            logger.info(f"Chat {trace_id} streamed in {timings['total']}ms ({timer.header()})")
+        except Exception as e:
+            if not text:
+                # Nothing sent yet, so an answer from the catalog can stand in for the model's
+                logger.warning(f"Answering chat {trace_id} from the catalog: {failure_reason(e)}")
+                metrics.observe_request('chat_stream', 'degraded', timer.as_dict())
+                fallback = render_catalog_answer(records)
+                await sessions.record_async(session, request.message, fallback)
+                yield sse_event({"delta": fallback})
+                yield sse_event({"response": fallback, "session_id": session.session_id, "degraded": True}, event="done")
+            else:
+                logger.error(f"Error in chat stream: {str(e)}")
+                metrics.observe_request('chat_stream', 'error', timer.as_dict())
+                yield sse_event({"detail": error_reply(e)}, event="error")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+async def batch_category(catalog: Catalog, question: BatchQuestion) -> Optional[str]:
+    """Use the question's own category when it names one, else detect it."""
+    category = catalog.resolve_category(question.category)
+    if category is not None:
+        return category
+    # Detection may ask the model, so it takes a batch slot like an answer does
+    async with batch_slots:
+        return await detect_category(catalog, question.message)
+
+async def answer_batch_question(index: int, question: BatchQuestion, key: str, context: PackedContext) -> Dict:
+    """Answer one batch question once a slot is free; failures become the usual apology."""
+    async with batch_slots:
+        timer = StageTimer().bind()
+        try:
+            with timer.stage('llm'):
+                flight = answer_flight(key, question.message, context, question.conversation_history,
+                                       max_wait=BATCH_MAX_WAIT_SECONDS)
+                response, outcome = await flight.result(), 'ok'
+        except Exception as e:
+            logger.error(f"Error answering batch question {index}: {str(e)}")
+            response, outcome = error_reply(e), 'error'
+    timings = timer.as_dict()
+    metrics.observe_request('chat_batch', outcome, timings)
+    return {"index": index, "response": response, "cached": False, "ok": outcome == 'ok', "timings": timings}
+
+@app.post("/chat/batch")
+async def chat_batch(request: BatchRequest, http_request: Request):
+    """Answer a list of questions, streaming each answer as a Server-Sent Event once it is ready."""
+    trace_id = http_request.state.request_id
+    questions = request.questions
+    if not questions:
+        raise HTTPException(status_code=400, detail="questions must not be empty")
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"A batch may hold at most {BATCH_MAX_QUESTIONS} questions")
+    logger.info(f"Received chat batch {trace_id} of {len(questions)} questions")
+
+    async def events():
+        # One catalog version for every question in the batch
+        catalog = catalog_manager.current
+        timer = StageTimer().bind()
+        tasks = []
+        counts = {"ok": 0, "cached": 0, "routed": 0, "error": 0}
+        try:
+            # Templated answers go out first; only the rest need a category and the model.
+            # A question with its own category keeps it, so it is not routed.
+            open_questions = []
+            with timer.stage('route'):
+                routed = [None if q.category else route_message(catalog, q.message) for q in questions]
+            for i, answer in enumerate(routed):
+                if answer is None:
+                    open_questions.append(i)
+                    continue
+                counts["routed"] += 1
+                metrics.observe_request('chat_batch', 'routed', {})
+                yield sse_event({"index": i, "category": None, "response": answer.text, "cached": False,
+                                 "routed": True, "ok": True}, event="result")
+            
+            categories: List[Optional[str]] = [None] * len(questions)
+            with timer.stage('category'):
+                detected = await asyncio.gather(*(batch_category(catalog, questions[i]) for i in open_questions))
+            for i, category in zip(open_questions, detected):
+                categories[i] = category
+            
+            # Cached answers go out at once; the rest are retrieved together
+            pending = []
+            with timer.stage('cache'):
+                for i in open_questions:
+                    question, category = questions[i], categories[i]
+                    key = cache_key(question.message, category, question.conversation_history, catalog.version)
+                    cached = await response_cache.get_async(key)
+                    metrics.cache_lookup('response', cached is not None)
+                    if cached is None:
+                        pending.append((i, key))
+                        continue
+                    counts["cached"] += 1
+                    metrics.observe_request('chat_batch', 'cached', {})
+                    yield sse_event({"index": i, "category": category, "response": cached, "cached": True, "ok": True},
+                                    event="result")
+            
+            with timer.stage('retrieval'):
+                rankings = catalog.search_many([(questions[i].message, categories[i]) for i, _ in pending],
+                                               limit=CONTEXT_MAX_ROWS, mode=RETRIEVAL_MODE)
+                contexts = [catalog.context_blocks.pack(indices, categories[i], CONTEXT_TOKEN_BUDGET)
+                            for (i, _), indices in zip(pending, rankings)]
+            
+            # Fan out under the shared concurrency cap; the token bucket paces the calls
+            tasks = [asyncio.create_task(answer_batch_question(i, questions[i], key, context))
+                     for (i, key), context in zip(pending, contexts)]
+            llm_started = time.perf_counter()
+            for finished in asyncio.as_completed(tasks):
+                result = await finished
+                result["category"] = categories[result["index"]]
+                counts["ok" if result["ok"] else "error"] += 1
+                yield sse_event(result, event="result")
+            if tasks:
+                timer.record('llm', time.perf_counter() - llm_started)
+            
+            timings = timer.as_dict()
+            yield sse_event({"questions": len(questions), **counts, "timings": timings}, event="done")
+            logger.info(f"Chat batch {trace_id} answered {len(questions)} questions in {timings['total']}ms "
+                        f"({counts['routed']} routed, {counts['cached']} cached, {counts['error']} failed)")
+        except Exception as e:
+            logger.error(f"Error in chat batch: {str(e)}")
+            yield sse_event({"detail": error_reply(e)}, event="error")
+        finally:
+            # A client that went away stops questions still waiting for a slot
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.get("/api/newsletters")
+def query_newsletters(request: Request):
+    """Filter, search, sort and page the catalog directly, without a model call."""
+    catalog = catalog_manager.current
+    status, headers, body = handle_query(catalog, dict(request.query_params), request.headers.get('if-none-match'))
+    if body is None:
+        return Response(status_code=status, headers=headers)
+    return JSONResponse(status_code=status, content=body, headers=headers)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Expose pipeline metrics in the Prometheus text format."""
+    return Response(content=metrics.registry.render(), media_type=CONTENT_TYPE)
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Expose response cache hit/miss and request coalescing statistics."""
+    # A shared store counts its entries with a query, so it runs in a worker thread
+    stats = await asyncio.to_thread(response_cache.stats)
+    stats["single_flight"] = chat_flights.stats()
+    return stats
+
+@app.post("/api/admin/reload")
+async def reload_catalog(x_admin_token: Optional[str] = Header(None)):
+    """Rebuild the catalog from context.csv in a worker thread and swap it in."""
+    if not ADMIN_TOKEN or not hmac.compare_digest(x_admin_token or '', ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    result = await asyncio.to_thread(catalog_manager.reload)
+    return JSONResponse(status_code=500 if result.get("error") else 200, content=result)
+
+@app.get("/api/catalog")
+async def catalog_status():
+    """Report the live catalog version and the outcome of the last reload."""
+    return catalog_manager.status()
+
+@app.get("/api/sessions/stats")
+async def session_stats():
+    """Expose session counts, evictions and history compactions."""
+    return await asyncio.to_thread(sessions.stats)
+
+@app.get("/api/router/stats")
+async def router_stats():
+    """Expose how many chat messages the intent router answered without the model."""
+    return intent_router.stats()
+
+@app.get("/api/rate-limit")
+async def rate_limit_stats():
+    """Expose the token budget and how many requests are queued for it."""
+    return token_bucket.stats()
+
 # Add a simple health check endpoint
 @app.get("/api/health")
 async def health_check():
     return {"status": "ok", "message": "API is running"}
 
+@app.get("/api/ready")
+async def readiness_check():
+    """Report whether the LLM client is validated, separately from liveness."""
+    status = client_readiness.status()
+    catalog = catalog_manager.current
+    status["catalog_rows"] = len(catalog)
+    status["catalog_version"] = catalog.version
+    status["startup_ms"] = startup_report.as_dict()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 if __name__ == "__main__":
     import uvicorn
     logger.info("\nStarting server...")
-    logger.info("1. Your CSV data is loaded (777 rows)")
+    logger.info(f"1. Your CSV data is loaded ({len(catalog_manager.current)} rows)")
     logger.info("2. Visit http://localhost:3001 in your web browser")
     logger.info("3. Press Ctrl+C to stop the server\n")
     uvicorn.run(app, host="0.0.0.0", port=3001)
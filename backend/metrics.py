@@ -0,0 +1,270 @@
+"""Prometheus metrics for the chat pipeline, without a client library dependency.
+
+Both the FastAPI app and the serverless handler record into a
+`MetricsRegistry` and serve `render()` from GET /metrics in the text
+exposition format (version 0.0.4). Counters and histograms are updated
+under one lock, so the threaded serverless handler can share them; gauges
+are read from callbacks at scrape time.
+
+The pipeline metrics are:
+
+    chat_requests_total{endpoint,outcome}          outcome: ok | cached | routed | degraded | error
+    chat_stage_seconds{endpoint,stage}             route, category, cache, retrieval, rate_limit_wait, llm,
+                                                   first_token, tool_calls, serialize, total
+    llm_request_seconds{call}                      one model API call
+    llm_errors_total{call,kind}                    kind: rate_limit | timeout | connection | server | client | other
+    llm_tokens_total{direction}                    prompt | completion, as reported by the API
+    cache_lookups_total{cache,result}              result: hit | miss
+    intent_routes_total{intent}                    template intent, or model
+    rate_limit_wait_seconds                        time queued for token budget
+    rate_limit_timeouts_total                      requests refused after waiting too long
+"""
+
+import math
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; spans cache hits (well under 1 ms) to slow model calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Client-supplied request IDs are echoed only if they look like IDs
+REQUEST_ID_HEADER = 'X-Request-ID'
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+
+def request_id(incoming: Optional[str] = None) -> str:
+    """Return the caller's request ID when it is well formed, else a new one."""
+    if incoming and _REQUEST_ID.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...], lock: threading.Lock):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = lock
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        # Unlabelled series are exported from the start, at zero
+        if not self.labels:
+            self._values[()] = 0.0
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(*args)
+        self.buckets = tuple(sorted(buckets))
+        # Label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        if not self.labels:
+            self._values[()] = [0.0] * (len(self.buckets) + 2)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return int(sum(state[:-1])) if state else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, state in sorted(self._values.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), state[:-1]):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {_format_value(cumulative)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """A value read from a callback when the registry is rendered."""
+    kind = 'gauge'
+
+    def __init__(self, *args, read: Callable[[], float]):
+        super().__init__(*args)
+        self._read = read
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {_format_value(float(self._read()))}"]
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in the Prometheus text format."""
+
+    def __init__(self, prefix: str = ''):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(self.prefix + name, documentation, labels, self._lock))
+
+    def histogram(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self.prefix + name, documentation, labels, self._lock, buckets=buckets))
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(self.prefix + name, documentation, (), self._lock, read=read))
+
+    def render(self) -> str:
+        lines = []
+        gauges = []
+        with self._lock:
+            for metric in self._metrics.values():
+                if isinstance(metric, Gauge):
+                    gauges.append(metric)
+                    continue
+                lines.extend(metric.header())
+                lines.extend(metric.samples())
+        # Callbacks may take other locks, so they run outside ours
+        for metric in gauges:
+            try:
+                samples = metric.samples()
+            except Exception:
+                continue
+            lines.extend(metric.header())
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+def error_kind(e: BaseException) -> str:
+    """Bucket an LLM failure into a small, fixed set of label values."""
+    name = type(e).__name__
+    status = getattr(e, 'status_code', None) or getattr(e, 'code', None)
+    if not isinstance(status, int):
+        status = None
+    if 'RateLimit' in name or status == 429:
+        return 'rate_limit'
+    if 'Timeout' in name or isinstance(e, TimeoutError):
+        return 'timeout'
+    if 'Connection' in name or name == 'URLError' or isinstance(e, ConnectionError):
+        return 'connection'
+    if status is not None:
+        return 'server' if status >= 500 else 'client'
+    return 'other'
+
+
+class PipelineMetrics:
+    """The chat pipeline's counters and histograms on one registry."""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or MetricsRegistry()
+        r = self.registry
+        self.requests = r.counter('chat_requests_total', "Chat requests by endpoint and outcome.", ('endpoint', 'outcome'))
+        self.stages = r.histogram('chat_stage_seconds', "Time spent in each stage of a chat request.", ('endpoint', 'stage'))
+        self.llm_latency = r.histogram('llm_request_seconds', "Duration of model API calls.", ('call',))
+        self.llm_errors = r.counter('llm_errors_total', "Failed model API calls by kind.", ('call', 'kind'))
+        self.tokens = r.counter('llm_tokens_total', "Tokens reported by the model API.", ('direction',))
+        self.cache = r.counter('cache_lookups_total', "Cache lookups by cache and result.", ('cache', 'result'))
+        self.intents = r.counter('intent_routes_total', "Chat messages answered by template intent, or sent to the model.", ('intent',))
+        self.rate_limit_wait = r.histogram('rate_limit_wait_seconds', "Time requests queued for rate limit budget.")
+        self.rate_limit_timeouts = r.counter('rate_limit_timeouts_total', "Requests refused after waiting for rate limit budget.")
+
+    def observe_request(self, endpoint: str, outcome: str, timings: Dict[str, float]):
+        """Count a finished request and record its StageTimer.as_dict() timings."""
+        self.requests.inc(endpoint=endpoint, outcome=outcome)
+        for name, ms in timings.items():
+            self.stages.observe(ms / 1000.0, endpoint=endpoint, stage=name)
+
+    def cache_lookup(self, cache: str, hit: bool):
+        self.cache.inc(cache=cache, result='hit' if hit else 'miss')
+
+    def intent_route(self, intent: Optional[str]):
+        self.intents.inc(intent=intent or 'model')
+
+    def record_tokens(self, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+        if prompt_tokens:
+            self.tokens.inc(prompt_tokens, direction='prompt')
+        if completion_tokens:
+            self.tokens.inc(completion_tokens, direction='completion')
+
+    @contextmanager
+    def llm_call(self, call: str):
+        """Time a model API call and count it by error kind if it fails."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.llm_errors.inc(call=call, kind=error_kind(e))
+            raise
+        finally:
+            self.llm_latency.observe(time.perf_counter() - start, call=call)
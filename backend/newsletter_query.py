@@ -0,0 +1,215 @@
+"""Structured newsletter queries served straight from the in-memory catalog.
+
+Shared by the FastAPI app and the serverless handler behind
+GET /api/newsletters. Query parameters:
+
+    category                     catalog category (loose names like "finance" resolve)
+    min_subscribers, max_subscribers, min_price, max_price,
+    min_cpc, max_cpc, min_clicks, max_clicks
+                                 numeric bounds; "50k", "$2,000" are accepted
+    filter                       compact spec, e.g. "subscribers>=50k, price<=2000"
+    q                            free text, ranked by BM25 unless a sort is given
+    sort                         subscribers | price | cpc | clicks | relevance, "-" for descending
+    fields                       comma-separated projection (see PUBLIC_FIELDS)
+    limit                        page size, 1..MAX_LIMIT
+    cursor                       opaque token from the previous page's next_cursor
+
+Results depend only on the catalog version and the parameters. The ETag is
+therefore computed before any work is done, and a matching If-None-Match is
+answered with 304.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from catalog import SORT_COLUMNS, Catalog, CatalogFilter, parse_bound, parse_filter_spec
+from http_cache import etag_matches
+
+# Public field name -> catalog CSV column
+PUBLIC_FIELDS = {
+    'id': 'ID',
+    'name': 'Newsletter Name',
+    'category': 'Category',
+    'subscribers': 'Subscribers',
+    'price': 'One Send Price',
+    'cpc': 'CPC Avg',
+    'clicks': 'Click Estimate',
+    'open_rate': 'Open rates',
+    'ctr': 'CTR',
+    'website': 'Website',
+    'advertising_page': 'Advertising Page',
+    'audience': 'Audience Info',
+    'image_url': 'imageurl',
+    'updated': 'Updated Date',
+}
+
+# Parsed numbers, served from the typed columns
+NUMERIC_FIELDS = {
+    'subscribers_count': 'subscribers',
+    'price_usd': 'price',
+    'cpc_min': 'cpc_min',
+    'cpc_max': 'cpc_max',
+    'clicks_min': 'clicks_min',
+    'clicks_max': 'clicks_max',
+}
+
+DEFAULT_FIELDS = ('id', 'name', 'category', 'subscribers', 'price', 'cpc', 'website')
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# Bound parameters, each a CatalogFilter attribute
+BOUNDS = ('min_subscribers', 'max_subscribers', 'min_price', 'max_price',
+          'min_cpc', 'max_cpc', 'min_clicks', 'max_clicks')
+
+CACHE_CONTROL = 'public, max-age=30'
+
+
+class QueryError(ValueError):
+    """A malformed query; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def _canonical(params: Dict[str, str], exclude: Tuple[str, ...] = ()) -> str:
+    return json.dumps({k: v for k, v in sorted(params.items()) if k not in exclude and v != ''})
+
+
+def query_etag(catalog: Catalog, params: Dict[str, str]) -> str:
+    """Strong ETag for a query against one catalog version."""
+    digest = hashlib.sha1(f"{catalog.version}\x1f{_canonical(params)}".encode('utf-8')).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def _cursor_scope(catalog: Catalog, params: Dict[str, str]) -> Dict:
+    """What a cursor is bound to: the catalog version and the query minus paging."""
+    return {
+        'v': (catalog.version or '')[:16],
+        'q': hashlib.sha1(_canonical(params, exclude=('cursor', 'limit')).encode('utf-8')).hexdigest()[:12],
+    }
+
+
+def encode_cursor(catalog: Catalog, params: Dict[str, str], offset: int) -> str:
+    state = dict(_cursor_scope(catalog, params), o=offset)
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(catalog: Catalog, params: Dict[str, str], cursor: str) -> int:
+    """Return the offset a cursor points at; it must belong to this query and catalog version."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        offset = int(state['o'])
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise QueryError("Invalid cursor")
+    expected = _cursor_scope(catalog, params)
+    if state.get('q') != expected['q']:
+        raise QueryError("Cursor does not belong to this query")
+    if state.get('v') != expected['v']:
+        raise QueryError("The catalog changed since this cursor was issued; restart from the first page", status=409)
+    return max(offset, 0)
+
+
+def parse_criteria(params: Dict[str, str]) -> Tuple[CatalogFilter, Optional[str]]:
+    """Build the filter from query parameters; returns (criteria, sort key)."""
+    try:
+        criteria = parse_filter_spec(params['filter']) if params.get('filter') else CatalogFilter()
+    except ValueError as e:
+        raise QueryError(str(e))
+    if params.get('category'):
+        criteria.category = params['category']
+    for name in BOUNDS:
+        if params.get(name):
+            value = parse_bound(params[name])
+            if math.isnan(value):
+                raise QueryError(f"Invalid number for {name}: {params[name]}")
+            setattr(criteria, name, value)
+
+    sort = params.get('sort') or ''
+    descending = sort.startswith('-')
+    sort_key = sort.lstrip('-+').lower() or None
+    if sort_key is not None and sort_key != 'relevance' and sort_key not in SORT_COLUMNS:
+        raise QueryError(f"Unknown sort key: {sort_key}")
+    if sort_key in SORT_COLUMNS:
+        criteria.sort_by, criteria.descending = sort_key, descending
+    elif sort_key is None and criteria.sort_by:
+        sort_key = criteria.sort_by
+    return criteria, sort_key
+
+
+def parse_fields(value: Optional[str]) -> List[str]:
+    if not value:
+        return list(DEFAULT_FIELDS)
+    if value == '*':
+        return list(PUBLIC_FIELDS) + list(NUMERIC_FIELDS)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in PUBLIC_FIELDS and name not in NUMERIC_FIELDS]
+    if unknown:
+        raise QueryError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def project(catalog: Catalog, index: int, fields: List[str]) -> Dict:
+    """Return the requested fields of one row; blanks and unknown numbers are null."""
+    row = catalog.rows[index]
+    item = {}
+    for name in fields:
+        if name in NUMERIC_FIELDS:
+            value = float(getattr(catalog, NUMERIC_FIELDS[name])[index])
+            item[name] = None if math.isnan(value) else value
+        else:
+            value = row.get(PUBLIC_FIELDS[name])
+            item[name] = (value.strip() or None) if isinstance(value, str) else None
+    return item
+
+
+def run_query(catalog: Catalog, params: Dict[str, str]) -> Dict:
+    """Filter, rank, sort, project and paginate the catalog for one request."""
+    criteria, sort_key = parse_criteria(params)
+    fields = parse_fields(params.get('fields'))
+    try:
+        limit = int(params.get('limit') or DEFAULT_LIMIT)
+    except ValueError:
+        raise QueryError("limit must be an integer")
+    limit = min(max(limit, 1), MAX_LIMIT)
+    offset = decode_cursor(catalog, params, params['cursor']) if params.get('cursor') else 0
+
+    indices = catalog.filter(criteria)
+    query = (params.get('q') or '').strip()
+    if query:
+        scores = catalog.index.score(query)
+        indices = indices[np.fromiter((i in scores for i in indices.tolist()), dtype=bool, count=len(indices))]
+        if sort_key is None or sort_key == 'relevance':
+            # Stable sort keeps catalog order among equal scores
+            order = np.argsort(-np.array([scores[i] for i in indices.tolist()]), kind='stable')
+            indices = indices[order]
+
+    total = int(len(indices))
+    page = indices[offset:offset + limit].tolist()
+    next_offset = offset + limit
+    return {
+        "items": [project(catalog, i, fields) for i in page],
+        "count": len(page),
+        "total": total,
+        "next_cursor": encode_cursor(catalog, params, next_offset) if next_offset < total else None,
+        "catalog_version": catalog.version,
+    }
+
+
+def handle_query(catalog: Catalog, params: Dict[str, str], if_none_match: Optional[str] = None) -> Tuple[int, Dict[str, str], Optional[Dict]]:
+    """Answer one request; returns (status, headers, JSON body or None for 304)."""
+    etag = query_etag(catalog, params)
+    headers = {'ETag': etag, 'Cache-Control': CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return 304, headers, None
+    try:
+        return 200, headers, run_query(catalog, params)
+    except QueryError as e:
+        return e.status, {'Cache-Control': 'no-store'}, {"error": str(e)}
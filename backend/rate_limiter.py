@@ -0,0 +1,324 @@
+"""Async token-bucket rate limiter for the LLM tokens-per-minute quota.
+
+The bucket refills continuously instead of resetting once a minute. Callers
+that cannot be served immediately wait in a FIFO queue, so a large request
+is not starved by a stream of small ones, and each waiter carries its own
+deadline. Reservations are made from an estimate and reconciled against the
+`usage` the API reports, so the bucket tracks real spend.
+
+With a shared `StateBackend` the token count lives in the store, so every
+worker process draws from one budget. Each process still queues its own
+waiters in FIFO order and retries when the shared bucket should have
+refilled. Takes and adjustments can wait on another process's lock, so they
+run in a worker thread rather than on the event loop, as does the bucket
+read made while queueing. Two store calls stay on the event loop as
+accepted, bounded blocking: `try_acquire()`, which never waits for the lock,
+and the bucket read in `stats()`, a single WAL read that never waits on
+writers.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+
+from shared_state import StateBackend
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitTimeout(Exception):
+    """The token budget could not be granted before the caller's deadline."""
+
+
+@dataclass
+class Reservation:
+    """Tokens granted to one request, pending reconciliation."""
+    tokens: float
+    waited: float = 0.0
+    reconciled: bool = False
+
+
+class _Waiter:
+    __slots__ = ('tokens', 'future', 'enqueued')
+
+    def __init__(self, tokens: float, future: asyncio.Future):
+        self.tokens = tokens
+        self.future = future
+        self.enqueued = time.monotonic()
+
+
+class AsyncTokenBucket:
+    """Continuously refilling token bucket with a fair wait queue."""
+
+    def __init__(self, capacity: float, refill_per_second: float,
+                 state: Optional[StateBackend] = None, name: str = 'llm'):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.state = state
+        self.name = name
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._waiters: Deque[_Waiter] = deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._draining: Optional[asyncio.Future] = None
+        self._drain_again = False
+        # A caller is taking from the shared store without queueing
+        self._taking = False
+
+        self.granted = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.estimated_tokens = 0.0
+        self.actual_tokens = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def _take_local(self, tokens: float) -> float:
+        self._refill()
+        if self._tokens < tokens:
+            return tokens - self._tokens
+        self._tokens -= tokens
+        return 0.0
+
+    async def _take(self, tokens: float) -> float:
+        """Take `tokens` if available; returns 0.0, or how many are missing."""
+        if self.state is None:
+            return self._take_local(tokens)
+        take = asyncio.ensure_future(asyncio.to_thread(
+            self.state.take_tokens, self.name, tokens, self.capacity, self.refill_per_second))
+        try:
+            return await asyncio.shield(take)
+        except asyncio.CancelledError:
+            # The thread may still take the tokens; hand them back if it does
+            def refund(task: asyncio.Future):
+                if not task.cancelled() and task.exception() is None and task.result() == 0:
+                    self._adjust(-tokens)
+            take.add_done_callback(refund)
+            raise
+
+    def _adjust(self, delta: float):
+        """Remove `delta` tokens (negative refunds); the bucket may go into debt."""
+        if self.state is None:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - delta)
+            self._kick()
+            return
+        adjust = asyncio.ensure_future(asyncio.to_thread(
+            self.state.adjust_tokens, self.name, delta, self.capacity, self.refill_per_second))
+
+        def settled(task: asyncio.Future):
+            if not task.cancelled() and task.exception() is not None:
+                logger.error(f"Could not adjust the shared token bucket by {delta:.0f}: {str(task.exception())}")
+            self._kick()
+        adjust.add_done_callback(settled)
+
+    def available(self) -> float:
+        if self.state is not None:
+            return self.state.available_tokens(self.name, self.capacity, self.refill_per_second)
+        self._refill()
+        return self._tokens
+
+    async def _available(self) -> float:
+        """available(), reading a shared store in a worker thread."""
+        if self.state is None:
+            return self.available()
+        return await asyncio.to_thread(self.available)
+
+    def _kick(self):
+        """Drain the queue now, or again once the drain in progress finishes."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._draining is not None and not self._draining.done():
+            self._drain_again = True
+        elif self._waiters:
+            self._draining = asyncio.ensure_future(self._drain())
+
+    async def _drain(self):
+        """Grant queued waiters in order while the bucket can cover them."""
+        self._drain_again = False
+        while self._waiters:
+            waiter = self._waiters[0]
+            if waiter.future.done():
+                self._waiters.popleft()
+                continue
+            deficit = await self._take(waiter.tokens)
+            if waiter.future.done():
+                # The waiter gave up while the store was busy; return what it was granted
+                if deficit == 0:
+                    self._adjust(-waiter.tokens)
+                continue
+            if deficit > 0:
+                if self._drain_again:
+                    # Tokens were refunded meanwhile; look again before sleeping
+                    self._drain_again = False
+                    continue
+                # Wake up exactly when the head of the queue can be served
+                loop = asyncio.get_running_loop()
+                self._timer = loop.call_later(deficit / self.refill_per_second, self._kick)
+                return
+            self._waiters.remove(waiter)
+            waiter.future.set_result(time.monotonic() - waiter.enqueued)
+
+    def _queued_tokens(self) -> float:
+        return sum(w.tokens for w in self._waiters if not w.future.done())
+
+    async def acquire(self, tokens: float, timeout: Optional[float] = None) -> Reservation:
+        """Wait for `tokens` to be available; raise RateLimitTimeout past the deadline."""
+        # A single request larger than the bucket still runs once it is full
+        tokens = min(float(tokens), self.capacity)
+        self.estimated_tokens += tokens
+
+        # Only one caller at a time skips the queue, so callers that arrive
+        # while its store take is in flight stay behind it
+        first = not self._waiters and not self._taking
+        if first:
+            self._taking = True
+            try:
+                deficit = await self._take(tokens)
+            finally:
+                self._taking = False
+                self._kick()
+            if deficit == 0:
+                self.granted += 1
+                return Reservation(tokens)
+
+        waiter = _Waiter(tokens, asyncio.get_running_loop().create_future())
+        if first:
+            # Everyone queued meanwhile arrived later
+            self._waiters.appendleft(waiter)
+        else:
+            # Queue before reading the store, so callers keep their arrival order
+            self._waiters.append(waiter)
+            deficit = tokens - await self._available()
+
+        # Fail fast when the queue ahead cannot drain before the deadline
+        expected_wait = (self._queued_tokens() - tokens + deficit) / self.refill_per_second
+        if timeout is not None and expected_wait > timeout and not waiter.future.done():
+            self.timeouts += 1
+            self.estimated_tokens -= tokens
+            waiter.future.cancel()
+            self._forget(waiter)
+            raise RateLimitTimeout(f"Token budget unavailable for {expected_wait:.1f}s (deadline {timeout:.1f}s)")
+
+        if self._timer is None and not self._taking:
+            self._kick()
+        try:
+            waited = await asyncio.wait_for(waiter.future, timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.estimated_tokens -= tokens
+            self._forget(waiter)
+            raise RateLimitTimeout(f"Token budget unavailable within {timeout:.1f}s")
+        except asyncio.CancelledError:
+            self.estimated_tokens -= tokens
+            self._forget(waiter)
+            raise
+        self.granted += 1
+        self.total_wait += waited
+        return Reservation(tokens, waited=waited)
+
+    def try_acquire(self, tokens: float) -> Optional[Reservation]:
+        """Take `tokens` only if they are available now and nobody is queued.
+
+        With a shared store this never waits for another process's lock; a
+        busy store counts as no budget. That keeps it to one short
+        transaction, so it runs inline for callers that cannot await.
+        """
+        tokens = min(float(tokens), self.capacity)
+        if self._waiters or self._taking:
+            return None
+        if self.state is not None:
+            deficit = self.state.take_tokens(self.name, tokens, self.capacity, self.refill_per_second, wait=0.0)
+        else:
+            deficit = self._take_local(tokens)
+        if deficit > 0:
+            return None
+        self.granted += 1
+        self.estimated_tokens += tokens
+        return Reservation(tokens)
+
+    def _forget(self, waiter: _Waiter):
+        """Drop a waiter that gave up and let the rest of the queue move."""
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        self._kick()
+
+    def reconcile(self, reservation: Reservation, actual_tokens: Optional[float]):
+        """Correct the bucket once the API reports what the request really used."""
+        if reservation.reconciled or actual_tokens is None:
+            return
+        reservation.reconciled = True
+        delta = float(actual_tokens) - reservation.tokens
+        self.actual_tokens += float(actual_tokens)
+        # Overruns put the bucket into debt; overestimates are refunded
+        self._adjust(delta)
+
+    def release(self, reservation: Reservation):
+        """Refund a reservation whose request never reached the API."""
+        self.reconcile(reservation, 0)
+
+    def stats(self) -> Dict:
+        return {
+            "capacity": self.capacity,
+            "refill_per_second": self.refill_per_second,
+            "shared": self.state is not None,
+            "available_tokens": round(self.available(), 1),
+            "queue_depth": sum(1 for w in self._waiters if not w.future.done()),
+            "queued_tokens": round(self._queued_tokens(), 1),
+            "granted": self.granted,
+            "timeouts": self.timeouts,
+            "average_wait_seconds": round(self.total_wait / self.granted, 4) if self.granted else 0.0,
+            "estimated_tokens": round(self.estimated_tokens, 1),
+            "actual_tokens": round(self.actual_tokens, 1),
+        }
+
+
+class TokenBudget:
+    """Thread-safe token count for blocking handlers, which never wait for budget.
+
+    Calls are charged as they are made, going into debt if need be, and
+    settled against reported usage. Optional extra calls, such as a hedge,
+    only run while the budget has room for them.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def spend(self, tokens: float):
+        """Charge `tokens` (negative refunds) whether or not they are available."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - tokens)
+
+    def try_spend(self, tokens: float) -> bool:
+        """Charge `tokens` only if they are available now."""
+        with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
@@ -0,0 +1,115 @@
+"""Startup timing and lazy, cached LLM client readiness.
+
+Nothing in here talks to the network at import time. Credential validation
+runs on a background thread once the server is up, and its outcome is cached
+for a TTL so readiness probes never trigger a model call of their own.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """Wall-clock duration of each startup stage, in milliseconds."""
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def record(self, name: str, seconds: float):
+        self.stages[name] = round(self.stages.get(name, 0.0) + seconds * 1000.0, 3)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def finish(self):
+        """Stamp the total time since the report was started."""
+        self.stages['total'] = round((time.perf_counter() - self.started) * 1000.0, 3)
+
+    def as_dict(self) -> Dict[str, float]:
+        return dict(self.stages)
+
+    def summary(self) -> str:
+        return ', '.join(f"{name}={ms:.1f}ms" for name, ms in self.stages.items())
+
+
+class ClientReadiness:
+    """Runs a validator in the background and caches its result with a TTL.
+
+    The validator raises on failure. Successful checks are trusted for `ttl`
+    seconds and failed ones are retried after `failure_ttl` seconds; a
+    refresh is kicked off lazily by whoever asks for the status next.
+    """
+
+    def __init__(self, validator: Callable[[], None], ttl: float = 300.0, failure_ttl: float = 30.0):
+        self.validator = validator
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._ready = False
+        self._error: Optional[str] = None
+        self._checked_at: Optional[float] = None
+        self._checked_wall: Optional[datetime] = None
+        self._duration: Optional[float] = None
+
+    def start(self):
+        """Start a background validation unless one is already running."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="client-readiness", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            self.validator()
+            ready, error = True, None
+            logger.info("LLM client validated")
+        except Exception as e:
+            ready, error = False, str(e)
+            logger.error(f"LLM client validation failed: {error}")
+        with self._lock:
+            self._ready = ready
+            self._error = error
+            self._checked_at = time.monotonic()
+            self._checked_wall = datetime.now()
+            self._duration = time.perf_counter() - start
+
+    def _expired(self) -> bool:
+        if self._checked_at is None:
+            return True
+        ttl = self.ttl if self._ready else self.failure_ttl
+        return time.monotonic() - self._checked_at > ttl
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def status(self) -> Dict:
+        """Return the cached readiness, refreshing it in the background once stale."""
+        with self._lock:
+            expired = self._expired()
+            checking = self._thread is not None and self._thread.is_alive()
+            status = {
+                "ready": self._ready,
+                "state": "ready" if self._ready else ("checking" if checking or self._checked_at is None else "unavailable"),
+                "error": self._error,
+                "checked_at": str(self._checked_wall) if self._checked_wall else None,
+                "check_duration_ms": round(self._duration * 1000.0, 1) if self._duration is not None else None,
+            }
+        if expired:
+            self.start()
+        return status
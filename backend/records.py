@@ -0,0 +1,200 @@
+"""Compact, column-oriented storage for catalog rows.
+
+The CSV has 27 columns, and the chatbot reads about half of them. As
+csv.DictReader rows, each row costs a dict plus one str object per cell. A
+`RecordStore` keeps only RECORD_COLUMNS, stored column by column:
+
+- Columns with few distinct values (category, price, subscriber counts) are
+  dictionary-encoded. Each distinct string is interned once, and rows hold
+  a small integer code.
+- All other columns (names, URLs, the long Audience Info text) are packed
+  into one UTF-8 blob plus an offsets array. A value is decoded only when it
+  is read.
+
+Rows are handed out as `Record` views: read-only mappings with __slots__
+that index into the store, so a lookup allocates almost nothing. The
+snapshot stores these same arrays, so a memory-mapped catalog uses them in
+place.
+"""
+
+import sys
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+# Columns the chatbot, the query API and catalog reloads read. The rest of the
+# CSV (image alt text, logos, owner, contact and bookkeeping columns) is dropped.
+RECORD_COLUMNS = [
+    'ID',
+    'Newsletter Name',
+    'Category',
+    'Subscribers',
+    'One Send Price',
+    'CPC Avg',
+    'Click Estimate',
+    'Open rates',
+    'CTR',
+    'Website',
+    'Advertising Page',
+    'Audience Info',
+    'imageurl',
+    'Updated Date',
+]
+
+# Dictionary-encode a column when it has at most one distinct value per this many rows
+CODED_RATIO = 4
+
+
+def _strings(values: Sequence) -> List[str]:
+    return [value if isinstance(value, str) else '' for value in values]
+
+
+class StringColumn:
+    """A column of UTF-8 strings stored as one blob plus an offsets array."""
+
+    kind = 'string'
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def from_values(cls, values: Sequence) -> 'StringColumn':
+        encoded = [value.encode('utf-8') for value in _strings(values)]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self.data[start:end].tobytes().decode('utf-8')
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.data.nbytes
+
+
+class CodedColumn:
+    """A low-cardinality column: interned distinct values plus one code per row."""
+
+    kind = 'coded'
+
+    def __init__(self, codes: np.ndarray, values: List[str]):
+        self.codes = codes
+        self.values = [sys.intern(value) for value in values]
+
+    @classmethod
+    def from_values(cls, values: Sequence) -> 'CodedColumn':
+        code_of: Dict[str, int] = {}
+        codes = [code_of.setdefault(value, len(code_of)) for value in _strings(values)]
+        dtype = np.int16 if len(code_of) <= np.iinfo(np.int16).max else np.int32
+        return cls(np.asarray(codes, dtype=dtype), list(code_of))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, i: int) -> str:
+        return self.values[self.codes[i]]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + sum(len(value) + 1 for value in self.values)
+
+
+Column = Union[StringColumn, CodedColumn]
+
+
+def encode_column(values: Sequence) -> Column:
+    """Pick the cheaper encoding for a column's values."""
+    distinct = len(set(_strings(values)))
+    if distinct * CODED_RATIO <= len(values):
+        return CodedColumn.from_values(values)
+    return StringColumn.from_values(values)
+
+
+class Record(Mapping):
+    """One catalog row, read through to its store's columns."""
+
+    __slots__ = ('_store', '_index')
+
+    def __init__(self, store: 'RecordStore', index: int):
+        self._store = store
+        self._index = index
+
+    def __getitem__(self, column: str) -> str:
+        return self._store.columns[column][self._index]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._store.columns)
+
+    def __len__(self) -> int:
+        return len(self._store.columns)
+
+    def __repr__(self) -> str:
+        return f"Record({dict(self)!r})"
+
+
+class RecordStore(Sequence):
+    """Catalog rows as projected, encoded columns; items are `Record` views."""
+
+    def __init__(self, columns: Dict[str, Column], length: int):
+        self.columns = columns
+        self.length = length
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Dict], columns: Optional[List[str]] = None) -> 'RecordStore':
+        """Project dict rows onto `columns` (RECORD_COLUMNS by default) and encode them."""
+        present = set().union(*rows)
+        names = [name for name in (columns or RECORD_COLUMNS) if name in present]
+        return cls({name: encode_column([row.get(name) for row in rows]) for name in names}, len(rows))
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.length))]
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError(i)
+        return Record(self, i)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the column arrays and distinct values."""
+        return sum(column.nbytes for column in self.columns.values())
+
+    def sections(self) -> Dict[str, np.ndarray]:
+        """The raw arrays to write into a snapshot, by section name."""
+        sections = {}
+        for name, column in self.columns.items():
+            if isinstance(column, CodedColumn):
+                values = StringColumn.from_values(column.values)
+                sections[f'code:{name}:codes'] = column.codes
+                sections[f'code:{name}:offsets'] = values.offsets
+                sections[f'code:{name}:data'] = values.data
+            else:
+                sections[f'str:{name}:offsets'] = column.offsets
+                sections[f'str:{name}:data'] = column.data
+        return sections
+
+    def layout(self) -> Dict[str, str]:
+        """Column name -> encoding, for the snapshot header."""
+        return {name: column.kind for name, column in self.columns.items()}
+
+    @classmethod
+    def from_sections(cls, layout: Dict[str, str], section: Callable[[str], np.ndarray], length: int) -> 'RecordStore':
+        """Rebuild a store around (memory-mapped) snapshot sections."""
+        columns: Dict[str, Column] = {}
+        for name, kind in layout.items():
+            if kind == 'coded':
+                values = StringColumn(section(f'code:{name}:offsets'), section(f'code:{name}:data'))
+                columns[name] = CodedColumn(section(f'code:{name}:codes'), [values[i] for i in range(len(values))])
+            else:
+                columns[name] = StringColumn(section(f'str:{name}:offsets'), section(f'str:{name}:data'))
+        return cls(columns, length)
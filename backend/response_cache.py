@@ -0,0 +1,156 @@
+"""Bounded LRU + TTL cache for chat answers.
+
+Keys combine the normalized question, the detected category, a hash of the
+conversation so far and the catalog content hash. A new catalog version
+therefore never serves answers computed from old data, and the cache drops
+its entries as soon as it sees the version change.
+
+Given a shared `StateBackend`, entries live in the store under a namespace
+per catalog version, so every worker process answers from the same cache.
+Hit and miss counters stay per process. Async callers use `get_async()` and
+`set_async()`, which run store reads and writes in a worker thread.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from shared_state import StateBackend
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s$.,%&+-]")
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, drop decorative punctuation and collapse whitespace."""
+    text = _PUNCTUATION_RE.sub(' ', (message or '').lower())
+    return ' '.join(text.split()).strip(' .,')
+
+
+def history_fingerprint(history: Optional[List[Dict]]) -> str:
+    """Stable hash of the conversation-history prefix."""
+    if not history:
+        return ''
+    turns = [[turn.get('role', ''), normalize_message(str(turn.get('content', '')))] for turn in history]
+    return hashlib.sha1(json.dumps(turns).encode('utf-8')).hexdigest()
+
+
+def context_fingerprint(context) -> str:
+    """Stable hash of the catalog rows sent to the model."""
+    return hashlib.sha1(json.dumps(context, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def cache_key(message: str, category: Optional[str], history: Optional[List[Dict]], catalog_version: Optional[str]) -> str:
+    """Build the cache key for one chat turn."""
+    parts = [normalize_message(message), category or '', history_fingerprint(history), catalog_version or '']
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with per-entry TTL and hit/miss statistics."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0,
+                 state: Optional[StateBackend] = None, namespace: str = 'responses'):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.state = state
+        self.namespace = namespace
+        self.catalog_version: Optional[str] = None
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def sync_version(self, catalog_version: Optional[str]):
+        """Drop every entry when the catalog content hash changes."""
+        with self._lock:
+            if catalog_version != self.catalog_version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                # Workers see a reload at different times; each drops only the old version's entries
+                if self.state is not None and self.catalog_version is not None:
+                    self.state.cache_clear(self._shared_namespace())
+                    self.invalidations += 1
+                self.catalog_version = catalog_version
+
+    def _shared_namespace(self) -> str:
+        return f"{self.namespace}:{(self.catalog_version or '')[:16]}"
+
+    def get(self, key: str) -> Optional[str]:
+        if self.state is not None:
+            value = self.state.cache_get(self._shared_namespace(), key)
+            with self._lock:
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return value
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str):
+        if self.state is not None:
+            self.state.cache_set(self._shared_namespace(), key, value, self.ttl, self.max_entries)
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def get_async(self, key: str) -> Optional[str]:
+        """get(), reading a shared store in a worker thread."""
+        if self.state is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def set_async(self, key: str, value: str):
+        """set(), writing a shared store in a worker thread."""
+        if self.state is None:
+            return self.set(key, value)
+        await asyncio.to_thread(self.set, key, value)
+
+    def clear(self):
+        if self.state is not None:
+            self.state.cache_clear(self._shared_namespace())
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        entries = self.state.cache_size(self._shared_namespace()) if self.state is not None else None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries if entries is not None else len(self._entries),
+                "shared": self.state is not None,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "catalog_version": self.catalog_version,
+            }
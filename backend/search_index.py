@@ -0,0 +1,201 @@
+"""Inverted-index BM25 search over the newsletter catalog.
+
+The index is built once when the catalog is loaded. Postings are stored in
+compact CSR-style arrays (term -> slice of doc ids and weights) so that a
+query only touches the posting lists of its own terms, never the full
+catalog. The same term frequencies are also kept row by row, as a forward
+CSR (doc -> slice of term ids and frequencies). A reload can then reuse
+unchanged rows without holding one dict per row.
+"""
+
+import heapq
+import re
+import sys
+from array import array
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Words that carry no retrieval signal in this domain
+STOPWORDS = frozenset("""
+a about all also an and any are as at be best but by can do does for from
+get give has have how i in is it its me more most my new newsletter of on or
+our out please show some than that the their them there these they this
+those to top us want was we what which who whose will with would you your
+""".split())
+
+# Field weights: a hit in the newsletter name counts more than one buried in
+# the audience description
+DEFAULT_FIELDS = {
+    'Newsletter Name': 3.0,
+    'Category': 2.0,
+    'Audience Info': 1.0,
+}
+
+
+def normalize_token(token: str) -> str:
+    """Fold simple plurals so 'newsletters' and 'newsletter' share a posting list."""
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        if token.endswith('ies') and len(token) > 4:
+            return token[:-3] + 'y'
+        return token[:-1]
+    return token
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase, split on non-alphanumerics, drop stopwords and fold plurals."""
+    if not text or not isinstance(text, str):
+        return []
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        token = normalize_token(token)
+        if token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+def category_of(row: Dict) -> str:
+    """Return a row's category, treating missing values (NaN from pandas) as empty."""
+    category = row.get('Category')
+    return category.strip() if isinstance(category, str) else ''
+
+
+def document_terms(row: Dict, fields: Dict[str, float]) -> Dict[str, float]:
+    """Return the field-weighted term frequencies of one catalog row."""
+    freqs: Dict[str, float] = {}
+    for field, weight in fields.items():
+        for token in tokenize(row.get(field)):
+            freqs[token] = freqs.get(token, 0.0) + weight
+    return freqs
+
+
+class SearchIndex:
+    """BM25 inverted index over name, category and audience text."""
+
+    def __init__(self, rows: Sequence[Dict], fields: Optional[Dict[str, float]] = None,
+                 k1: float = 1.2, b: float = 0.75, doc_terms: Optional[Iterable[Dict[str, float]]] = None):
+        self.fields = fields or DEFAULT_FIELDS
+        self.k1 = k1
+        self.b = b
+        self.doc_count = len(rows)
+        self.categories = [sys.intern(category_of(row)) for row in rows]
+        if doc_terms is None:
+            doc_terms = (document_terms(row, self.fields) for row in rows)
+        self._build(doc_terms)
+
+    @classmethod
+    def from_arrays(cls, categories: List[str], terms: Dict[str, int], offsets, doc_ids, weights, idf,
+                    fields: Optional[Dict[str, float]] = None, k1: float = 1.2, b: float = 0.75,
+                    documents: Optional[Tuple] = None) -> 'SearchIndex':
+        """Restore a prebuilt index, e.g. from a memory-mapped catalog snapshot.
+
+        `documents` is the (doc_offsets, doc_term_ids, doc_tfs) forward CSR, if stored.
+        """
+        index = cls.__new__(cls)
+        index.fields = fields or DEFAULT_FIELDS
+        index.k1 = k1
+        index.b = b
+        index.doc_count = len(categories)
+        index.categories = categories
+        index.terms = terms
+        index.offsets = offsets
+        index.doc_ids = doc_ids
+        index.weights = weights
+        index.idf = idf
+        index.vocabulary = sorted(terms, key=terms.get)
+        index.doc_offsets, index.doc_term_ids, index.doc_tfs = documents or (None, None, None)
+        index._group_categories()
+        return index
+
+    def _build(self, doc_terms: Iterable[Dict[str, float]]):
+        """Compact per-document term frequencies into forward and CSR posting arrays."""
+        # One pass over the documents, so they can be produced lazily
+        first_seen: Dict[str, int] = {}
+        doc_offsets = array('i', [0])
+        term_ids = array('i')
+        tfs = array('f')
+        for freqs in doc_terms:
+            for term, tf in freqs.items():
+                term_ids.append(first_seen.setdefault(term, len(first_seen)))
+                tfs.append(tf)
+            doc_offsets.append(len(term_ids))
+
+        # Number terms alphabetically, as the snapshot and postings expect
+        self.vocabulary: List[str] = sorted(first_seen)
+        self.terms: Dict[str, int] = {term: term_id for term_id, term in enumerate(self.vocabulary)}
+        renumber = np.empty(len(first_seen), dtype=np.int32)
+        renumber[[first_seen[term] for term in self.vocabulary]] = np.arange(len(first_seen), dtype=np.int32)
+        self.doc_offsets = np.frombuffer(doc_offsets, dtype=np.int32)
+        self.doc_term_ids = renumber[np.frombuffer(term_ids, dtype=np.int32)]
+        self.doc_tfs = np.frombuffer(tfs, dtype=np.float32)
+
+        docs = np.repeat(np.arange(self.doc_count, dtype=np.int32), np.diff(self.doc_offsets))
+        doc_lengths = np.bincount(docs, weights=self.doc_tfs, minlength=self.doc_count)
+        avg_length = float(doc_lengths.mean()) if self.doc_count else 0.0
+
+        # Group postings by term, keeping doc order within each term
+        order = np.argsort(self.doc_term_ids, kind='stable')
+        df = np.bincount(self.doc_term_ids, minlength=len(self.vocabulary))
+        self.offsets = np.zeros(len(self.vocabulary) + 1, dtype=np.int32)
+        np.cumsum(df, out=self.offsets[1:])
+        self.doc_ids = docs[order]
+        self.idf = np.log(1.0 + (self.doc_count - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        # Precompute the length-normalized BM25 tf component so a query is
+        # just a sum of idf * weight over its postings
+        tf = self.doc_tfs[order].astype(np.float64)
+        norm = self.k1 * (1.0 - self.b + self.b * doc_lengths[self.doc_ids] / avg_length)
+        self.weights = (tf * (self.k1 + 1.0) / (tf + norm)).astype(np.float32)
+
+        self._group_categories()
+
+    @property
+    def has_documents(self) -> bool:
+        """True when per-row term frequencies are available for reuse."""
+        return self.doc_offsets is not None
+
+    def document(self, doc_id: int) -> Dict[str, float]:
+        """The field-weighted term frequencies of one row, as `document_terms` returns them."""
+        start, end = int(self.doc_offsets[doc_id]), int(self.doc_offsets[doc_id + 1])
+        vocabulary = self.vocabulary
+        return {vocabulary[term_id]: tf for term_id, tf in
+                zip(self.doc_term_ids[start:end].tolist(), self.doc_tfs[start:end].tolist())}
+
+    def _group_categories(self):
+        self.category_docs: Dict[str, List[int]] = {}
+        for doc_id, category in enumerate(self.categories):
+            self.category_docs.setdefault(category, []).append(doc_id)
+
+    def postings(self, term: str) -> Iterable[Tuple[int, float]]:
+        """Return (doc_id, weight) pairs for a normalized term."""
+        term_id = self.terms.get(term)
+        if term_id is None:
+            return ()
+        start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+        return zip(self.doc_ids[start:end].tolist(), self.weights[start:end].tolist())
+
+    def score(self, query: str, category: Optional[str] = None) -> Dict[int, float]:
+        """Accumulate BM25 scores for every document sharing a term with the query."""
+        scores: Dict[int, float] = {}
+        for term in dict.fromkeys(tokenize(query)):
+            term_id = self.terms.get(term)
+            if term_id is None:
+                continue
+            idf = float(self.idf[term_id])
+            for doc_id, weight in self.postings(term):
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * weight
+
+        if category:
+            categories = self.categories
+            scores = {doc_id: s for doc_id, s in scores.items() if categories[doc_id] == category}
+        return scores
+
+    def search(self, query: str, category: Optional[str] = None, top_k: int = 20) -> List[Tuple[int, float]]:
+        """Return the top_k (doc_id, score) pairs ranked by BM25 score."""
+        scores = self.score(query, category)
+        return heapq.nlargest(top_k, scores.items(), key=itemgetter(1))
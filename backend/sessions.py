@@ -0,0 +1,212 @@
+"""Server-side chat sessions with bounded, compacted history.
+
+The client sends a session id and the new message; the server keeps the
+turns. Once a session's turns exceed the history token budget, the oldest
+exchanges are folded into a rolling extractive summary (the question asked
+and the newsletters named in the answer) while the latest turns stay
+verbatim. Summarizing is local string work, so every turn sends the model a
+bounded history however long the chat runs. Sessions live in an LRU with an
+idle TTL so memory stays bounded too.
+
+With a shared `StateBackend` sessions are stored there as JSON instead, so
+consecutive turns of one chat can land on different worker processes. Async
+callers use the `*_async` methods, which do that store I/O in a worker thread.
+"""
+
+import asyncio
+import json
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from context_packer import count_tokens
+from shared_state import StateBackend
+
+SESSION_NAMESPACE = 'sessions'
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s')
+_LIST_ITEM_RE = re.compile(r'^\s*(?:[-*•]|\d+[.)])\s+(.*)$')
+_MARKDOWN_RE = re.compile(r'\*\*|__|`|#+\s')
+_LINK_RE = re.compile(r'\[([^\]]*)\]\([^)]*\)')
+
+
+def _plain(text: str) -> str:
+    return _MARKDOWN_RE.sub('', _LINK_RE.sub(r'\1', text or ''))
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = ' '.join(text.split())
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(' ', 1)[0] + '…'
+
+
+def gist(role: str, content: str, limit: int = 160) -> str:
+    """One-line extract of a turn: the question, or the items an answer listed."""
+    text = _plain(content)
+    if role == 'assistant':
+        # Answers are lists of newsletters; their names are what later turns refer to
+        heads = []
+        for line in text.splitlines():
+            match = _LIST_ITEM_RE.match(line)
+            if match:
+                heads.append(re.split(r'\s[-–—:]\s|:\s', match.group(1), maxsplit=1)[0].strip())
+        if heads:
+            return 'Assistant listed: ' + _shorten(', '.join(h for h in heads if h), limit)
+        return 'Assistant: ' + _shorten(_SENTENCE_RE.split(text.strip(), maxsplit=1)[0], limit)
+    return 'User asked: ' + _shorten(text, limit)
+
+
+@dataclass
+class Session:
+    """One conversation: a rolling summary plus the latest turns verbatim."""
+    session_id: str
+    turns: List[Dict] = field(default_factory=list)
+    turn_tokens: List[int] = field(default_factory=list)
+    summary: List[str] = field(default_factory=list)
+    exchanges: int = 0
+    touched: float = field(default_factory=time.monotonic)
+
+    def history(self) -> List[Dict]:
+        """Messages to send the model ahead of the new question."""
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": "Summary of the earlier conversation:\n" + '\n'.join(self.summary)})
+        return messages + [dict(turn) for turn in self.turns]
+
+    def to_json(self) -> str:
+        return json.dumps({"turns": self.turns, "turn_tokens": self.turn_tokens,
+                           "summary": self.summary, "exchanges": self.exchanges})
+
+    @classmethod
+    def from_json(cls, session_id: str, data: str) -> 'Session':
+        state = json.loads(data)
+        return cls(session_id, state["turns"], state["turn_tokens"], state["summary"], state["exchanges"])
+
+
+class SessionStore:
+    """Bounded LRU of sessions with idle expiry and history compaction."""
+
+    def __init__(self, max_sessions: int = 10000, ttl: float = 6 * 3600.0, history_budget: int = 1000,
+                 keep_recent: int = 4, summary_budget: int = 300, state: Optional[StateBackend] = None):
+        self.max_sessions = max_sessions
+        self.state = state
+        self.ttl = ttl
+        self.history_budget = history_budget
+        self.keep_recent = keep_recent
+        self.summary_budget = summary_budget
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.compactions = 0
+
+    def get(self, session_id: Optional[str]) -> Session:
+        """Return the live session for `session_id`, or start a new one with a fresh id."""
+        if self.state is not None:
+            return self._get_shared(session_id)
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+            if session is not None and now - session.touched > self.ttl:
+                del self._sessions[session_id]
+                self.expirations += 1
+                session = None
+            if session is None:
+                session = Session(session_id=uuid.uuid4().hex)
+                self._sessions[session.session_id] = session
+                self.created += 1
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evictions += 1
+            session.touched = now
+            self._sessions.move_to_end(session.session_id)
+            return session
+
+    def _get_shared(self, session_id: Optional[str]) -> Session:
+        data = self.state.cache_get(SESSION_NAMESPACE, session_id) if session_id else None
+        if data is not None:
+            return Session.from_json(session_id, data)
+        with self._lock:
+            self.created += 1
+        return Session(session_id=uuid.uuid4().hex)
+
+    def _save(self, session: Session):
+        """Write a changed session back to the shared store; the TTL restarts."""
+        if self.state is not None:
+            self.state.cache_set(SESSION_NAMESPACE, session.session_id, session.to_json(), self.ttl, self.max_sessions)
+
+    def seed(self, session: Session, history: List[Dict]):
+        """Adopt history sent by an older client for a session that has none yet."""
+        with self._lock:
+            if session.turns or session.summary:
+                return
+            for turn in history:
+                if turn.get('role') in ('user', 'assistant') and turn.get('content'):
+                    self._append(session, turn['role'], str(turn['content']))
+            self._compact(session)
+        self._save(session)
+
+    def record(self, session: Session, message: str, response: str):
+        """Store a finished exchange and compact the history if it is over budget."""
+        with self._lock:
+            self._append(session, 'user', message)
+            self._append(session, 'assistant', response)
+            session.exchanges += 1
+            self._compact(session)
+        self._save(session)
+
+    async def get_async(self, session_id: Optional[str]) -> Session:
+        """get(), loading from a shared store in a worker thread."""
+        if self.state is None:
+            return self.get(session_id)
+        return await asyncio.to_thread(self.get, session_id)
+
+    async def seed_async(self, session: Session, history: List[Dict]):
+        """seed(), saving to a shared store in a worker thread."""
+        if self.state is None:
+            return self.seed(session, history)
+        await asyncio.to_thread(self.seed, session, history)
+
+    async def record_async(self, session: Session, message: str, response: str):
+        """record(), saving to a shared store in a worker thread."""
+        if self.state is None:
+            return self.record(session, message, response)
+        await asyncio.to_thread(self.record, session, message, response)
+
+    def _append(self, session: Session, role: str, content: str):
+        session.turns.append({"role": role, "content": content})
+        session.turn_tokens.append(count_tokens(content))
+
+    def _compact(self, session: Session):
+        """Fold the oldest turns into the summary until the verbatim turns fit."""
+        folded = False
+        while len(session.turns) > self.keep_recent and sum(session.turn_tokens) > self.history_budget:
+            turn = session.turns.pop(0)
+            session.turn_tokens.pop(0)
+            session.summary.append(gist(turn['role'], turn['content']))
+            folded = True
+        if folded:
+            self.compactions += 1
+            # The summary rolls: its oldest lines go once it outgrows its own budget
+            while len(session.summary) > 1 and count_tokens('\n'.join(session.summary)) > self.summary_budget:
+                session.summary.pop(0)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "sessions": self.state.cache_size(SESSION_NAMESPACE) if self.state is not None else len(self._sessions),
+                "shared": self.state is not None,
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl,
+                "history_budget_tokens": self.history_budget,
+                "created": self.created,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "compactions": self.compactions,
+            }
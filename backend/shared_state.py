@@ -0,0 +1,234 @@
+"""State shared by every worker process: the token budget and answer caches.
+
+Each uvicorn worker otherwise keeps its own token bucket and caches, so N
+workers spend N times the provider quota. A `StateBackend` holds that state
+outside the process instead. `SQLiteState` keeps it in a local SQLite
+database in WAL mode, which every worker on the host can open. Each bucket
+operation is one short `BEGIN IMMEDIATE` transaction, so refill-and-take is
+atomic across processes; the async token bucket runs them in a worker thread
+so a worker waiting on another's lock never blocks its event loop, and the
+FastAPI app reaches the caches and sessions through their async methods for
+the same reason. Cache reads take no lock at all, and cache writes give up
+after a brief wait, since a cache may always miss. A networked store (Redis, etc.) can implement the
+same methods to share state across hosts.
+
+Configured with SHARED_STATE_URL:
+
+    (unset)                       per-process state, as with a single worker
+    sqlite:///state.db            relative path
+    sqlite:////var/run/app.db     absolute path
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StateBackend(ABC):
+    """Atomic operations the rate limiter and caches need from a shared store."""
+
+    @abstractmethod
+    def take_tokens(self, bucket: str, tokens: float, capacity: float, refill_per_second: float,
+                    wait: Optional[float] = None) -> float:
+        """Refill the bucket, then take `tokens` if they are all available.
+
+        Returns 0.0 when the tokens were taken, else how many are missing.
+        `wait` bounds the time spent waiting for other processes; when it runs
+        out the tokens count as missing.
+        """
+
+    @abstractmethod
+    def adjust_tokens(self, bucket: str, delta: float, capacity: float, refill_per_second: float):
+        """Remove `delta` tokens (negative refunds), allowing the bucket to go into debt."""
+
+    @abstractmethod
+    def available_tokens(self, bucket: str, capacity: float, refill_per_second: float) -> float:
+        """Tokens in the bucket now, without changing it."""
+
+    @abstractmethod
+    def cache_get(self, namespace: str, key: str) -> Optional[str]:
+        """Return a live entry and mark it recently used; expired entries are dropped."""
+
+    @abstractmethod
+    def cache_set(self, namespace: str, key: str, value: str, ttl: float, max_entries: int):
+        """Store an entry, evicting the least recently used beyond `max_entries`."""
+
+    @abstractmethod
+    def cache_clear(self, namespace: str):
+        """Drop every entry in a namespace."""
+
+    @abstractmethod
+    def cache_size(self, namespace: str) -> int:
+        """Entries held in a namespace."""
+
+    def close(self):
+        pass
+
+
+def _locked(e: sqlite3.OperationalError) -> bool:
+    """True when SQLite gave up waiting for another connection's lock."""
+    return 'locked' in str(e) or 'busy' in str(e)
+
+
+def _refilled(tokens: float, updated: float, now: float, capacity: float, refill_per_second: float) -> float:
+    # Clocks of different processes agree on wall time; never refill backwards
+    return min(capacity, tokens + max(0.0, now - updated) * refill_per_second)
+
+
+class SQLiteState(StateBackend):
+    """Shared state in a SQLite database in WAL mode, one connection per thread."""
+
+    # Recency is only recorded this often per entry, so hot reads stay read-only
+    TOUCH_INTERVAL = 1.0
+
+    def __init__(self, path: str, busy_timeout: float = 5.0, cache_wait: float = 0.05):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.cache_wait = cache_wait
+        self._local = threading.local()
+        with self._transaction() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            db.execute("CREATE TABLE IF NOT EXISTS cache (namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                       "expires REAL NOT NULL, touched REAL NOT NULL, PRIMARY KEY (namespace, key))")
+            db.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, touched)")
+        logger.info(f"Shared state in SQLite at {path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            # Autocommit mode; transactions are opened explicitly below
+            db = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.wait = self.busy_timeout
+        return db
+
+    @contextmanager
+    def _transaction(self, wait: Optional[float] = None):
+        db = self._connection()
+        wait = self.busy_timeout if wait is None else wait
+        if wait != self._local.wait:
+            db.execute(f"PRAGMA busy_timeout = {int(wait * 1000)}")
+            self._local.wait = wait
+        # Take the write lock up front so read-modify-write is atomic across processes
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def _bucket(self, db: sqlite3.Connection, bucket: str, capacity: float, refill_per_second: float, now: float) -> float:
+        row = db.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (bucket,)).fetchone()
+        if row is None:
+            return capacity
+        return _refilled(row[0], row[1], now, capacity, refill_per_second)
+
+    def _store_bucket(self, db: sqlite3.Connection, bucket: str, tokens: float, now: float):
+        db.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)", (bucket, tokens, now))
+
+    def take_tokens(self, bucket: str, tokens: float, capacity: float, refill_per_second: float,
+                    wait: Optional[float] = None) -> float:
+        now = time.time()
+        try:
+            with self._transaction(wait) as db:
+                available = self._bucket(db, bucket, capacity, refill_per_second, now)
+                if available < tokens:
+                    self._store_bucket(db, bucket, available, now)
+                    return tokens - available
+                self._store_bucket(db, bucket, available - tokens, now)
+                return 0.0
+        except sqlite3.OperationalError as e:
+            if not _locked(e):
+                raise
+            return tokens
+
+    def adjust_tokens(self, bucket: str, delta: float, capacity: float, refill_per_second: float):
+        now = time.time()
+        with self._transaction() as db:
+            available = self._bucket(db, bucket, capacity, refill_per_second, now)
+            self._store_bucket(db, bucket, min(capacity, available - delta), now)
+
+    def available_tokens(self, bucket: str, capacity: float, refill_per_second: float) -> float:
+        row = self._connection().execute("SELECT tokens, updated FROM buckets WHERE name = ?", (bucket,)).fetchone()
+        if row is None:
+            return capacity
+        return _refilled(row[0], row[1], time.time(), capacity, refill_per_second)
+
+    def _cache_write(self, wait: float, write: Callable[[sqlite3.Connection], None]):
+        """Run a cache write in one transaction, skipping it if the lock stays busy past `wait`."""
+        try:
+            with self._transaction(wait) as db:
+                write(db)
+        except sqlite3.OperationalError as e:
+            if not _locked(e):
+                raise
+            # Skipped recency touches are routine; skipped stores are worth noting
+            (logger.debug if wait == 0 else logger.warning)(f"Skipped a shared cache write: {str(e)}")
+
+    def cache_get(self, namespace: str, key: str) -> Optional[str]:
+        now = time.time()
+        # A plain read never waits on writers in WAL mode
+        row = self._connection().execute("SELECT value, expires, touched FROM cache WHERE namespace = ? AND key = ?",
+                                         (namespace, key)).fetchone()
+        if row is None:
+            return None
+        value, expires, touched = row
+        # Expiry and recency updates are best effort: they never wait for the lock
+        if now >= expires:
+            self._cache_write(0.0, lambda db: db.execute("DELETE FROM cache WHERE namespace = ? AND key = ? AND expires <= ?",
+                                                         (namespace, key, now)))
+            return None
+        if now - touched >= self.TOUCH_INTERVAL:
+            self._cache_write(0.0, lambda db: db.execute("UPDATE cache SET touched = ? WHERE namespace = ? AND key = ?",
+                                                         (now, namespace, key)))
+        return value
+
+    def cache_set(self, namespace: str, key: str, value: str, ttl: float, max_entries: int):
+        now = time.time()
+
+        def write(db: sqlite3.Connection):
+            db.execute("INSERT OR REPLACE INTO cache (namespace, key, value, expires, touched) VALUES (?, ?, ?, ?, ?)",
+                       (namespace, key, value, now + ttl, now))
+            count = db.execute("SELECT COUNT(*) FROM cache WHERE namespace = ?", (namespace,)).fetchone()[0]
+            if count > max_entries:
+                db.execute("DELETE FROM cache WHERE namespace = ? AND key IN "
+                           "(SELECT key FROM cache WHERE namespace = ? ORDER BY touched LIMIT ?)",
+                           (namespace, namespace, count - max_entries))
+
+        self._cache_write(self.cache_wait, write)
+
+    def cache_clear(self, namespace: str):
+        self._cache_write(self.cache_wait, lambda db: db.execute("DELETE FROM cache WHERE namespace = ?", (namespace,)))
+
+    def cache_size(self, namespace: str) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM cache WHERE namespace = ?", (namespace,)).fetchone()[0]
+
+    def close(self):
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+
+def open_state(url: Optional[str]) -> Optional[StateBackend]:
+    """Open the backend a SHARED_STATE_URL names; None means per-process state."""
+    if not url or url == 'local://':
+        return None
+    if url.startswith('sqlite:///'):
+        path = url[len('sqlite:///'):]
+        if not path:
+            raise ValueError("SHARED_STATE_URL needs a database path, e.g. sqlite:////tmp/state.db")
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        return SQLiteState(path)
+    raise ValueError(f"Unsupported SHARED_STATE_URL scheme: {url.split(':', 1)[0]}")
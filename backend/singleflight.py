@@ -0,0 +1,101 @@
+"""Single-flight coalescing for concurrent identical LLM calls.
+
+The first request for a key starts the call as its own task. Requests that
+arrive while it is running join that flight instead of starting another. A
+flight can publish partial output, so streaming callers see the same deltas
+as the caller that started it. Callers wait through a shield or on an event,
+so one caller disconnecting never cancels the call the others depend on.
+The flight is forgotten as soon as it finishes. Errors therefore reach every
+caller of that flight, but the next request retries from scratch.
+"""
+
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, List
+
+
+class Flight:
+    """One in-flight call and the output it has published so far."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.chunks: List[str] = []
+        self.followers = 0
+        self.task: asyncio.Task = None
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk: str):
+        """Record a partial result and wake streaming callers."""
+        self.chunks.append(chunk)
+        self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def result(self) -> str:
+        """Wait for the full result without letting our cancellation reach the call."""
+        return await asyncio.shield(self.task)
+
+    async def iter_chunks(self) -> AsyncIterator[str]:
+        """Yield published chunks from the start, then the rest as they arrive."""
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.task.done():
+                result = self.task.result()
+                if not self.chunks and result:
+                    # The call did not stream; hand over the whole answer
+                    yield result
+                return
+            await changed.wait()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key."""
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def join(self, key: str, producer: Callable[[Flight], Awaitable[str]]) -> Flight:
+        """Return the running flight for `key`, starting `producer` if there is none."""
+        flight = self._flights.get(key)
+        if flight is not None:
+            flight.followers += 1
+            self.coalesced += 1
+            return flight
+
+        flight = Flight(key)
+        flight.task = asyncio.ensure_future(self._run(flight, producer))
+        flight.task.add_done_callback(lambda task: self._finish(flight, task))
+        self._flights[key] = flight
+        self.started += 1
+        return flight
+
+    async def _run(self, flight: Flight, producer: Callable[[Flight], Awaitable[str]]) -> str:
+        try:
+            return await producer(flight)
+        finally:
+            flight._notify()
+
+    def _finish(self, flight: Flight, task: asyncio.Task):
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+        if not task.cancelled():
+            # Mark the error as retrieved even if every caller went away
+            task.exception()
+
+    async def do(self, key: str, producer: Callable[[], Awaitable[str]]):
+        """Run `producer` once for all concurrent callers of `key` and return its result."""
+        return await self.join(key, lambda flight: producer()).result()
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
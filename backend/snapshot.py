@@ -0,0 +1,210 @@
+"""Prebuilt binary snapshot of the catalog for fast cold starts.
+
+`python backend/snapshot.py` compiles context.csv into context.snapshot:
+typed numeric columns, interned category codes, the record store's encoded
+string columns, the BM25 postings, the semantic row vectors and the packed
+context blocks (row token costs plus each category's prompt block), laid out as
+aligned raw arrays behind a small JSON header. At runtime the file is
+memory-mapped and the arrays are used in place, so a cold start costs a hash
+of the CSV plus a few dict builds instead of a full parse.
+
+Layout:
+    8 bytes   magic b'SIDXSNAP'
+    4 bytes   little-endian format version
+    4 bytes   little-endian header length
+    N bytes   JSON header (sections, offsets, dtypes, source hash)
+    ...       8-byte aligned raw sections
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from contextlib import nullcontext
+from typing import Dict, Optional
+
+import numpy as np
+
+from catalog import NUMERIC_COLUMNS, Catalog, read_csv_rows, source_digest
+from context_packer import ContextBlocks
+from records import RecordStore
+from search_index import SearchIndex
+from vectors import HASH_FEATURES, VectorIndex
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SIDXSNAP'
+FORMAT_VERSION = 2
+PREAMBLE = struct.Struct('<8sII')
+ALIGNMENT = 8
+
+
+def default_snapshot_path(csv_path: str) -> str:
+    """Snapshots live next to the CSV they were built from."""
+    return os.path.splitext(csv_path)[0] + '.snapshot'
+
+
+def build_snapshot(csv_path: str, snapshot_path: Optional[str] = None) -> str:
+    """Compile the catalog CSV into a binary snapshot and return its path."""
+    snapshot_path = snapshot_path or default_snapshot_path(csv_path)
+    catalog = Catalog(read_csv_rows(csv_path), version=source_digest(csv_path))
+    index = catalog.index
+
+    sections: Dict[str, np.ndarray] = {'category_codes': np.asarray(catalog.category_codes, dtype=np.int16)}
+    for name in NUMERIC_COLUMNS:
+        sections[name] = np.asarray(getattr(catalog, name), dtype=np.float64)
+    sections.update(catalog.rows.sections())
+
+    # Terms are [a-z0-9]+ so a newline-joined blob round-trips safely
+    terms = sorted(index.terms, key=index.terms.get)
+    sections['index:terms'] = np.frombuffer('\n'.join(terms).encode('utf-8'), dtype=np.uint8)
+    sections['index:offsets'] = np.asarray(index.offsets, dtype=np.int32)
+    sections['index:doc_ids'] = np.asarray(index.doc_ids, dtype=np.int32)
+    sections['index:weights'] = np.asarray(index.weights, dtype=np.float32)
+    sections['index:idf'] = np.asarray(index.idf, dtype=np.float32)
+    sections['index:doc_offsets'] = np.asarray(index.doc_offsets, dtype=np.int32)
+    sections['index:doc_term_ids'] = np.asarray(index.doc_term_ids, dtype=np.int32)
+    sections['index:doc_tfs'] = np.asarray(index.doc_tfs, dtype=np.float32)
+
+    vectors = catalog.vectors
+    sections['vectors:matrix'] = vectors.matrix
+    sections['vectors:projection'] = vectors.projection
+    sections['vectors:idf'] = vectors.idf
+
+    context_spec, context_sections = catalog.context_blocks.sections()
+    sections.update(context_sections)
+
+    # Lay sections out at aligned offsets relative to the end of the header
+    layout = {}
+    position = 0
+    for name, array in sections.items():
+        position = -(-position // ALIGNMENT) * ALIGNMENT
+        layout[name] = {'dtype': array.dtype.str, 'offset': position, 'count': int(array.size)}
+        position += array.nbytes
+
+    header = json.dumps({
+        'source_sha256': catalog.version,
+        'row_count': len(catalog),
+        'columns': catalog.rows.layout(),
+        'category_names': catalog.category_names,
+        'index': {'fields': index.fields, 'k1': index.k1, 'b': index.b, 'term_count': len(terms)},
+        'vectors': {'dimensions': vectors.dimensions, 'hash_features': HASH_FEATURES},
+        'context_blocks': context_spec,
+        'sections': layout,
+    }).encode('utf-8')
+    data_start = -(-(PREAMBLE.size + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    # Write atomically so a running process never maps a half-written file
+    tmp_path = snapshot_path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        file.write(header)
+        for name, array in sections.items():
+            file.seek(data_start + layout[name]['offset'])
+            file.write(array.tobytes())
+    os.replace(tmp_path, snapshot_path)
+    return snapshot_path
+
+
+def load_snapshot(snapshot_path: str, expected_digest: Optional[str] = None) -> Optional[Catalog]:
+    """Memory-map a snapshot; return None if it is missing, malformed or stale."""
+    if not os.path.exists(snapshot_path):
+        return None
+    with open(snapshot_path, 'rb') as file:
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None  # empty file
+
+    magic, version, header_length = PREAMBLE.unpack_from(mapped, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        logger.warning(f"Ignoring snapshot {snapshot_path}: unsupported format")
+        return None
+    header = json.loads(mapped[PREAMBLE.size:PREAMBLE.size + header_length])
+    if expected_digest and header['source_sha256'] != expected_digest:
+        logger.info(f"Snapshot {snapshot_path} is stale, rebuilding from CSV")
+        return None
+
+    data_start = -(-(PREAMBLE.size + header_length) // ALIGNMENT) * ALIGNMENT
+
+    def section(name):
+        spec = header['sections'][name]
+        return np.frombuffer(mapped, dtype=np.dtype(spec['dtype']), count=spec['count'],
+                             offset=data_start + spec['offset'])
+
+    row_count = header['row_count']
+    category_names = header['category_names']
+    category_codes = section('category_codes')
+    columns = {name: section(name) for name in NUMERIC_COLUMNS}
+    records = RecordStore.from_sections(header['columns'], section, row_count)
+
+    spec = header['index']
+    terms_blob = section('index:terms').tobytes().decode('utf-8')
+    term_list = terms_blob.split('\n') if terms_blob else []
+    categories = [category_names[code] if code >= 0 else '' for code in category_codes.tolist()]
+    index = SearchIndex.from_arrays(
+        categories,
+        dict(zip(term_list, range(len(term_list)))),
+        section('index:offsets'),
+        section('index:doc_ids'),
+        section('index:weights'),
+        section('index:idf'),
+        fields=spec['fields'], k1=spec['k1'], b=spec['b'],
+        documents=(section('index:doc_offsets'), section('index:doc_term_ids'), section('index:doc_tfs')),
+    )
+    catalog = Catalog.from_arrays(records, category_names, category_codes,
+                                  columns, index, version=header['source_sha256'],
+                                  vectors=_load_vectors(header, section))
+    spec = header.get('context_blocks')
+    if spec:
+        # Older snapshots, or other packing settings, leave them to be built on first use
+        catalog.context_blocks = ContextBlocks.from_sections(catalog, spec, section)
+    return catalog
+
+
+def _load_vectors(header: Dict, section) -> Optional[VectorIndex]:
+    """Map the stored row vectors; None (built lazily) if absent or from another feature space."""
+    spec = header.get('vectors')
+    if not spec or spec.get('hash_features') != HASH_FEATURES:
+        return None
+    dimensions = spec['dimensions']
+    matrix = section('vectors:matrix').reshape(header['row_count'], dimensions)
+    projection = section('vectors:projection').reshape(HASH_FEATURES, dimensions)
+    return VectorIndex(matrix, projection, section('vectors:idf'))
+
+
+def load_catalog(csv_path: str, snapshot_path: Optional[str] = None, report=None) -> Catalog:
+    """Load the catalog from its snapshot when fresh, otherwise parse the CSV.
+
+    `report` is an optional StartupReport that receives per-stage timings.
+    """
+    def stage(name):
+        return report.stage(name) if report is not None else nullcontext()
+
+    snapshot_path = snapshot_path or default_snapshot_path(csv_path)
+    with stage('csv_hash'):
+        digest = source_digest(csv_path) if os.path.exists(csv_path) else None
+    try:
+        with stage('snapshot_load'):
+            catalog = load_snapshot(snapshot_path, expected_digest=digest)
+        if catalog is not None:
+            return catalog
+    except Exception as e:
+        logger.warning(f"Could not read snapshot {snapshot_path}: {str(e)}")
+
+    with stage('csv_load'):
+        rows = read_csv_rows(csv_path)
+    with stage('index_build'):
+        index = SearchIndex(rows)
+    with stage('column_parse'):
+        return Catalog(rows, version=digest, index=index)
+
+
+if __name__ == "__main__":
+    # Build step: python backend/snapshot.py [path/to/context.csv]
+    default_csv = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'context.csv')
+    source = sys.argv[1] if len(sys.argv) > 1 else default_csv
+    path = build_snapshot(source)
+    print(f"Wrote {path} ({os.path.getsize(path)} bytes)")
@@ -0,0 +1,230 @@
+"""Frontend pages held in memory, compressed on demand, with ETag revalidation.
+
+The chat page and the embed's chat box are read once at startup. Their gzip
+and (when the `brotli` package is installed) brotli forms come from the
+`.gz`/`.br` files the build step writes next to them at maximum compression
+(`python backend/static_assets.py`). Without those files, each encoding is
+compressed at a fast level the first time a client asks for it, so startup
+never pays for compression. Each request negotiates an encoding from
+Accept-Encoding and gets the stored bytes, a strong per-encoding ETag,
+`Vary: Accept-Encoding` and a Cache-Control that lets browsers and the CDN
+reuse the page. Shared by the FastAPI app and the serverless handler.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from http_cache import etag_matches
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# URL path -> file under the frontend directory
+DEFAULT_ASSETS = {
+    '/': 'index.html',
+    '/index.html': 'index.html',
+    '/chat-box.html': 'chat-box.html',
+}
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+}
+
+# Browsers revalidate hourly with a cheap 304; the CDN (purged on deploy) keeps a day
+CACHE_CONTROL = os.getenv('STATIC_CACHE_CONTROL', 'public, max-age=3600, s-maxage=86400, stale-while-revalidate=86400')
+
+# Most preferred first
+ENCODINGS = ('br', 'gzip', 'identity')
+# Precompressed file suffix per encoding
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# Levels for compressing at request time, when the build step left no file
+RUNTIME_GZIP_LEVEL = int(os.getenv('STATIC_GZIP_LEVEL', '6'))
+RUNTIME_BROTLI_QUALITY = int(os.getenv('STATIC_BROTLI_QUALITY', '5'))
+
+
+def compress(body: bytes, encoding: str, best: bool = False) -> Optional[bytes]:
+    """Compress a body; None when the encoding is unavailable."""
+    if encoding == 'gzip':
+        # mtime=0 keeps the gzip bytes, and so the ETag, stable across restarts
+        return gzip.compress(body, compresslevel=9 if best else RUNTIME_GZIP_LEVEL, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(body, quality=11 if best else RUNTIME_BROTLI_QUALITY)
+    return None
+
+
+def decompress(data: bytes, encoding: str) -> Optional[bytes]:
+    try:
+        if encoding == 'gzip':
+            return gzip.decompress(data)
+        if encoding == 'br' and brotli is not None:
+            return brotli.decompress(data)
+    except Exception:
+        pass
+    return None
+
+
+@dataclass
+class StaticAsset:
+    """One file's bytes, compressed into each encoding on first use."""
+    path: str
+    content_type: str
+    digest: str
+    # encoding -> bytes, or None when the encoding is unavailable or no smaller
+    bodies: Dict[str, Optional[bytes]] = field(default_factory=dict)
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.path)
+
+    def etag(self, encoding: str) -> str:
+        # Strong ETags name the exact bytes, so each encoding gets its own
+        return f'"{self.digest}-{encoding}"'
+
+    def body(self, encoding: str) -> Optional[bytes]:
+        """The body in an encoding, loading or compressing it the first time."""
+        if encoding not in self.bodies:
+            # Racing threads compute the same bytes, so the last write wins harmlessly
+            self.bodies[encoding] = self._encode(encoding)
+        return self.bodies[encoding]
+
+    def _encode(self, encoding: str) -> Optional[bytes]:
+        identity = self.bodies['identity']
+        data = self._precompressed(encoding, identity)
+        if data is None:
+            data = compress(identity, encoding)
+        return data if data is not None and len(data) < len(identity) else None
+
+    def _precompressed(self, encoding: str, identity: bytes) -> Optional[bytes]:
+        """The build step's file for an encoding, if it still matches the page."""
+        try:
+            with open(self.path + SUFFIXES[encoding], 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if decompress(data, encoding) != identity:
+            logger.warning(f"Ignoring stale {self.filename}{SUFFIXES[encoding]}")
+            return None
+        return data
+
+
+def load_asset(path: str) -> StaticAsset:
+    with open(path, 'rb') as f:
+        body = f.read()
+    content_type = CONTENT_TYPES.get(os.path.splitext(path)[1], 'application/octet-stream')
+    return StaticAsset(path, content_type, hashlib.sha1(body).hexdigest()[:20], {'identity': body})
+
+
+def write_precompressed(path: str) -> Dict[str, int]:
+    """Write the best-compressed .gz/.br files next to a page; return their sizes."""
+    with open(path, 'rb') as f:
+        body = f.read()
+    sizes = {}
+    for encoding, suffix in SUFFIXES.items():
+        data = compress(body, encoding, best=True)
+        if data is None:
+            continue
+        with open(path + suffix + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + suffix + '.tmp', path + suffix)
+        sizes[encoding] = len(data)
+    return sizes
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Map each coding in an Accept-Encoding header to its q-value."""
+    accepted = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(asset: StaticAsset, accept_encoding: Optional[str]) -> str:
+    """Pick the most preferred available encoding the client accepts."""
+    accepted = parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get('*')
+    for encoding in ENCODINGS[:-1]:
+        q = accepted.get(encoding, wildcard)
+        if q is not None and q > 0 and asset.body(encoding) is not None:
+            return encoding
+    # Identity is served even when refused, rather than failing with 406
+    return 'identity'
+
+
+class StaticAssets:
+    """Frontend files keyed by URL path."""
+
+    def __init__(self, directory: str, assets: Optional[Dict[str, str]] = None,
+                 cache_control: str = CACHE_CONTROL):
+        self.directory = directory
+        self.cache_control = cache_control
+        self._assets: Dict[str, StaticAsset] = {}
+        loaded: Dict[str, StaticAsset] = {}
+        for url_path, filename in (assets or DEFAULT_ASSETS).items():
+            try:
+                if filename not in loaded:
+                    loaded[filename] = load_asset(os.path.join(directory, filename))
+                self._assets[url_path] = loaded[filename]
+            except OSError as e:
+                logger.warning(f"Static asset {filename} not available: {str(e)}")
+        for filename, asset in loaded.items():
+            logger.info(f"Loaded {filename} ({len(asset.bodies['identity'])}B)")
+
+    def __contains__(self, url_path: str) -> bool:
+        return url_path in self._assets
+
+    def get(self, url_path: str) -> Optional[StaticAsset]:
+        return self._assets.get(url_path)
+
+    def respond(self, url_path: str, accept_encoding: Optional[str] = None,
+                if_none_match: Optional[str] = None) -> Optional[Tuple[int, Dict[str, str], bytes]]:
+        """Return (status, headers, body) for a path, or None if it is not a known asset."""
+        asset = self._assets.get(url_path)
+        if asset is None:
+            return None
+        encoding = choose_encoding(asset, accept_encoding)
+        headers = {
+            'Cache-Control': self.cache_control,
+            'ETag': asset.etag(encoding),
+            'Vary': 'Accept-Encoding',
+        }
+        if etag_matches(if_none_match, headers['ETag']):
+            return 304, headers, b''
+        body = asset.body(encoding)
+        headers['Content-Type'] = asset.content_type
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        headers['Content-Length'] = str(len(body))
+        return 200, headers, body
+
+
+if __name__ == "__main__":
+    # Build step: python backend/static_assets.py [frontend directory]
+    default_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'frontend')
+    directory = sys.argv[1] if len(sys.argv) > 1 else default_directory
+    for filename in sorted(set(DEFAULT_ASSETS.values())):
+        sizes = write_precompressed(os.path.join(directory, filename))
+        print(f"Compressed {filename}: " + ', '.join(f"{encoding}={size}B" for encoding, size in sizes.items()))
@@ -0,0 +1,46 @@
+"""Server-Sent Events helpers shared by the FastAPI and serverless handlers.
+
+Events sent to the browser:
+    data: {"delta": "..."}             one chunk of model output
+    event: done / data: {"response"}   the full text once the model finishes,
+                                       with per-stage "timings" in milliseconds
+    event: error / data: {"detail"}    the stream failed part-way
+    event: result / data: {"index"}    one answered question of a /chat/batch
+"""
+
+import json
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    # Stop nginx-style proxies from buffering the stream
+    'X-Accel-Buffering': 'no',
+}
+
+
+def sse_event(data: Dict, event: Optional[str] = None) -> str:
+    """Format one SSE event."""
+    prefix = f"event: {event}\n" if event else ''
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def iter_openai_deltas(lines: Iterable[bytes], on_usage: Optional[Callable[[Dict], None]] = None) -> Iterator[str]:
+    """Yield content deltas from a raw OpenAI streaming response body.
+
+    With `stream_options.include_usage` the last chunk carries token usage,
+    which is passed to `on_usage`.
+    """
+    for raw in lines:
+        line = raw.decode('utf-8').strip() if isinstance(raw, bytes) else raw.strip()
+        if not line.startswith('data:'):
+            continue
+        payload = line[len('data:'):].strip()
+        if payload == '[DONE]':
+            return
+        chunk = json.loads(payload)
+        if chunk.get('usage') and on_usage is not None:
+            on_usage(chunk['usage'])
+        for choice in chunk.get('choices', []):
+            content = (choice.get('delta') or {}).get('content')
+            if content:
+                yield content
@@ -0,0 +1,60 @@
+"""Per-request stage timings, reported in the Server-Timing header."""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# The timer of the request being handled, so nested helpers can add stages
+_current: ContextVar[Optional['StageTimer']] = ContextVar('stage_timer', default=None)
+
+
+class StageTimer:
+    """Wall-clock durations of the named stages of one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def bind(self) -> 'StageTimer':
+        """Make this the current request's timer for `stage()` and `record_stage()`."""
+        _current.set(self)
+        return self
+
+    def record(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def as_dict(self) -> Dict[str, float]:
+        """Stage durations in milliseconds, plus the total so far."""
+        timings = {name: round(seconds * 1000.0, 2) for name, seconds in self.stages.items()}
+        timings['total'] = round((time.perf_counter() - self.started) * 1000.0, 2)
+        return timings
+
+    def header(self) -> str:
+        """Format as a Server-Timing header value."""
+        return ', '.join(f"{name};dur={ms}" for name, ms in self.as_dict().items())
+
+
+def record_stage(name: str, seconds: float):
+    """Add to a stage of the current request's timer, if one is bound."""
+    timer = _current.get()
+    if timer is not None:
+        timer.record(name, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as a stage of the current request's timer, if one is bound."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
@@ -0,0 +1,235 @@
+"""Dense vectors for semantic retrieval over newsletter names and audiences.
+
+Each row's name, category and audience text is turned into hashed TF-IDF
+features: words, word bigrams and character 4-grams, so "parenting" and
+"parents" share features. A truncated SVD of that matrix (latent semantic
+analysis) then maps rows into a small dense space. Rows whose audiences use
+related words end up close together even when they share no word with the
+query. Everything is computed locally with NumPy, with no model download.
+
+At query time the message goes through the same features and projection,
+and one matrix-vector product against the unit-normalized row matrix gives
+every cosine score. `argpartition` then picks the top k. The row matrix,
+projection and IDF weights are float32 and are stored in the catalog
+snapshot, so they are memory-mapped rather than rebuilt on a cold start.
+"""
+
+import logging
+import math
+import zlib
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Hashed feature space; collisions are tolerable once the SVD is applied
+HASH_FEATURES = 1 << 13
+DEFAULT_DIMENSIONS = 128
+
+# Field weights, as in the BM25 index
+VECTOR_FIELDS = {
+    'Newsletter Name': 2.0,
+    'Category': 1.5,
+    'Audience Info': 1.0,
+}
+
+# Relative weight of each feature kind
+WORD_WEIGHT = 1.0
+BIGRAM_WEIGHT = 0.5
+NGRAM_WEIGHT = 0.25
+NGRAM_SIZE = 4
+
+
+def _bucket(feature: str) -> int:
+    # crc32 rather than hash(): buckets must agree across processes and builds
+    return zlib.crc32(feature.encode('utf-8')) & (HASH_FEATURES - 1)
+
+
+def text_features(text: Optional[str], weight: float = 1.0, into: Optional[Dict[int, float]] = None) -> Dict[int, float]:
+    """Add the hashed word, bigram and character n-gram counts of `text`."""
+    features = into if into is not None else {}
+    words = tokenize(text)
+    for i, word in enumerate(words):
+        bucket = _bucket('w:' + word)
+        features[bucket] = features.get(bucket, 0.0) + weight * WORD_WEIGHT
+        if i:
+            bucket = _bucket(f'b:{words[i - 1]} {word}')
+            features[bucket] = features.get(bucket, 0.0) + weight * BIGRAM_WEIGHT
+        padded = f'<{word}>'
+        for start in range(max(1, len(padded) - NGRAM_SIZE + 1)):
+            bucket = _bucket('g:' + padded[start:start + NGRAM_SIZE])
+            features[bucket] = features.get(bucket, 0.0) + weight * NGRAM_WEIGHT
+    return features
+
+
+def row_features(row: Dict, fields: Dict[str, float] = VECTOR_FIELDS) -> Dict[int, float]:
+    features: Dict[int, float] = {}
+    for field, weight in fields.items():
+        text_features(row.get(field), weight, into=features)
+    return features
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _weigh(features: Dict[int, float], idf: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sublinear TF times IDF, as (bucket ids, weights)."""
+    ids = np.fromiter(features.keys(), dtype=np.int64, count=len(features))
+    tf = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+    return ids, (1.0 + np.log(tf, where=tf > 0, out=np.zeros_like(tf))) * idf[ids]
+
+
+class _SparseRows:
+    """Unit-normalized TF-IDF rows as CSR arrays, multiplied a block of rows at a time.
+
+    A dense rows x HASH_FEATURES matrix would cost 32 KB per row; the CSR
+    arrays cost about 8 bytes per nonzero feature, and products densify
+    only BLOCK_ROWS rows at once.
+    """
+
+    BLOCK_ROWS = 256
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, idf: np.ndarray):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.idf = idf
+        self.shape = (len(indptr) - 1, HASH_FEATURES)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Dict]) -> '_SparseRows':
+        # Row features are appended as they are computed, never held as dicts
+        indptr = array('q', [0])
+        indices = array('i')
+        counts = array('f')
+        for row in rows:
+            features = row_features(row)
+            indices.extend(features.keys())
+            counts.extend(features.values())
+            indptr.append(len(indices))
+        indptr = np.frombuffer(indptr, dtype=np.int64)
+        indices = np.frombuffer(indices, dtype=np.int32)
+        tf = np.frombuffer(counts, dtype=np.float32)
+
+        n = len(indptr) - 1
+        df = np.bincount(indices, minlength=HASH_FEATURES).astype(np.float64)
+        idf = (np.log((1.0 + n) / (1.0 + df)) + 1.0).astype(np.float32)
+        data = (1.0 + np.log(tf, where=tf > 0, out=np.zeros_like(tf))) * idf[indices]
+        lengths = np.diff(indptr)
+        norms = np.zeros(n, dtype=np.float32)
+        if len(data):
+            nonempty = lengths > 0
+            norms[nonempty] = np.sqrt(np.add.reduceat(np.square(data), indptr[:-1][nonempty]))
+        data /= np.repeat(np.maximum(norms, 1e-12), lengths)
+        return cls(indptr, indices, data, idf)
+
+    def _blocks(self):
+        """Yield (start, stop, dense rows) blocks."""
+        n = self.shape[0]
+        for start in range(0, n, self.BLOCK_ROWS):
+            stop = min(n, start + self.BLOCK_ROWS)
+            lo, hi = self.indptr[start], self.indptr[stop]
+            block = np.zeros((stop - start, HASH_FEATURES), dtype=np.float32)
+            block[np.repeat(np.arange(stop - start), np.diff(self.indptr[start:stop + 1])), self.indices[lo:hi]] = self.data[lo:hi]
+            yield start, stop, block
+
+    def __matmul__(self, other: np.ndarray) -> np.ndarray:
+        """rows @ other, for a features x k matrix."""
+        result = np.empty((self.shape[0], other.shape[1]), dtype=np.result_type(np.float32, other.dtype))
+        for start, stop, block in self._blocks():
+            result[start:stop] = block @ other
+        return result
+
+    def rmatmul(self, other: np.ndarray) -> np.ndarray:
+        """rows.T @ other, for a rows x k matrix."""
+        result = np.zeros((self.shape[1], other.shape[1]), dtype=np.result_type(np.float32, other.dtype))
+        for start, stop, block in self._blocks():
+            result += block.T @ other[start:stop]
+        return result
+
+
+class VectorIndex:
+    """Unit-normalized row vectors plus the projection that embeds queries."""
+
+    def __init__(self, matrix: np.ndarray, projection: np.ndarray, idf: np.ndarray):
+        self.matrix = matrix
+        self.projection = projection
+        self.idf = idf
+
+    @property
+    def dimensions(self) -> int:
+        return int(self.matrix.shape[1]) if self.matrix.ndim == 2 else 0
+
+    @classmethod
+    def build(cls, rows: Sequence[Dict], dimensions: int = DEFAULT_DIMENSIONS, seed: int = 0) -> 'VectorIndex':
+        """Compute TF-IDF features for every row and reduce them with a randomized SVD."""
+        tfidf = _SparseRows.from_rows(rows)
+        n = tfidf.shape[0]
+        rank = max(1, min(dimensions, n - 1 if n > 1 else 1, HASH_FEATURES))
+        projection = cls._principal_directions(tfidf, rank, seed)
+        matrix = _normalize(tfidf @ projection).astype(np.float32)
+        return cls(np.ascontiguousarray(matrix), np.ascontiguousarray(projection.astype(np.float32)), tfidf.idf)
+
+    @staticmethod
+    def _principal_directions(tfidf: '_SparseRows', rank: int, seed: int, oversample: int = 10, power_iterations: int = 2) -> np.ndarray:
+        """Top right singular vectors (features x rank) by randomized range finding."""
+        rng = np.random.default_rng(seed)
+        sketch = tfidf @ rng.standard_normal((tfidf.shape[1], rank + oversample)).astype(np.float32)
+        basis, _ = np.linalg.qr(sketch)
+        for _ in range(power_iterations):
+            basis, _ = np.linalg.qr(tfidf @ tfidf.rmatmul(basis))
+        _, _, vt = np.linalg.svd(tfidf.rmatmul(basis).T, full_matrices=False)
+        return vt[:rank].T
+
+    def embed(self, text: str) -> Optional[np.ndarray]:
+        """Project a query into the row space; None when it has no usable features."""
+        features = text_features(text)
+        if not features:
+            return None
+        ids, weights = _weigh(features, self.idf)
+        vector = weights @ self.projection[ids]
+        norm = float(np.linalg.norm(vector))
+        if norm < 1e-9 or math.isnan(norm):
+            return None
+        return vector / norm
+
+    def scores(self, text: str) -> Optional[np.ndarray]:
+        """Cosine similarity of every row to the query, in one matrix-vector product."""
+        vector = self.embed(text)
+        return None if vector is None else self.matrix @ vector
+
+    def scores_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Score several queries with one matrix product; None for queries with no features."""
+        vectors = [self.embed(text) for text in texts]
+        present = [i for i, vector in enumerate(vectors) if vector is not None]
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        if present:
+            block = self.matrix @ np.stack([vectors[i] for i in present], axis=1)
+            for column, i in enumerate(present):
+                results[i] = block[:, column]
+        return results
+
+    def search(self, text: str, top_k: int = 20, mask: Optional[np.ndarray] = None,
+               min_score: float = 0.0, scores: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Return up to top_k (row, score) pairs, best first, among rows allowed by `mask`.
+
+        `scores` may carry this query's precomputed column from `scores_many`.
+        """
+        if scores is None:
+            scores = self.scores(text)
+        if scores is None:
+            return []
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > min_score]
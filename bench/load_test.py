@@ -0,0 +1,357 @@
+"""Concurrent load test for the chat endpoints.
+
+Drives /chat, /chat/stream or /api/newsletters with a fixed concurrency and
+reports latency percentiles, throughput, time to first token and the
+per-stage timings the backends expose (the Server-Timing header on /chat,
+the done event's "timings" on /chat/stream). Results are written as JSON
+under bench/results/ so runs can be compared.
+
+Against a running server:
+
+    python bench/load_test.py --target http://127.0.0.1:3001 --endpoint chat --concurrency 20 --requests 400
+
+Self-contained, with the stub LLM and a backend started for the run:
+
+    python bench/load_test.py --backend fastapi --endpoint stream --stub-latency 0.4
+    python bench/load_test.py --backend serverless --endpoint chat --compare bench/results/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+MESSAGES = [
+    "What are the best finance newsletters?",
+    "Show me crypto newsletters under $1,000",
+    "Which marketing newsletters have over 100k subscribers?",
+    "I want to reach developers, what do you recommend?",
+    "Cheapest newsletters for parents",
+    "Tell me about Morning Brew",
+    "AI newsletters sorted by price",
+    "Newsletters for small business owners with a low CPC",
+    "What travel newsletters do you have?",
+    "Health and wellness newsletters over 50k subs",
+    "Compare The Hustle and Morning Brew",
+    "Which newsletters reach startup founders?",
+]
+
+# Messages the local linker cannot place in a category, so the classify
+# pipeline spends a model call on each (compare PIPELINE_MODE settings)
+UNLINKED_MESSAGES = [
+    "Who can I sponsor to reach new homeowners?",
+    "Looking for an audience of nurses and caregivers",
+    "I sell ergonomic office chairs, where should I advertise?",
+    "Where do retirees read about golf?",
+    "Newsletters read by truck drivers and logistics managers",
+    "I run a luxury watch brand",
+]
+
+MESSAGE_SETS = {'default': MESSAGES, 'unlinked': UNLINKED_MESSAGES}
+
+QUERIES = [
+    {"category": "finance", "sort": "-subscribers", "limit": "20"},
+    {"q": "crypto traders", "max_price": "1000"},
+    {"min_subscribers": "100k", "sort": "price", "fields": "name,subscribers,price"},
+    {"category": "marketing", "max_cpc": "5"},
+    {"q": "developers", "limit": "10"},
+]
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """Nearest-rank p50/p95/p99 plus mean and max, rounded to 0.01."""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered) + 0.5)) - 1))]
+
+    return {
+        "p50": round(rank(50), 2),
+        "p95": round(rank(95), 2),
+        "p99": round(rank(99), 2),
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    timings = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if name and key == 'dur':
+                try:
+                    timings[name] = float(value)
+                except ValueError:
+                    pass
+    return timings
+
+
+class Result:
+    __slots__ = ('ok', 'status', 'latency', 'first_byte', 'stages')
+
+    def __init__(self, ok, status, latency, first_byte=None, stages=None):
+        self.ok = ok
+        self.status = status
+        self.latency = latency
+        self.first_byte = first_byte
+        self.stages = stages or {}
+
+
+def next_message(n: int, unique_ratio: float, messages: List[str] = MESSAGES) -> str:
+    message = messages[n % len(messages)]
+    # Bust the response cache for the requested share of traffic
+    if (n * 0.6180339887) % 1.0 < unique_ratio:
+        message = f"{message} (request {n})"
+    return message
+
+
+async def call_chat(client: httpx.AsyncClient, n: int, args) -> Result:
+    start = time.perf_counter()
+    response = await client.post('/chat', json={"message": next_message(n, args.unique_ratio, MESSAGE_SETS[args.messages])})
+    latency = (time.perf_counter() - start) * 1000.0
+    ok = response.status_code == 200 and not response.json().get('response', '').startswith('I apologize')
+    return Result(ok, response.status_code, latency, stages=parse_server_timing(response.headers.get('server-timing')))
+
+
+async def call_stream(client: httpx.AsyncClient, n: int, args) -> Result:
+    start = time.perf_counter()
+    first_byte = None
+    stages = {}
+    ok = False
+    async with client.stream('POST', '/chat/stream', json={"message": next_message(n, args.unique_ratio, MESSAGE_SETS[args.messages])}) as response:
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith('event:'):
+                event = line[len('event:'):].strip()
+            elif line.startswith('data:'):
+                payload = json.loads(line[len('data:'):])
+                if first_byte is None and payload.get('delta'):
+                    first_byte = (time.perf_counter() - start) * 1000.0
+                if event == 'done':
+                    stages = payload.get('timings') or {}
+                    ok = not payload.get('response', '').startswith('I apologize')
+                elif event == 'error':
+                    ok = False
+            elif not line:
+                event = None
+        status = response.status_code
+    return Result(ok and status == 200, status, (time.perf_counter() - start) * 1000.0, first_byte, stages)
+
+
+async def call_newsletters(client: httpx.AsyncClient, n: int, args) -> Result:
+    start = time.perf_counter()
+    response = await client.get('/api/newsletters', params=QUERIES[n % len(QUERIES)])
+    return Result(response.status_code == 200, response.status_code, (time.perf_counter() - start) * 1000.0)
+
+
+CALLS = {'chat': call_chat, 'stream': call_stream, 'newsletters': call_newsletters}
+
+
+async def run_load(args) -> Dict:
+    call = CALLS[args.endpoint]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results: List[Result] = []
+    counter = iter(range(10 ** 9))
+    deadline = time.perf_counter() + args.duration if args.duration else None
+
+    async with httpx.AsyncClient(base_url=args.target, timeout=args.timeout, limits=limits) as client:
+        for n in range(args.warmup):
+            await call(client, 10 ** 6 + n, args)
+
+        async def worker():
+            while True:
+                n = next(counter)
+                if deadline is None and n >= args.requests:
+                    return
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                try:
+                    results.append(await call(client, n, args))
+                except Exception:
+                    results.append(Result(False, 0, float(args.timeout) * 1000.0))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    stage_names = sorted({name for result in results for name in result.stages})
+    status_codes: Dict[str, int] = {}
+    for result in results:
+        status_codes[str(result.status)] = status_codes.get(str(result.status), 0) + 1
+    errors = sum(1 for result in results if not result.ok)
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": round(errors / len(results), 4) if results else 0.0,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": percentiles([r.latency for r in results]),
+        "first_token_ms": percentiles([r.first_byte for r in results if r.first_byte is not None]),
+        "stages_ms": {name: percentiles([r.stages[name] for r in results if name in r.stages]) for name in stage_names},
+        "status_codes": status_codes,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url: str, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def start_services(args) -> List[subprocess.Popen]:
+    """Start the stub LLM and the chosen backend; returns the processes to stop."""
+    stub_port, app_port = free_port(), free_port()
+    processes = [subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, 'stub_openai.py'), '--port', str(stub_port),
+        '--latency', str(args.stub_latency), '--jitter', str(args.stub_jitter),
+        '--tokens-per-second', str(args.stub_tps), '--error-rate', str(args.stub_error_rate),
+        '--rate-limit-rate', str(args.stub_rate_limit_rate), '--tool-call-rate', str(args.stub_tool_call_rate),
+    ])]
+    wait_for(f"http://127.0.0.1:{stub_port}/v1/models")
+
+    env = dict(os.environ)
+    env['OPENAI_BASE_URL'] = f"http://127.0.0.1:{stub_port}/v1"
+    env.setdefault('OPENAI_API_KEY', 'sk-bench-stub-key')
+    # Keep the local quota out of the way unless the run is about the limiter
+    env.setdefault('RATE_LIMIT_TOKENS_PER_MINUTE', '100000000')
+    if args.backend == 'fastapi':
+        command = [sys.executable, '-m', 'uvicorn', 'main:app', '--app-dir', 'backend',
+                   '--port', str(app_port), '--log-level', 'warning']
+    else:
+        command = [sys.executable, os.path.join(BENCH_DIR, 'serve_serverless.py'), '--port', str(app_port)]
+    output = None if args.verbose else subprocess.DEVNULL
+    processes.append(subprocess.Popen(command, cwd=ROOT_DIR, env=env, stdout=output, stderr=output))
+    args.target = f"http://127.0.0.1:{app_port}"
+    wait_for(f"{args.target}/api/health")
+    return processes
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+COMPARED = [('latency_ms', 'p50'), ('latency_ms', 'p95'), ('latency_ms', 'p99'), ('first_token_ms', 'p50'),
+            ('throughput_rps', None), ('error_rate', None)]
+
+
+def compare(report: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Print current vs baseline; return the metrics that regressed beyond `threshold` percent."""
+    regressions = []
+    print(f"\n{'metric':<22}{'baseline':>12}{'current':>12}{'change':>10}")
+    rows = list(COMPARED) + [(f"stages_ms.{name}", 'p50') for name in report['summary']['stages_ms']]
+    for metric, stat in rows:
+        def pick(summary):
+            value = summary
+            for part in metric.split('.'):
+                value = (value or {}).get(part)
+            return value.get(stat) if stat and isinstance(value, dict) else value
+        old, new = pick(baseline['summary']), pick(report['summary'])
+        if old is None or new is None:
+            continue
+        change = ((new - old) / old * 100.0) if old else 0.0
+        name = f"{metric}.{stat}" if stat else metric
+        print(f"{name:<22}{old:>12}{new:>12}{change:>9.1f}%")
+        if metric == 'error_rate':
+            regressed = new > old + 0.01
+        elif metric == 'throughput_rps':
+            regressed = change < -threshold
+        else:
+            regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chat endpoints")
+    parser.add_argument('--target', help="base URL of a running server")
+    parser.add_argument('--backend', choices=['fastapi', 'serverless'], help="start this backend against the stub LLM")
+    parser.add_argument('--endpoint', choices=sorted(CALLS), default='chat')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--duration', type=float, help="run for this many seconds instead of a request count")
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--unique-ratio', type=float, default=1.0, help="share of messages that miss the response cache")
+    parser.add_argument('--stub-latency', type=float, default=0.3)
+    parser.add_argument('--stub-jitter', type=float, default=0.05)
+    parser.add_argument('--stub-tps', type=float, default=200.0)
+    parser.add_argument('--stub-error-rate', type=float, default=0.0)
+    parser.add_argument('--stub-rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--stub-tool-call-rate', type=float, default=0.0)
+    parser.add_argument('--messages', choices=sorted(MESSAGE_SETS), default='default',
+                        help="unlinked: messages that miss the local category linker")
+    parser.add_argument('--verbose', action='store_true', help="show the started backend's logs")
+    parser.add_argument('--label', default=None)
+    parser.add_argument('--output', default=os.path.join(BENCH_DIR, 'results'))
+    parser.add_argument('--compare', help="baseline results JSON to compare against")
+    parser.add_argument('--regression-threshold', type=float, default=10.0, help="percent change that fails --compare")
+    args = parser.parse_args()
+    if not args.target and not args.backend:
+        parser.error("pass --target for a running server or --backend to start one")
+
+    processes = start_services(args) if args.backend else []
+    try:
+        summary = asyncio.run(run_load(args))
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait(timeout=10)
+
+    config = {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+    label = args.label or f"{args.backend or 'target'}-{args.endpoint}-c{args.concurrency}"
+    report = {
+        "label": label,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "git_commit": git_commit(),
+        "config": config,
+        "summary": summary,
+    }
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{label}.json")
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(json.dumps(summary, indent=2))
+    print(f"\nSaved {path}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(report, json.load(file), args.regression_threshold)
+        if regressions:
+            print(f"\nRegressed beyond {args.regression_threshold:.0f}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
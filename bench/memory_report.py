@@ -0,0 +1,121 @@
+"""Resident memory of the catalog, per 1,000 rows.
+
+Each representation is loaded in a fresh interpreter, and the growth in
+resident set size (RSS) is measured after a few searches have touched it:
+
+    dict_rows          csv.DictReader rows, every column (the original layout)
+    record_store       the same rows as a RecordStore: projected, encoded columns
+    catalog_csv        Catalog parsed from the CSV, as a hot reload builds it
+    catalog_snapshot   Catalog memory-mapped from the prebuilt snapshot
+
+Freed heap is handed back to the OS before measuring, so the numbers are
+what each representation keeps, not its build-time peak.
+
+Larger catalogs are synthesized by repeating the real rows with unique IDs,
+names and audience text, so the numbers show how memory scales:
+
+    python bench/memory_report.py --rows 777,10000,50000
+"""
+
+import argparse
+import csv
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+BACKEND_DIR = os.path.join(ROOT_DIR, 'backend')
+SOURCE_CSV = os.path.join(BACKEND_DIR, 'data', 'context.csv')
+
+VARIANTS = ('dict_rows', 'record_store', 'catalog_csv', 'catalog_snapshot')
+QUERIES = ["finance newsletters over 100k subscribers", "parents of toddlers", "cheap crypto newsletters",
+           "Morning Brew", "developers", "travel lovers under $1,000"]
+
+
+def rss_bytes() -> int:
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def synthesize(rows: List[Dict], count: int, path: str):
+    """Write `count` rows cycling through `rows`, each copy made unique."""
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        for i in range(count):
+            row = dict(rows[i % len(rows)])
+            copy = i // len(rows)
+            if copy:
+                row['ID'] = f"{row.get('ID', '')}-{copy}"
+                row['Newsletter Name'] = f"{row.get('Newsletter Name', '')} {copy}"
+                row['Audience Info'] = f"{row.get('Audience Info', '')} Edition {copy}."
+            writer.writerow(row)
+
+
+def measure(variant: str, csv_path: str) -> Dict:
+    """Run in the child process: load one representation and report its RSS growth."""
+    sys.path.insert(0, BACKEND_DIR)
+    # Imported before the baseline so library imports are not counted
+    from catalog import Catalog, read_csv_rows, source_digest, trim_heap
+    from records import RecordStore
+    from snapshot import build_snapshot, load_catalog
+
+    if variant == 'catalog_snapshot':
+        build_snapshot(csv_path)
+    gc.collect()
+    trim_heap()
+    before = rss_bytes()
+    if variant == 'dict_rows':
+        held = read_csv_rows(csv_path)
+        rows = len(held)
+    elif variant == 'record_store':
+        held = RecordStore.from_rows(read_csv_rows(csv_path))
+        rows = len(held)
+    else:
+        if variant == 'catalog_csv':
+            held = Catalog(read_csv_rows(csv_path), version=source_digest(csv_path))
+        else:
+            held = load_catalog(csv_path)
+        for query in QUERIES:
+            held.records(held.search(query, limit=40, mode='hybrid'))
+        rows = len(held)
+    gc.collect()
+    trim_heap()
+    grown = rss_bytes() - before
+    return {"variant": variant, "rows": rows, "rss_mb": round(grown / 2**20, 2),
+            "mb_per_1k_rows": round(grown / 2**20 / rows * 1000, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', default='777,10000', help="comma-separated catalog sizes")
+    parser.add_argument('--variants', default=','.join(VARIANTS))
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    parser.add_argument('--csv', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.csv)))
+        return
+
+    with open(SOURCE_CSV, encoding='utf-8', newline='') as file:
+        source_rows = list(csv.DictReader(file))
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'variant':<18} {'rows':>7} {'RSS MB':>8} {'MB/1k rows':>11}")
+        for count in [int(n) for n in args.rows.split(',')]:
+            path = os.path.join(tmp, f'context-{count}.csv')
+            synthesize(source_rows, count, path)
+            for variant in args.variants.split(','):
+                output = subprocess.run([sys.executable, __file__, '--measure', variant, '--csv', path],
+                                        capture_output=True, text=True, check=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{variant:<18} {result['rows']:>7} {result['rss_mb']:>8} {result['mb_per_1k_rows']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""Serve the Vercel handler in api/index.py locally for load tests.
+
+    python bench/serve_serverless.py --port 3002
+"""
+
+import argparse
+import os
+import sys
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve api/index.py with a threading HTTP server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3002)
+    args = parser.parse_args()
+
+    import index
+    server = ThreadingHTTPServer((args.host, args.port), index.handler)
+    server.daemon_threads = True
+    print(f"Serverless handler on http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
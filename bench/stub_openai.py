@@ -0,0 +1,191 @@
+"""OpenAI-compatible stub server for load tests.
+
+Serves GET /v1/models and POST /v1/chat/completions (plain and streamed,
+including `stream_options.include_usage`) with configurable latency, token
+rate and injected failures, so the chat path can be measured without
+spending tokens or depending on the real API. Requests that offer `tools`
+are answered with a call to the first tool at `--tool-call-rate`.
+
+    python bench/stub_openai.py --port 9911 --latency 0.4 --tokens-per-second 80 --error-rate 0.02
+
+Point a backend at it with OPENAI_BASE_URL=http://127.0.0.1:9911/v1.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = (
+    "Here are a few newsletters that fit:\n\n"
+    "1. **Morning Brew** - 4M subscribers, business news, from $30,000 per send\n"
+    "2. **The Hustle** - 2M subscribers, tech and business, from $15,000 per send\n"
+    "3. **Finimize** - 1M subscribers, personal finance, from $8,000 per send\n\n"
+    "Keep in mind these subscriber numbers and starting prices are approximate."
+)
+
+
+class StubConfig:
+    def __init__(self, latency=0.3, jitter=0.1, tokens_per_second=100.0, completion_tokens=60,
+                 error_rate=0.0, rate_limit_rate=0.0, tool_call_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.tool_call_rate = tool_call_rate
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+
+
+def _words(max_tokens: int, budget: int):
+    words = ANSWER.split(' ')
+    count = max(1, min(budget, max_tokens or budget, len(words)))
+    return [word + (' ' if i < count - 1 else '') for i, word in enumerate(words[:count])]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config: StubConfig = None
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._json(200, {"object": "list", "data": [
+                {"id": "gpt-3.5-turbo", "object": "model", "created": 0, "owned_by": "stub"}]})
+        elif self.path.rstrip('/').endswith('/stats'):
+            config = self.config
+            self._json(200, {"requests": config.requests, "errors": config.errors, "prompt_tokens": config.prompt_tokens})
+        else:
+            self._json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._json(404, {"error": {"message": "Not found"}})
+            return
+
+        config = self.config
+        prompt = ''.join(str(m.get('content', '')) for m in body.get('messages', []))
+        prompt_tokens = len(prompt) // 4
+        with config.lock:
+            config.requests += 1
+            config.prompt_tokens += prompt_tokens
+
+        time.sleep(max(0.0, random.gauss(config.latency, config.jitter)))
+        roll = random.random()
+        if roll < config.rate_limit_rate:
+            with config.lock:
+                config.errors += 1
+            self._json(429, {"error": {"message": "Rate limit reached (stub)", "type": "rate_limit_error",
+                                       "code": "rate_limit_exceeded"}})
+            return
+        if roll < config.rate_limit_rate + config.error_rate:
+            with config.lock:
+                config.errors += 1
+            self._json(500, {"error": {"message": "Injected failure (stub)", "type": "server_error"}})
+            return
+
+        words = _words(body.get('max_tokens'), config.completion_tokens)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                 "total_tokens": prompt_tokens + len(words)}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get('model', 'gpt-3.5-turbo')
+
+        tools = body.get('tools') or []
+        answered = any(m.get('role') == 'tool' for m in body.get('messages', []))
+        if tools and not answered and not body.get('stream') and random.random() < config.tool_call_rate:
+            # Ask for a catalog search with the user's words as the query
+            question = next((str(m.get('content', '')) for m in reversed(body['messages']) if m.get('role') == 'user'), '')
+            call = {"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                    "function": {"name": tools[0]['function']['name'],
+                                 "arguments": json.dumps({"query": question.split('\n')[0][-80:]})}}
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": 20, "total_tokens": prompt_tokens + 20}
+            self._json(200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": None, "tool_calls": [call]},
+                             "finish_reason": "tool_calls"}],
+                "usage": usage,
+            })
+            return
+
+        if not body.get('stream'):
+            time.sleep(len(words) / config.tokens_per_second)
+            self._json(200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": ''.join(words)},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.close_connection = True
+        for i, word in enumerate(words):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                     "choices": [{"index": 0, "delta": {"content": word},
+                                  "finish_reason": "stop" if i == len(words) - 1 else None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(1.0 / config.tokens_per_second)
+        if (body.get('stream_options') or {}).get('include_usage'):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                     "choices": [], "usage": usage}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def make_server(port: int, config: StubConfig, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    handler = type('ConfiguredStubHandler', (StubHandler,), {'config': config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9911)
+    parser.add_argument('--latency', type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument('--jitter', type=float, default=0.1, help="standard deviation of the latency")
+    parser.add_argument('--tokens-per-second', type=float, default=100.0)
+    parser.add_argument('--completion-tokens', type=int, default=60)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="fraction answered with 429")
+    parser.add_argument('--tool-call-rate', type=float, default=0.0,
+                        help="fraction of requests offering tools that get a tool call back")
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency, args.jitter, args.tokens_per_second, args.completion_tokens,
+                        args.error_rate, args.rate_limit_rate, args.tool_call_rate)
+    server = make_server(args.port, config, args.host)
+    print(f"Stub OpenAI server on http://{args.host}:{args.port}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
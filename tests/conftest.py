@@ -0,0 +1,153 @@
+"""Shared fixtures: a small in-memory catalog, the same rows as a CSV file,
+and the FastAPI app with a scripted stand-in for the OpenAI client.
+
+The backend modules import each other by bare name (the servers run from
+backend/ or put it on sys.path), so the tests do the same.
+"""
+
+import csv
+import importlib
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from catalog import Catalog  # noqa: E402
+
+FIELDNAMES = ['ID', 'Newsletter Name', 'Category', 'Subscribers', 'One Send Price', 'CPC Avg',
+              'Click Estimate', 'Open rates', 'CTR', 'Website', 'Audience Info']
+
+ROWS = [
+    {'ID': 'n1', 'Newsletter Name': 'Morning Brew', 'Category': 'Business', 'Subscribers': '4M',
+     'One Send Price': '$25,000', 'CPC Avg': '$4.10 - $6.20', 'Click Estimate': '4,000 - 6,000',
+     'Website': 'morningbrew.com', 'Audience Info': 'Young professionals who follow business news daily.'},
+    {'ID': 'n2', 'Newsletter Name': 'Wealth Weekly', 'Category': 'Finance & Investing', 'Subscribers': '250k',
+     'One Send Price': '$2,000', 'CPC Avg': '$2.78 - $5.95', 'Click Estimate': '500 - 900',
+     'Website': 'wealthweekly.com', 'Audience Info': 'Retail investors tracking stocks and retirement savings.'},
+    {'ID': 'n3', 'Newsletter Name': 'Budget Traveler', 'Category': 'Travel', 'Subscribers': '80k',
+     'One Send Price': '$450', 'CPC Avg': '$1.10 - $1.90', 'Click Estimate': '168 - 360',
+     'Website': 'budgettraveler.com', 'Audience Info': 'Backpackers hunting cheap flights and hostels.'},
+    {'ID': 'n4', 'Newsletter Name': 'Jet Set Journal', 'Category': 'Travel', 'Subscribers': '1.2M',
+     'One Send Price': 'Upon Request', 'CPC Avg': '', 'Click Estimate': '',
+     'Website': 'jetsetjournal.com', 'Audience Info': 'Luxury travelers booking resorts and first class flights.'},
+    {'ID': 'n5', 'Newsletter Name': 'Stack Overflowing', 'Category': 'DEV/IT', 'Subscribers': '300k',
+     'One Send Price': '$2,000', 'CPC Avg': '$3.00 - $4.00', 'Click Estimate': '900 - 1,200',
+     'Website': 'stackoverflowing.dev', 'Audience Info': 'Software developers and devops engineers.'},
+    {'ID': 'n6', 'Newsletter Name': 'Coin Desk Daily', 'Category': 'Crypto', 'Subscribers': '120k',
+     'One Send Price': '$1,500', 'CPC Avg': '$2.00 - $3.50', 'Click Estimate': '300 - 500',
+     'Website': 'coindeskdaily.com', 'Audience Info': 'Bitcoin and ethereum traders following the markets.'},
+]
+
+
+def write_csv(path, rows=ROWS):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({name: row.get(name, '') for name in FIELDNAMES})
+    return str(path)
+
+
+@pytest.fixture
+def catalog():
+    return Catalog([dict(row) for row in ROWS], version='test-version')
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    return write_csv(tmp_path / 'context.csv')
+
+
+@pytest.fixture(scope='session')
+def main_module():
+    """The FastAPI app module, imported once with the bundled catalog and no network access.
+
+    Startup events do not run, so no background validation or catalog polling starts.
+    """
+    os.environ.update({
+        'OPENAI_API_KEY': 'sk-test',
+        'CATALOG_POLL_SECONDS': '0',
+        'RATE_LIMIT_TOKENS_PER_MINUTE': '10000000',
+    })
+    os.environ.pop('SHARED_STATE_URL', None)
+    return importlib.import_module('main')
+
+
+@pytest.fixture
+def client(main_module):
+    from fastapi.testclient import TestClient
+    return TestClient(main_module.app)
+
+
+def usage(prompt_tokens: int = 50, completion_tokens: int = 10):
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                           total_tokens=prompt_tokens + completion_tokens)
+
+
+def completion(text, tool_calls=None, prompt_tokens: int = 50, completion_tokens: int = 10):
+    """A chat completion shaped like the SDK's response object."""
+    message = SimpleNamespace(content=text, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)],
+                           usage=usage(prompt_tokens, completion_tokens))
+
+
+async def stream_chunks(deltas, error=None, prompt_tokens: int = 50):
+    """A streamed completion: one chunk per delta, then the usage chunk (or `error`)."""
+    for delta in deltas:
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))], usage=None)
+    if error is not None:
+        raise error
+    yield SimpleNamespace(choices=[], usage=usage(prompt_tokens, len(deltas)))
+
+
+def parse_events(body: str):
+    """Split an SSE body into (event, data) pairs."""
+    events = []
+    for block in body.strip().split('\n\n'):
+        event, data = 'message', None
+        for line in block.split('\n'):
+            if line.startswith('event: '):
+                event = line[len('event: '):]
+            elif line.startswith('data: '):
+                data = json.loads(line[len('data: '):])
+        events.append((event, data))
+    return events
+
+
+class FakeOpenAI:
+    """Records chat.completions.create calls and answers them with `respond(**kwargs)`."""
+
+    def __init__(self):
+        self.calls = []
+        self.respond = lambda **kwargs: completion('An answer.')
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        reply = self.respond(**kwargs)
+        if isinstance(reply, BaseException):
+            raise reply
+        if hasattr(reply, '__await__'):
+            reply = await reply
+        return reply
+
+
+@pytest.fixture
+def fake_openai(main_module, monkeypatch):
+    """Point the app at a FakeOpenAI, with an empty cache and a fresh rate limit budget."""
+    from deadline import LatencyWindow
+    from rate_limiter import AsyncTokenBucket
+
+    fake = FakeOpenAI()
+    monkeypatch.setattr(main_module, 'get_client', lambda: fake)
+    monkeypatch.setattr(main_module, 'token_bucket', AsyncTokenBucket(capacity=100000, refill_per_second=0.001))
+    monkeypatch.setattr(main_module, 'llm_latency', LatencyWindow())
+    main_module.response_cache.clear()
+    main_module.category_memo.clear()
+    return fake
@@ -0,0 +1,92 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from response_cache import cache_key
+from tests.conftest import completion, parse_events
+
+SLOW = 'Which newsletter suits a vegan snack brand?'
+FAST = 'Which newsletter suits a home fitness app?'
+
+
+@pytest.fixture(autouse=True)
+def batch_app(main_module, monkeypatch):
+    monkeypatch.setattr(main_module, 'PIPELINE_MODE', 'retrieve')
+    # The module's semaphore binds to the first event loop it waits on
+    monkeypatch.setattr(main_module, 'batch_slots', asyncio.Semaphore(2))
+
+
+def answer_by_message(delays, failures=()):
+    """Answer each question after its delay, echoing it back; fail the listed ones."""
+    async def reply(messages):
+        question = next(m for m in delays if m in messages[-1]['content'])
+        await asyncio.sleep(delays[question])
+        if question in failures:
+            raise RuntimeError('upstream down')
+        return completion(f'Answer to: {question}')
+    return lambda **kwargs: reply(kwargs['messages'])
+
+
+def test_batch_validation(client, main_module):
+    assert client.post('/chat/batch', json={'questions': []}).status_code == 400
+    too_many = [{'message': 'hi'}] * (main_module.BATCH_MAX_QUESTIONS + 1)
+    assert client.post('/chat/batch', json={'questions': too_many}).status_code == 400
+
+
+def test_batch_streams_answers_as_they_finish(main_module, client, fake_openai):
+    catalog = main_module.catalog_manager.current
+    cached_question = 'Which newsletter suits a travel insurance brand?'
+    main_module.response_cache.set(cache_key(cached_question, 'Travel', [], catalog.version), 'From the cache.')
+    fake_openai.respond = answer_by_message({SLOW: 0.2, FAST: 0.0})
+
+    questions = [{'message': SLOW}, {'message': cached_question, 'category': 'travel'},
+                 {'message': FAST}, {'message': 'List travel newsletters'}]
+    events = parse_events(client.post('/chat/batch', json={'questions': questions}).text)
+    results = [data for event, data in events if event == 'result']
+
+    assert [r['index'] for r in results] == [3, 1, 2, 0]
+    assert results[0]['routed'] and results[1]['cached'] and results[1]['response'] == 'From the cache.'
+    assert results[2]['response'] == f'Answer to: {FAST}' and results[3]['response'] == f'Answer to: {SLOW}'
+    assert results[1]['category'] == 'Travel'
+    event, done = events[-1]
+    assert event == 'done'
+    assert {k: done[k] for k in ('questions', 'ok', 'cached', 'routed', 'error')} == {
+        'questions': 4, 'ok': 2, 'cached': 1, 'routed': 1, 'error': 0}
+
+
+def test_failed_question_does_not_sink_the_batch(client, fake_openai):
+    fake_openai.respond = answer_by_message({SLOW: 0.0, FAST: 0.0}, failures=(SLOW,))
+    events = parse_events(client.post('/chat/batch', json={'questions': [{'message': SLOW}, {'message': FAST}]}).text)
+    results = {data['index']: data for event, data in events if event == 'result'}
+    assert not results[0]['ok'] and results[0]['response'].startswith('I apologize')
+    assert results[1]['ok']
+    assert (events[-1][1]['ok'], events[-1][1]['error']) == (1, 1)
+
+
+def test_disconnect_cancels_unanswered_questions(main_module, fake_openai):
+    cancelled = []
+
+    async def reply(messages):
+        if FAST in messages[-1]['content']:
+            return completion('quick')
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+    fake_openai.respond = lambda **kwargs: reply(kwargs['messages'])
+
+    async def run():
+        request = main_module.BatchRequest(questions=[{'message': SLOW}, {'message': FAST}])
+        response = await main_module.chat_batch(request, SimpleNamespace(state=SimpleNamespace(request_id='t')))
+        events = response.body_iterator
+        first = await asyncio.wait_for(events.__anext__(), 2.0)
+        # The client goes away after the first answer
+        await events.aclose()
+        await asyncio.sleep(0.01)
+        return first
+
+    first = asyncio.run(run())
+    assert '"index": 1' in first
+    assert cancelled == [1]
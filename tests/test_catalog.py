@@ -0,0 +1,94 @@
+import math
+
+import pytest
+
+from catalog import CatalogFilter, extract_filters, parse_bound, parse_count, parse_filter_spec, parse_range
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('110k', 110e3),
+    ('1.2M', 1.2e6),
+    ('$1,000', 1000.0),
+    ('$2.78 - $5.95', 2.78),
+    (42, 42.0),
+])
+def test_parse_count(value, expected):
+    assert parse_count(value) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('value', ['Upon Request', '', None, float('nan')])
+def test_parse_count_missing(value):
+    assert math.isnan(parse_count(value))
+
+
+def test_parse_range():
+    assert parse_range('$2.78 - $5.95') == (2.78, 5.95)
+    assert parse_range('168 - 360') == (168.0, 360.0)
+    assert parse_range('500') == (500.0, 500.0)
+    assert all(math.isnan(v) for v in parse_range('n/a'))
+
+
+@pytest.mark.parametrize('value, expected', [('50k', 50e3), ('$2,000', 2000.0), (' 1.5M ', 1.5e6), (7, 7.0)])
+def test_parse_bound(value, expected):
+    assert parse_bound(value) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('value', ['abc', '1e400', '50k or more', '10 - 20', '', True, float('inf'), float('nan')])
+def test_parse_bound_rejects(value):
+    assert math.isnan(parse_bound(value))
+
+
+def test_parse_filter_spec():
+    criteria = parse_filter_spec('category=Finance, subscribers>=50k, price<=2000, sort by cpc desc')
+    assert criteria.category == 'Finance'
+    assert criteria.min_subscribers == 50e3
+    assert criteria.max_price == 2000.0
+    assert (criteria.sort_by, criteria.descending) == ('cpc', True)
+
+
+def test_parse_filter_spec_equality_sets_both_bounds():
+    criteria = parse_filter_spec('price=2000')
+    assert criteria.min_price == criteria.max_price == 2000.0
+
+
+def test_strict_bounds_exclude_the_value(catalog):
+    assert len(catalog.filter(parse_filter_spec('price>=2000'))) == 3
+    assert len(catalog.filter(parse_filter_spec('price>2000'))) == 1
+    assert len(catalog.filter(parse_filter_spec('price<2000'))) == 2
+
+
+@pytest.mark.parametrize('spec', ['price<=abc', 'subscribers>1e400', 'color=blue', 'sort by name', 'price'])
+def test_parse_filter_spec_rejects(spec):
+    with pytest.raises(ValueError):
+        parse_filter_spec(spec)
+
+
+def test_extract_filters():
+    criteria, remaining = extract_filters('cheap travel newsletters with over 50k subscribers under $1,000')
+    assert criteria.min_subscribers == 50e3
+    assert criteria.max_price == 1000.0
+    assert criteria.sort_by == 'price' and not criteria.descending
+    assert remaining == 'travel newsletters with'
+
+
+def test_extract_filters_plain_message():
+    criteria, remaining = extract_filters('newsletters for my vegan snack brand')
+    assert not criteria.has_constraints()
+    assert remaining == 'newsletters for my vegan snack brand'
+
+
+def test_filter_drops_unknown_values_and_sorts_them_last(catalog):
+    # Jet Set Journal's price is "Upon Request"
+    assert 3 not in catalog.filter(CatalogFilter(max_price=1e9)).tolist()
+    order = catalog.filter(CatalogFilter(category='Travel', sort_by='price')).tolist()
+    assert order == [2, 3]
+
+
+def test_filter_resolves_loose_category_names(catalog):
+    assert catalog.filter(CatalogFilter(category='finance')).tolist() == [1]
+    assert catalog.filter(CatalogFilter(category='Gardening')).tolist() == []
+
+
+def test_catalog_search_applies_filters_and_text(catalog):
+    assert catalog.search('travel newsletters under $1,000') == [2]
+    assert catalog.search('bitcoin')[0] == 5
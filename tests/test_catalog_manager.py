@@ -0,0 +1,94 @@
+import os
+import time
+
+import pytest
+
+from catalog import Catalog, read_csv_rows
+from catalog_manager import CatalogManager, diff_index
+from response_cache import ResponseCache
+from search_index import SearchIndex
+from tests.conftest import ROWS, write_csv
+
+
+def edited_rows():
+    """n2's audience rewritten, n6 removed, n7 added."""
+    rows = [dict(row) for row in ROWS[:5]]
+    rows[1]['Audience Info'] = 'Dividend investors and gardening enthusiasts.'
+    rows.append({'ID': 'n7', 'Newsletter Name': 'Green Thumb', 'Category': 'Home & Garden', 'Subscribers': '60k',
+                 'One Send Price': '$300', 'Audience Info': 'Gardening fans growing vegetables at home.'})
+    return rows
+
+
+@pytest.fixture
+def manager(csv_path):
+    return CatalogManager(csv_path, poll_interval=0)
+
+
+def test_unchanged_file_is_not_rebuilt(manager, csv_path):
+    before = manager.current
+    write_csv(csv_path)
+    assert manager.reload() == {'reloaded': False, 'version': before.version}
+    assert manager.current is before and manager.reloads == 0
+
+
+def test_reload_swaps_in_the_edited_catalog(manager, csv_path):
+    before = manager.current
+    write_csv(csv_path, edited_rows())
+    result = manager.reload()
+    assert result['reloaded'] and result['rows'] == 6
+    assert result['diff'] == {'added': 1, 'changed': 1, 'unchanged': 4, 'removed': 1}
+    assert manager.current is not before and manager.current.version == result['version']
+    assert manager.current.search('gardening')[:2] == [1, 5]
+    # A request still holding the old catalog keeps a consistent view
+    assert len(before) == 6 and before.search('bitcoin')[0] == 5
+
+
+def test_diffed_index_matches_a_fresh_build(manager, csv_path):
+    write_csv(csv_path, edited_rows())
+    rows = read_csv_rows(csv_path)
+    index, _ = diff_index(rows, manager.current)
+    fresh = SearchIndex(rows, fields=index.fields)
+    for query in ('gardening', 'cheap flights', 'software developers', 'investors'):
+        assert index.search(query) == pytest.approx(fresh.search(query))
+
+
+def test_subscribers_see_each_swap(manager, csv_path):
+    cache = ResponseCache()
+    cache.sync_version(manager.current.version)
+    cache.set('answer', 'stale')
+    seen = []
+
+    def broken(catalog):
+        raise RuntimeError('listener failed')
+
+    manager.subscribe(broken)
+    manager.subscribe(lambda catalog: cache.sync_version(catalog.version))
+    manager.subscribe(seen.append)
+    write_csv(csv_path, edited_rows())
+    manager.reload()
+    assert seen == [manager.current]
+    assert cache.get('answer') is None
+
+
+def test_failed_reload_keeps_the_live_catalog(manager, csv_path):
+    before = manager.current
+    os.remove(csv_path)
+    result = manager.reload()
+    assert not result['reloaded'] and result['error']
+    assert manager.current is before
+    assert manager.status()['last_error'] == result['error']
+
+
+def test_poller_picks_up_a_changed_file(csv_path):
+    manager = CatalogManager(csv_path, catalog=Catalog(read_csv_rows(csv_path)), poll_interval=0.01)
+    manager.start()
+    try:
+        write_csv(csv_path, edited_rows())
+        os.utime(csv_path, (time.time() + 5, time.time() + 5))
+        deadline = time.monotonic() + 5.0
+        while manager.reloads == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert manager.reloads == 1 and len(manager.current) == 6
+        assert manager.status()['polling']
+    finally:
+        manager.stop()
@@ -0,0 +1,41 @@
+from context_packer import ContextBlocks, count_tokens, pack_context
+
+
+def test_pack_context_fits_the_budget(catalog):
+    rows = [catalog.rows[i] for i in range(len(catalog))]
+    full = pack_context(rows, budget=10000)
+    assert full.rows == full.candidates == len(rows)
+    assert full.text.splitlines()[0].startswith('Name | Category | Subscribers')
+    assert full.tokens == count_tokens(full.text)
+
+    tight = pack_context(rows, budget=full.tokens // 2)
+    assert 0 < tight.rows < len(rows)
+    assert tight.tokens <= full.tokens // 2
+    assert pack_context([], budget=100).text == ''
+
+
+def test_shared_category_is_stated_once(catalog):
+    travel = pack_context([catalog.rows[2], catalog.rows[3]], budget=10000)
+    lines = travel.text.splitlines()
+    assert lines[0] == 'Category: Travel'
+    assert 'Category' not in lines[1]
+    assert lines[2].startswith('Budget Traveler | ')
+
+
+def test_blocks_are_built_for_every_category(catalog):
+    blocks = catalog.context_blocks
+    assert set(blocks.blocks) == {None, *catalog.category_names}
+    assert blocks.block('Travel').text == pack_context([catalog.rows[2], catalog.rows[3]], blocks.budget).text
+    assert blocks.block('Gardening') is None
+
+
+def test_pack_reuses_a_matching_block(catalog):
+    blocks = ContextBlocks.build(catalog, budget=1500)
+    travel = blocks.pack([2, 3], 'Travel')
+    assert travel is blocks.block('Travel')
+    reordered = blocks.pack([3, 2], 'Travel')
+    assert reordered is not travel
+    assert reordered.text == pack_context([catalog.rows[3], catalog.rows[2]], 1500).text
+    other_budget = blocks.pack([2, 3], 'Travel', budget=100)
+    assert other_budget.tokens <= 100
+    assert blocks.stats() == {'blocks': len(blocks.blocks), 'hits': 1, 'misses': 2}
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from deadline import Deadline, DeadlineExceeded, LatencyWindow, hedged, hedged_sync, stage_timeout
+
+
+def test_deadline_sizes_stage_timeouts():
+    deadline = Deadline(5.0, reserve=1.0)
+    assert deadline.timeout() == pytest.approx(4.0, abs=0.05)
+    assert deadline.timeout(cap=2.0) == 2.0
+
+    expired = Deadline(0.0)
+    with pytest.raises(DeadlineExceeded):
+        expired.timeout()
+
+
+def test_stage_timeout_uses_the_bound_deadline():
+    async def run():
+        assert stage_timeout(3.0) == 3.0
+        Deadline(1.0).bind()
+        assert stage_timeout(3.0) <= 1.0
+    asyncio.run(run())
+
+
+def test_latency_window_waits_for_samples():
+    window = LatencyWindow(size=100, min_samples=10)
+    for i in range(9):
+        window.observe(float(i))
+    assert window.hedge_delay(0.9) is None
+    window.observe(9.0)
+    assert window.percentile(0.9) == 9.0
+    assert window.hedge_delay(0) is None
+
+
+def test_fast_call_is_not_hedged():
+    async def run():
+        calls = []
+
+        async def call():
+            calls.append(1)
+            return 'first'
+
+        assert await hedged(call, delay=0.05) == 'first'
+        assert len(calls) == 1
+    asyncio.run(run())
+
+
+def test_slow_call_is_raced_and_the_loser_cancelled():
+    async def run():
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(5)
+                return 'slow'
+            except asyncio.CancelledError:
+                cancelled.append('slow')
+                raise
+
+        async def fast():
+            await asyncio.sleep(0.01)
+            return 'backup'
+
+        started = time.monotonic()
+        assert await hedged(slow, delay=0.02, backup=fast) == 'backup'
+        assert time.monotonic() - started < 1.0
+        await asyncio.sleep(0)
+        assert cancelled == ['slow']
+    asyncio.run(run())
+
+
+def test_backup_may_decline_the_hedge():
+    async def run():
+        async def slow():
+            await asyncio.sleep(0.05)
+            return 'first'
+
+        assert await hedged(slow, delay=0.01, backup=lambda: None) == 'first'
+    asyncio.run(run())
+
+
+def test_primary_error_is_raised_when_both_fail():
+    async def run():
+        async def primary():
+            await asyncio.sleep(0.02)
+            raise ValueError('primary')
+
+        async def backup():
+            raise KeyError('backup')
+
+        with pytest.raises(ValueError):
+            await hedged(primary, delay=0.01, backup=backup)
+    asyncio.run(run())
+
+
+def test_hedged_sync_takes_the_first_success():
+    release = threading.Event()
+
+    def slow():
+        release.wait(2.0)
+        return 'slow'
+
+    try:
+        assert hedged_sync(slow, delay=0.02, backup=lambda: 'backup') == 'backup'
+    finally:
+        release.set()
+
+
+def test_hedged_sync_skips_the_hedge_without_budget():
+    backups = []
+
+    def slow():
+        time.sleep(0.05)
+        return 'first'
+
+    def backup():
+        backups.append(1)
+        return 'backup'
+
+    assert hedged_sync(slow, delay=0.01, backup=backup, allow_backup=lambda: False) == 'first'
+    assert backups == []
@@ -0,0 +1,44 @@
+import pytest
+
+from intent_router import LIST, LOOKUP, IntentRouter
+
+
+def test_router_answers_list_questions(catalog):
+    router = IntentRouter(enabled=True, list_limit=10)
+    answer = router.route(catalog, 'list travel newsletters')
+    assert answer.intent == LIST and answer.rows == 2
+    # Largest first by default
+    assert answer.text.index('Jet Set Journal') < answer.text.index('Budget Traveler')
+
+
+def test_router_answers_lookups_of_one_newsletter(catalog):
+    router = IntentRouter(enabled=True)
+    answer = router.route(catalog, 'how much does Wealth Weekly cost?')
+    assert answer.intent == LOOKUP and answer.rows == 1
+    assert 'Wealth Weekly' in answer.text
+
+
+@pytest.mark.parametrize('message', [
+    'newsletters for my vegan snack brand',
+    'list newsletters',
+    'compare Wealth Weekly and Coin Desk Daily',
+    'travel newsletters under $100',
+])
+def test_router_leaves_open_questions_to_the_model(catalog, message):
+    router = IntentRouter(enabled=True)
+    assert router.route(catalog, message) is None
+    assert router.stats()['to_model'] == 1
+
+
+def test_router_counts_hits_by_intent(catalog):
+    router = IntentRouter(enabled=True)
+    router.route(catalog, 'list travel newsletters')
+    router.route(catalog, 'newsletters for my vegan snack brand')
+    stats = router.stats()
+    assert stats['routed'] == 1 and stats['hit_rate'] == 0.5
+    assert stats['intents'] == {LIST: 1, LOOKUP: 0}
+
+
+def test_disabled_router_routes_nothing(catalog):
+    router = IntentRouter(enabled=False)
+    assert router.route(catalog, 'list travel newsletters') is None
@@ -0,0 +1,38 @@
+import pytest
+
+from linker import EntityLinker, normalize_text
+
+LINKER_ARGS = (['Travel', 'Crypto'], ['Budget Traveler', 'Blind'], ['Travel', 'Crypto'])
+
+
+def test_linker_finds_categories_synonyms_and_names():
+    linker = EntityLinker(*LINKER_ARGS)
+
+    result = linker.link('any travel newsletters?')
+    assert result.category == 'Travel' and result.newsletters == []
+
+    assert linker.link('newsletters about bitcoin').category == 'Crypto'
+
+    result = linker.link('How much is Budget Traveler?')
+    assert result.newsletters == [0]
+    start, end = result.spans[0]
+    assert normalize_text('How much is Budget Traveler?')[start:end] == 'budget traveler'
+
+
+def test_linker_needs_whole_words_and_exact_case_for_dictionary_names():
+    linker = EntityLinker(*LINKER_ARGS)
+    assert linker.link('travelogue writers').categories == []
+    assert linker.link('a blind spot').newsletters == []
+    assert linker.link('sponsor Blind').newsletters == [1]
+
+
+def test_linker_ambiguity_halves_confidence():
+    linker = EntityLinker(['Travel', 'Crypto'], [], [])
+    single = linker.link('travel')
+    both = linker.link('travel and crypto')
+    assert both.confidence == pytest.approx(single.confidence / 2)
+
+
+def test_catalog_matches_categories_by_confidence(catalog):
+    assert catalog.match_category('newsletters about bitcoin') == 'Crypto'
+    assert catalog.match_category('newsletters for my vegan snack brand') is None
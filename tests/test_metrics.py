@@ -0,0 +1,43 @@
+from metrics import MetricsRegistry, PipelineMetrics, request_id
+
+
+def test_request_id_echoes_only_well_formed_ids():
+    assert request_id('abc-123') == 'abc-123'
+    assert request_id('bad id\n') != 'bad id\n'
+    assert len(request_id()) > 0
+
+
+def test_render_counters_and_histograms():
+    registry = MetricsRegistry()
+    requests = registry.counter('requests_total', "Requests.", ('outcome',))
+    latency = registry.histogram('latency_seconds', "Latency.", buckets=(0.1, 1.0))
+    requests.inc(outcome='ok')
+    requests.inc(2, outcome='error')
+    latency.observe(0.5)
+    text = registry.render()
+    assert '# TYPE requests_total counter' in text
+    assert 'requests_total{outcome="ok"} 1' in text
+    assert 'requests_total{outcome="error"} 2' in text
+    assert 'latency_seconds_bucket{le="0.1"} 0' in text
+    assert 'latency_seconds_bucket{le="1"} 1' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 1' in text
+    assert 'latency_seconds_count 1' in text
+
+
+def test_observe_request_records_every_stage():
+    metrics = PipelineMetrics()
+    metrics.observe_request('chat_stream', 'degraded', {'route': 0.5, 'retrieval': 2.0, 'total': 40.0})
+    assert metrics.requests.value(endpoint='chat_stream', outcome='degraded') == 1
+    assert metrics.stages.count(endpoint='chat_stream', stage='total') == 1
+    assert metrics.stages.count(endpoint='chat_stream', stage='retrieval') == 1
+
+
+def test_degraded_chat_keeps_its_stage_timings(main_module, client, fake_openai, monkeypatch):
+    monkeypatch.setattr(main_module, 'PIPELINE_MODE', 'retrieve')
+    monkeypatch.setattr(main_module, 'metrics', PipelineMetrics())
+    fake_openai.respond = lambda **kwargs: RuntimeError('upstream down')
+    client.post('/chat', json={'message': 'Which newsletter suits a vegan snack brand?'})
+    recorded = main_module.metrics
+    assert recorded.requests.value(endpoint='chat', outcome='degraded') == 1
+    assert recorded.stages.count(endpoint='chat', stage='retrieval') == 1
+    assert recorded.stages.count(endpoint='chat', stage='total') == 1
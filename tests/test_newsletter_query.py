@@ -0,0 +1,99 @@
+import pytest
+
+from catalog import Catalog
+from http_cache import etag_matches
+from newsletter_query import QueryError, decode_cursor, encode_cursor, handle_query, run_query
+from tests.conftest import ROWS
+
+
+def pages(catalog, params):
+    """Follow next_cursor to the end and return every page."""
+    result = run_query(catalog, params)
+    seen = [result]
+    while result['next_cursor']:
+        result = run_query(catalog, dict(params, cursor=result['next_cursor']))
+        seen.append(result)
+    return seen
+
+
+def test_cursor_round_trip(catalog):
+    params = {'sort': '-subscribers'}
+    cursor = encode_cursor(catalog, params, 4)
+    assert decode_cursor(catalog, dict(params, cursor=cursor, limit='2'), cursor) == 4
+
+
+def test_paging_visits_every_row_once_in_order(catalog):
+    results = pages(catalog, {'sort': '-subscribers', 'limit': '4', 'fields': 'id'})
+    assert [r['count'] for r in results] == [4, 2]
+    assert all(r['total'] == len(ROWS) for r in results)
+    ids = [item['id'] for r in results for item in r['items']]
+    assert ids == ['n1', 'n4', 'n5', 'n2', 'n6', 'n3']
+
+
+def test_page_size_may_change_between_pages(catalog):
+    first = run_query(catalog, {'limit': '2', 'fields': 'id'})
+    second = run_query(catalog, {'limit': '3', 'fields': 'id', 'cursor': first['next_cursor']})
+    assert [item['id'] for item in second['items']] == ['n3', 'n4', 'n5']
+
+
+def test_cursor_from_another_query_is_rejected(catalog):
+    cursor = run_query(catalog, {'limit': '1'})['next_cursor']
+    with pytest.raises(QueryError) as error:
+        run_query(catalog, {'limit': '1', 'category': 'Travel', 'cursor': cursor})
+    assert error.value.status == 400
+
+
+def test_cursor_from_another_catalog_version_conflicts(catalog):
+    cursor = run_query(catalog, {'limit': '1'})['next_cursor']
+    changed = Catalog([dict(row) for row in ROWS], version='next-version')
+    status, _, body = handle_query(changed, {'limit': '1', 'cursor': cursor})
+    assert status == 409
+    assert 'restart' in body['error']
+
+
+@pytest.mark.parametrize('cursor', ['not-base64!', 'e30', 'eyJvIjoiYSJ9'])
+def test_malformed_cursor(catalog, cursor):
+    status, headers, body = handle_query(catalog, {'cursor': cursor})
+    assert status == 400
+    assert headers['Cache-Control'] == 'no-store'
+
+
+def test_etag_revalidation(catalog):
+    params = {'category': 'Travel'}
+    status, headers, body = handle_query(catalog, params)
+    assert status == 200 and body['total'] == 2
+    etag = headers['ETag']
+
+    assert handle_query(catalog, params, if_none_match=etag)[0] == 304
+    assert handle_query(catalog, params, if_none_match=f'"other", W/{etag}')[0] == 304
+    # Another query, or the same query against a new catalog version, gets a new tag
+    assert handle_query(catalog, {'category': 'Crypto'}, if_none_match=etag)[0] == 200
+    changed = Catalog([dict(row) for row in ROWS], version='next-version')
+    assert handle_query(changed, params, if_none_match=etag)[0] == 200
+
+
+def test_etag_ignores_parameter_order(catalog):
+    first = handle_query(catalog, {'category': 'Travel', 'sort': 'price'})[1]['ETag']
+    second = handle_query(catalog, {'sort': 'price', 'category': 'Travel'})[1]['ETag']
+    assert first == second
+
+
+def test_etag_matches():
+    assert etag_matches('*', '"a"')
+    assert etag_matches('"b", "a"', '"a"')
+    assert not etag_matches(None, '"a"')
+    assert not etag_matches('"b"', '"a"')
+
+
+@pytest.mark.parametrize('params', [{'max_price': 'abc'}, {'min_subscribers': '1e400'},
+                                    {'filter': 'price<=abc'}, {'sort': 'name'}, {'fields': 'password'}])
+def test_invalid_parameters(catalog, params):
+    assert handle_query(catalog, params)[0] == 400
+
+
+def test_projection_and_numeric_fields(catalog):
+    result = run_query(catalog, {'category': 'Travel', 'fields': 'name,price,price_usd', 'sort': 'price'})
+    assert result['items'] == [
+        {'name': 'Budget Traveler', 'price': '$450', 'price_usd': 450.0},
+        {'name': 'Jet Set Journal', 'price': 'Upon Request', 'price_usd': None},
+    ]
@@ -0,0 +1,171 @@
+import asyncio
+import time
+
+import pytest
+
+from rate_limiter import AsyncTokenBucket, RateLimitTimeout, TokenBudget
+from shared_state import SQLiteState
+
+
+@pytest.fixture(params=['local', 'sqlite'])
+def make_bucket(request, tmp_path):
+    """Buckets backed by per-process state or by one SQLite file they all share."""
+    state = SQLiteState(str(tmp_path / 'state.db')) if request.param == 'sqlite' else None
+
+    def make(capacity=100, refill_per_second=1000.0):
+        return AsyncTokenBucket(capacity, refill_per_second, state=state)
+    return make
+
+
+async def settle():
+    """Let store adjustments running in worker threads land."""
+    for _ in range(50):
+        await asyncio.sleep(0.002)
+
+
+def test_acquire_takes_from_a_full_bucket(make_bucket):
+    async def run():
+        bucket = make_bucket(refill_per_second=0.001)
+        reservation = await bucket.acquire(60)
+        assert reservation.tokens == 60 and reservation.waited == 0
+        assert bucket.available() == pytest.approx(40, abs=0.1)
+    asyncio.run(run())
+
+
+def test_reconcile_refunds_overestimates_and_charges_overruns(make_bucket):
+    async def run():
+        bucket = make_bucket(refill_per_second=0.001)
+        first = await bucket.acquire(50)
+        bucket.reconcile(first, 20)
+        await settle()
+        assert bucket.available() == pytest.approx(80, abs=0.1)
+
+        second = await bucket.acquire(30)
+        bucket.reconcile(second, 90)
+        await settle()
+        assert bucket.available() == pytest.approx(-10, abs=0.1)
+        assert bucket.stats()['actual_tokens'] == 110
+    asyncio.run(run())
+
+
+def test_reservations_settle_once(make_bucket):
+    async def run():
+        bucket = make_bucket(refill_per_second=0.001)
+        reservation = await bucket.acquire(40)
+        bucket.release(reservation)
+        bucket.release(reservation)
+        bucket.reconcile(reservation, 100)
+        await settle()
+        assert bucket.available() == pytest.approx(100, abs=0.1)
+    asyncio.run(run())
+
+
+def test_try_acquire_never_waits(make_bucket):
+    async def run():
+        bucket = make_bucket(refill_per_second=0.001)
+        assert bucket.try_acquire(70) is not None
+        assert bucket.try_acquire(70) is None
+        assert bucket.available() == pytest.approx(30, abs=0.1)
+    asyncio.run(run())
+
+
+def test_requests_larger_than_the_bucket_are_capped(make_bucket):
+    async def run():
+        bucket = make_bucket(refill_per_second=0.001)
+        reservation = await bucket.acquire(500)
+        assert reservation.tokens == 100
+    asyncio.run(run())
+
+
+def test_waiters_are_served_in_order_as_tokens_refill(make_bucket):
+    async def run():
+        bucket = make_bucket(capacity=100, refill_per_second=2000.0)
+        await bucket.acquire(100)
+        granted = []
+
+        async def wait(name, tokens):
+            reservation = await bucket.acquire(tokens, timeout=2.0)
+            granted.append(name)
+            return reservation
+
+        started = time.monotonic()
+        reservations = await asyncio.gather(wait('large', 80), wait('small', 10), wait('last', 10))
+        assert granted == ['large', 'small', 'last']
+        # 100 tokens at 2000/s
+        assert time.monotonic() - started >= 0.04
+        assert all(r.waited > 0 for r in reservations)
+    asyncio.run(run())
+
+
+def test_refund_wakes_a_waiter_early(make_bucket):
+    async def run():
+        bucket = make_bucket(capacity=100, refill_per_second=1.0)
+        held = await bucket.acquire(100)
+        waiter = asyncio.ensure_future(bucket.acquire(50, timeout=60.0))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        bucket.release(held)
+        reservation = await asyncio.wait_for(waiter, 2.0)
+        assert reservation.tokens == 50
+    asyncio.run(run())
+
+
+def test_deadline_that_cannot_be_met_fails_fast(make_bucket):
+    async def run():
+        bucket = make_bucket(capacity=100, refill_per_second=10.0)
+        await bucket.acquire(100)
+        started = time.monotonic()
+        with pytest.raises(RateLimitTimeout):
+            await bucket.acquire(50, timeout=1.0)
+        assert time.monotonic() - started < 0.5
+        assert bucket.stats()['timeouts'] == 1
+    asyncio.run(run())
+
+
+def test_queued_caller_fails_fast_without_blocking_the_queue(make_bucket):
+    async def run():
+        bucket = make_bucket(capacity=100, refill_per_second=200.0)
+        await bucket.acquire(100)
+        ahead = asyncio.ensure_future(bucket.acquire(100, timeout=5.0))
+        await asyncio.sleep(0.005)
+        started = time.monotonic()
+        with pytest.raises(RateLimitTimeout):
+            await bucket.acquire(50, timeout=0.3)
+        assert time.monotonic() - started < 0.2
+        assert (await asyncio.wait_for(ahead, 2.0)).tokens == 100
+        assert bucket.stats()['queue_depth'] == 0
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_queue(make_bucket):
+    async def run():
+        bucket = make_bucket(capacity=100, refill_per_second=1000.0)
+        await bucket.acquire(100)
+        cancelled = asyncio.ensure_future(bucket.acquire(100, timeout=5.0))
+        await asyncio.sleep(0.005)
+        cancelled.cancel()
+        reservation = await bucket.acquire(20, timeout=2.0)
+        assert reservation.tokens == 20
+        assert bucket.stats()['queue_depth'] == 0
+    asyncio.run(run())
+
+
+def test_shared_state_is_one_budget_across_buckets(tmp_path):
+    async def run():
+        state = SQLiteState(str(tmp_path / 'state.db'))
+        first = AsyncTokenBucket(100, 0.001, state=state)
+        second = AsyncTokenBucket(100, 0.001, state=state)
+        await first.acquire(70)
+        assert second.try_acquire(70) is None
+        assert second.available() == pytest.approx(30, abs=0.1)
+    asyncio.run(run())
+
+
+def test_token_budget():
+    budget = TokenBudget(100, 0.001)
+    assert budget.try_spend(60)
+    assert not budget.try_spend(60)
+    budget.spend(60)
+    assert budget.available() == pytest.approx(-20, abs=0.1)
+    budget.spend(-500)
+    assert budget.available() == pytest.approx(100, abs=0.1)
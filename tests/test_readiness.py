@@ -0,0 +1,104 @@
+import threading
+import time
+
+from readiness import ClientReadiness, StartupReport
+
+
+def wait_for_check(readiness):
+    readiness._thread.join(2.0)
+
+
+def test_validation_runs_in_the_background():
+    release = threading.Event()
+    readiness = ClientReadiness(lambda: release.wait(2.0))
+    readiness.start()
+    status = readiness.status()
+    assert not status['ready'] and status['state'] == 'checking'
+    release.set()
+    wait_for_check(readiness)
+    status = readiness.status()
+    assert status['ready'] and status['state'] == 'ready' and status['error'] is None
+    assert status['check_duration_ms'] is not None
+
+
+def test_successful_check_is_cached_for_its_ttl():
+    calls = []
+    readiness = ClientReadiness(lambda: calls.append(1), ttl=60.0)
+    readiness.start()
+    wait_for_check(readiness)
+    for _ in range(5):
+        assert readiness.status()['ready']
+    assert len(calls) == 1
+
+
+def test_failed_check_reports_the_error_and_retries():
+    attempts = []
+
+    def validator():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ValueError('bad key')
+
+    readiness = ClientReadiness(validator, failure_ttl=0.0)
+    readiness.start()
+    wait_for_check(readiness)
+    time.sleep(0.001)
+    status = readiness.status()
+    assert status == dict(status, ready=False, state='unavailable', error='bad key')
+    # That status call found the failure stale and started a new check
+    wait_for_check(readiness)
+    assert readiness.status()['ready']
+    assert len(attempts) == 2
+
+
+def test_start_is_a_no_op_while_a_check_runs():
+    release = threading.Event()
+    calls = []
+
+    def validator():
+        calls.append(1)
+        release.wait(2.0)
+
+    readiness = ClientReadiness(validator)
+    readiness.start()
+    readiness.start()
+    release.set()
+    wait_for_check(readiness)
+    assert len(calls) == 1
+
+
+def test_startup_report_accumulates_stages():
+    report = StartupReport()
+    with report.stage('load'):
+        time.sleep(0.002)
+    with report.stage('load'):
+        time.sleep(0.002)
+    report.record('index', 0.0015)
+    report.finish()
+    stages = report.as_dict()
+    assert stages['load'] >= 4.0
+    assert stages['index'] == 1.5
+    assert stages['total'] >= stages['load']
+    assert report.summary().startswith('load=')
+
+
+def test_ready_endpoint_reflects_the_cached_check(main_module, client, monkeypatch):
+    release = threading.Event()
+    readiness = ClientReadiness(lambda: release.wait(2.0))
+    monkeypatch.setattr(main_module, 'client_readiness', readiness)
+
+    response = client.get('/api/ready')
+    assert response.status_code == 503
+    assert response.json()['state'] == 'checking'
+
+    release.set()
+    wait_for_check(readiness)
+    response = client.get('/api/ready')
+    assert response.status_code == 200
+    body = response.json()
+    assert body['catalog_rows'] == len(main_module.catalog_manager.current)
+    assert 'snapshot_load' in body['startup_ms'] or 'csv_load' in body['startup_ms']
+
+
+def test_health_never_depends_on_the_model(client):
+    assert client.get('/api/health').json()['status'] == 'ok'
@@ -0,0 +1,46 @@
+import pytest
+
+from records import CodedColumn, RecordStore, StringColumn, encode_column
+from tests.conftest import ROWS
+
+
+def test_string_column_round_trips_unicode():
+    values = ['Café Weekly', '', None, 'Jet Set — Journal']
+    column = StringColumn.from_values(values)
+    assert [column[i] for i in range(len(column))] == ['Café Weekly', '', '', 'Jet Set — Journal']
+
+
+def test_low_cardinality_columns_are_dictionary_encoded():
+    categories = ['Travel', 'Finance'] * 8
+    column = encode_column(categories)
+    assert isinstance(column, CodedColumn)
+    assert column.values == ['Travel', 'Finance']
+    assert [column[i] for i in range(len(column))] == categories
+    assert isinstance(encode_column([f'name {i}' for i in range(16)]), StringColumn)
+
+
+def test_records_read_through_to_the_columns():
+    extra = [dict(row, **{'Owner Email': 'owner@example.com'}) for row in ROWS]
+    store = RecordStore.from_rows(extra)
+    assert len(store) == len(ROWS)
+    assert 'Owner Email' not in store.columns
+    record = store[1]
+    assert record['Newsletter Name'] == 'Wealth Weekly'
+    assert record.get('Missing Column', 'n/a') == 'n/a'
+    # Columns absent from a row read as empty
+    assert store[3]['CPC Avg'] == ''
+    assert dict(store[-1]) == {name: ROWS[-1].get(name, '') for name in store.columns}
+    assert [r['ID'] for r in store[1:3]] == ['n2', 'n3']
+    with pytest.raises(IndexError):
+        store[len(ROWS)]
+
+
+def test_sections_round_trip():
+    rows = [dict(row, ID=f"{row['ID']}-{copy}") for copy in range(5) for row in ROWS]
+    store = RecordStore.from_rows(rows)
+    sections = store.sections()
+    restored = RecordStore.from_sections(store.layout(), sections.__getitem__, len(store))
+    assert restored.layout() == store.layout()
+    assert store.layout()['ID'] == 'string' and store.layout()['Category'] == 'coded'
+    assert [dict(r) for r in restored] == [dict(r) for r in store]
+    assert restored.nbytes == store.nbytes
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from response_cache import ResponseCache, cache_key, normalize_message
+from shared_state import SQLiteState
+from tests.conftest import completion
+
+
+def test_normalize_message():
+    assert normalize_message('  Best FINANCE newsletters?!  ') == 'best finance newsletters'
+    assert normalize_message('Under $2,000.') == 'under $2,000'
+
+
+def test_cache_key_parts():
+    history = [{'role': 'user', 'content': 'Hi'}]
+    key = cache_key('Best finance newsletters?', 'Finance', history, 'v1')
+    assert key == cache_key('best finance   newsletters', 'Finance', [{'role': 'user', 'content': 'hi!'}], 'v1')
+    assert key != cache_key('best finance newsletters', None, history, 'v1')
+    assert key != cache_key('best finance newsletters', 'Finance', None, 'v1')
+    assert key != cache_key('best finance newsletters', 'Finance', history, 'v2')
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.set('a', 'A')
+    cache.set('b', 'B')
+    assert cache.get('a') == 'A'
+    cache.set('c', 'C')
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == ('A', 'C')
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_their_ttl():
+    cache = ResponseCache(ttl=0.01)
+    cache.set('a', 'A')
+    assert cache.get('a') == 'A'
+    time.sleep(0.02)
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expirations']) == (1, 1, 1)
+
+
+def test_new_catalog_version_drops_every_entry():
+    cache = ResponseCache()
+    cache.sync_version('v1')
+    cache.set('a', 'A')
+    cache.sync_version('v1')
+    assert cache.get('a') == 'A'
+    cache.sync_version('v2')
+    assert cache.get('a') is None
+    assert cache.stats()['invalidations'] == 1
+
+
+@pytest.fixture
+def retrieve_mode(main_module, monkeypatch):
+    monkeypatch.setattr(main_module, 'PIPELINE_MODE', 'retrieve')
+
+
+@pytest.mark.usefixtures('retrieve_mode')
+def test_answers_are_cached_for_the_next_asker(client, fake_openai):
+    fake_openai.respond = lambda **kwargs: completion('Try Morning Brew.')
+    message = {'message': 'Which newsletter suits a coffee subscription brand?'}
+    assert client.post('/chat', json=message).json()['response'] == 'Try Morning Brew.'
+    assert client.post('/chat', json=message).json()['response'] == 'Try Morning Brew.'
+    assert len(fake_openai.calls) == 1
+
+
+@pytest.mark.usefixtures('retrieve_mode')
+@pytest.mark.parametrize('text', ['', '  \n'])
+def test_empty_answers_are_not_cached(client, fake_openai, text):
+    fake_openai.respond = lambda **kwargs: completion(text)
+    message = {'message': 'Which newsletter suits a tea subscription brand?'}
+    client.post('/chat', json=message)
+    client.post('/chat', json=message)
+    assert len(fake_openai.calls) == 2
+
+
+def test_shared_cache_is_one_cache_across_instances(tmp_path):
+    state = SQLiteState(str(tmp_path / 'state.db'))
+    first, second = ResponseCache(state=state), ResponseCache(state=state)
+    for cache in (first, second):
+        cache.sync_version('v1')
+    first.set('a', 'A')
+    assert second.get('a') == 'A'
+    second.sync_version('v2')
+    first.sync_version('v2')
+    assert first.get('a') is None
+
+
+def test_async_access_runs_store_calls_off_the_event_loop(tmp_path):
+    state = SQLiteState(str(tmp_path / 'state.db'))
+    cache = ResponseCache(state=state)
+    cache.sync_version('v1')
+    threads = []
+    for name in ('cache_get', 'cache_set'):
+        call = getattr(state, name)
+
+        def record(*args, call=call, **kwargs):
+            threads.append(threading.current_thread())
+            return call(*args, **kwargs)
+        setattr(state, name, record)
+
+    async def run():
+        await cache.set_async('a', 'A')
+        return await cache.get_async('a')
+
+    assert asyncio.run(run()) == 'A'
+    assert len(threads) == 2 and threading.main_thread() not in threads
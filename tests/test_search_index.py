@@ -0,0 +1,41 @@
+from search_index import SearchIndex, tokenize
+from tests.conftest import ROWS
+
+
+def test_tokenize_drops_stopwords():
+    assert tokenize('Show me the best newsletters for Investors!') == tokenize('investors')
+    assert tokenize(None) == []
+
+
+def test_bm25_ranks_name_hits_above_audience_hits():
+    rows = [
+        {'Newsletter Name': 'Daily Digest', 'Category': 'News', 'Audience Info': 'Readers who love travel deals.'},
+        {'Newsletter Name': 'Travel Weekly', 'Category': 'News', 'Audience Info': 'A weekly roundup.'},
+        {'Newsletter Name': 'Garden Notes', 'Category': 'Home', 'Audience Info': 'Gardeners.'},
+    ]
+    index = SearchIndex(rows)
+    ranked = index.search('travel')
+    assert [doc_id for doc_id, _ in ranked] == [1, 0]
+    assert index.search('travel', category='Home') == []
+    assert index.search('unrelated words') == []
+
+
+def test_bm25_rare_terms_outweigh_common_ones():
+    index = SearchIndex([dict(row) for row in ROWS])
+    scores = index.score('flights hostels')
+    # Only Budget Traveler mentions hostels, both travel rows mention flights
+    assert max(scores, key=scores.get) == 2
+    assert set(scores) == {2, 3}
+
+
+def test_search_is_limited_to_top_k():
+    index = SearchIndex([dict(row) for row in ROWS])
+    assert len(index.search('newsletter daily news investors traders developers', top_k=2)) == 2
+
+
+def test_restored_index_scores_like_the_original():
+    index = SearchIndex([dict(row) for row in ROWS])
+    restored = SearchIndex.from_arrays(index.categories, index.terms, index.offsets, index.doc_ids,
+                                       index.weights, index.idf, fields=index.fields, k1=index.k1, b=index.b)
+    assert restored.score('bitcoin traders') == index.score('bitcoin traders')
+    assert restored.search('flights', category='Travel') == index.search('flights', category='Travel')
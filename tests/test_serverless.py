@@ -0,0 +1,77 @@
+import importlib.util
+import io
+import os
+import urllib.error
+
+import pytest
+
+API_INDEX = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api', 'index.py')
+
+
+@pytest.fixture(scope='module')
+def serverless():
+    """The serverless handler module, loaded once from its file."""
+    os.environ.setdefault('OPENAI_API_KEY', 'sk-test')
+    spec = importlib.util.spec_from_file_location('serverless_index', API_INDEX)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeResponse(io.BytesIO):
+    """An urlopen response whose reads may fail."""
+
+    def __init__(self, body: bytes, fail_on_read: bool = False):
+        super().__init__(body)
+        self.fail_on_read = fail_on_read
+
+    def __iter__(self):
+        if self.fail_on_read:
+            raise TimeoutError('read timed out')
+        return super().__iter__()
+
+
+@pytest.fixture
+def budget(serverless, monkeypatch):
+    from rate_limiter import TokenBudget
+    budget = TokenBudget(100000, 0.001)
+    monkeypatch.setattr(serverless, 'LLM_BUDGET', budget)
+    return budget
+
+
+def test_stream_that_cannot_connect_is_refunded(serverless, budget, monkeypatch):
+    def urlopen(req, timeout=None):
+        raise urllib.error.URLError('connection refused')
+    monkeypatch.setattr(serverless.urllib.request, 'urlopen', urlopen)
+    with pytest.raises(urllib.error.URLError):
+        list(serverless.stream_openai_api('Any travel newsletters?'))
+    assert budget.available() == pytest.approx(100000, abs=1)
+
+
+def test_stream_failing_on_its_first_read_is_refunded(serverless, budget, monkeypatch):
+    opened = []
+
+    def urlopen(req, timeout=None):
+        opened.append(FakeResponse(b'', fail_on_read=True))
+        return opened[-1]
+    monkeypatch.setattr(serverless.urllib.request, 'urlopen', urlopen)
+    with pytest.raises(TimeoutError):
+        list(serverless.stream_openai_api('Any travel newsletters?'))
+    assert budget.available() == pytest.approx(100000, abs=1)
+    assert opened[0].closed
+
+
+def test_finished_stream_is_charged_its_usage(serverless, budget, monkeypatch):
+    body = (b'data: {"choices": [{"delta": {"content": "Try "}}]}\n\n'
+            b'data: {"choices": [{"delta": {"content": "Budget Traveler."}}]}\n\n'
+            b'data: {"choices": [], "usage": {"prompt_tokens": 300, "completion_tokens": 20, "total_tokens": 320}}\n\n'
+            b'data: [DONE]\n\n')
+    opened = []
+
+    def urlopen(req, timeout=None):
+        opened.append(FakeResponse(body))
+        return opened[-1]
+    monkeypatch.setattr(serverless.urllib.request, 'urlopen', urlopen)
+    assert list(serverless.stream_openai_api('Any travel newsletters?')) == ['Try ', 'Budget Traveler.']
+    assert budget.available() == pytest.approx(100000 - 320, abs=1)
+    assert opened[0].closed
@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+from sessions import SessionStore, gist
+from shared_state import SQLiteState
+from tests.conftest import completion
+
+ANSWER = '''Here are some options:
+1. **Morning Brew** - 4M subscribers, $25,000 per send
+2. **Wealth Weekly**: 250k subscribers, $2,000 per send
+
+Keep in mind these subscriber numbers and starting prices are approximate.'''
+
+
+def test_gist():
+    assert gist('user', 'Which   finance newsletters are cheapest?') == 'User asked: Which finance newsletters are cheapest?'
+    assert gist('assistant', ANSWER) == 'Assistant listed: Morning Brew, Wealth Weekly'
+    assert gist('assistant', 'I could not find one. Try another category.') == 'Assistant: I could not find one.'
+    assert gist('user', 'word ' * 100, limit=20).endswith('…')
+
+
+def test_sessions_are_resumed_by_id():
+    store = SessionStore()
+    session = store.get(None)
+    store.record(session, 'Hi', 'Hello!')
+    assert store.get(session.session_id) is session
+    assert session.history() == [{'role': 'user', 'content': 'Hi'}, {'role': 'assistant', 'content': 'Hello!'}]
+    assert store.get('unknown').session_id != 'unknown'
+
+
+def test_old_turns_are_folded_into_the_summary():
+    store = SessionStore(history_budget=40, keep_recent=2)
+    session = store.get(None)
+    for i in range(4):
+        store.record(session, f'Question number {i} about finance newsletters?', ANSWER)
+    history = session.history()
+    assert len(session.turns) == 2
+    assert history[0]['role'] == 'system'
+    assert 'User asked: Question number 0' in history[0]['content']
+    assert 'Assistant listed: Morning Brew, Wealth Weekly' in history[0]['content']
+    assert history[1:] == session.turns
+    assert store.stats()['compactions'] > 0
+
+
+def test_summary_rolls_within_its_budget():
+    store = SessionStore(history_budget=10, keep_recent=2, summary_budget=30)
+    session = store.get(None)
+    for i in range(20):
+        store.record(session, f'Question {i} about travel newsletters for backpackers?', ANSWER)
+    assert 1 <= len(session.summary) < 20
+    assert 'Question 0 ' not in '\n'.join(session.summary)
+
+
+def test_seed_adopts_history_only_once():
+    store = SessionStore()
+    session = store.get(None)
+    store.seed(session, [{'role': 'user', 'content': 'Hi'}, {'role': 'system', 'content': 'x'},
+                         {'role': 'assistant', 'content': 'Hello!'}])
+    store.seed(session, [{'role': 'user', 'content': 'Ignored'}])
+    assert [turn['content'] for turn in session.turns] == ['Hi', 'Hello!']
+
+
+def test_least_recently_used_session_is_evicted():
+    store = SessionStore(max_sessions=2)
+    first, second = store.get(None), store.get(None)
+    store.get(first.session_id)
+    store.get(None)
+    assert store.get(second.session_id).session_id != second.session_id
+    assert store.stats()['evictions'] >= 1
+
+
+def test_idle_sessions_expire():
+    store = SessionStore(ttl=0.01)
+    session = store.get(None)
+    time.sleep(0.02)
+    assert store.get(session.session_id).session_id != session.session_id
+    assert store.stats()['expirations'] == 1
+
+
+def test_chat_sends_the_session_history(main_module, client, fake_openai, monkeypatch):
+    monkeypatch.setattr(main_module, 'PIPELINE_MODE', 'retrieve')
+    fake_openai.respond = lambda **kwargs: completion(ANSWER)
+    first = client.post('/chat', json={'message': 'Which newsletters reach pet owners?'}).json()
+    client.post('/chat', json={'message': 'Which of those is cheapest?', 'session_id': first['session_id']})
+    sent = fake_openai.calls[-1]['messages']
+    assert {'role': 'user', 'content': 'Which newsletters reach pet owners?'} in sent
+    assert {'role': 'assistant', 'content': ANSWER} in sent
+
+
+def test_shared_sessions_resume_on_another_worker(tmp_path):
+    state = SQLiteState(str(tmp_path / 'state.db'))
+    first, second = SessionStore(state=state), SessionStore(state=state)
+
+    async def run():
+        session = await first.get_async(None)
+        await first.record_async(session, 'Hi', 'Hello!')
+        resumed = await second.get_async(session.session_id)
+        await second.record_async(resumed, 'Any travel newsletters?', ANSWER)
+        return session.session_id, await first.get_async(session.session_id)
+
+    session_id, latest = asyncio.run(run())
+    assert latest.session_id == session_id
+    assert [turn['content'] for turn in latest.turns] == ['Hi', 'Hello!', 'Any travel newsletters?', ANSWER]
+    assert first.stats()['sessions'] == 1
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_producer():
+    async def run():
+        group = SingleFlight()
+        calls = 0
+
+        async def producer():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return 'answer'
+
+        results = await asyncio.gather(*(group.do('key', producer) for _ in range(5)))
+        assert results == ['answer'] * 5
+        assert calls == 1
+        assert group.stats() == {'in_flight': 0, 'started': 1, 'coalesced': 4}
+    asyncio.run(run())
+
+
+def test_different_keys_do_not_coalesce():
+    async def run():
+        group = SingleFlight()
+
+        async def producer(value):
+            await asyncio.sleep(0.005)
+            return value
+
+        results = await asyncio.gather(group.do('a', lambda: producer('a')), group.do('b', lambda: producer('b')))
+        assert results == ['a', 'b']
+        assert group.stats()['started'] == 2
+    asyncio.run(run())
+
+
+def test_a_caller_leaving_does_not_cancel_the_others():
+    async def run():
+        group = SingleFlight()
+        release = asyncio.Event()
+
+        async def producer():
+            await release.wait()
+            return 'answer'
+
+        leaver = asyncio.ensure_future(group.do('key', producer))
+        stayer = asyncio.ensure_future(group.do('key', producer))
+        await asyncio.sleep(0)
+        leaver.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        assert await stayer == 'answer'
+        assert leaver.cancelled()
+    asyncio.run(run())
+
+
+def test_errors_reach_every_caller_and_the_next_call_retries():
+    async def run():
+        group = SingleFlight()
+        attempts = 0
+
+        async def producer():
+            nonlocal attempts
+            attempts += 1
+            await asyncio.sleep(0.005)
+            if attempts == 1:
+                raise RuntimeError('upstream failed')
+            return 'answer'
+
+        results = await asyncio.gather(group.do('key', producer), group.do('key', producer),
+                                       return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert await group.do('key', producer) == 'answer'
+        assert attempts == 2
+    asyncio.run(run())
+
+
+def test_followers_stream_every_published_chunk():
+    async def run():
+        group = SingleFlight()
+
+        async def producer(flight):
+            for chunk in ('a', 'b', 'c'):
+                flight.publish(chunk)
+                await asyncio.sleep(0.002)
+            return 'abc'
+
+        leader = group.join('key', producer)
+        leader_chunks = [chunk async for chunk in leader.iter_chunks()]
+        # Joined while the call ran, the follower replays what it missed first
+        flight = group.join('other', producer)
+        await asyncio.sleep(0.003)
+        follower = group.join('other', producer)
+        assert follower is flight
+        assert [chunk async for chunk in follower.iter_chunks()] == ['a', 'b', 'c']
+        assert leader_chunks == ['a', 'b', 'c']
+    asyncio.run(run())
+
+
+def test_non_streaming_result_is_yielded_whole():
+    async def run():
+        group = SingleFlight()
+
+        async def producer(flight):
+            return 'whole answer'
+
+        flight = group.join('key', producer)
+        assert [chunk async for chunk in flight.iter_chunks()] == ['whole answer']
+        assert await flight.result() == 'whole answer'
+    asyncio.run(run())
+
+
+def test_cancelled_flight_fails_its_callers():
+    async def run():
+        group = SingleFlight()
+
+        async def producer(flight):
+            await asyncio.sleep(10)
+
+        flight = group.join('key', producer)
+        waiter = asyncio.ensure_future(flight.result())
+        await asyncio.sleep(0)
+        flight.task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert group.stats()['in_flight'] == 0
+    asyncio.run(run())
@@ -0,0 +1,88 @@
+import json
+import os
+
+import pytest
+
+from catalog import Catalog, CatalogFilter, read_csv_rows, source_digest
+from readiness import StartupReport
+from snapshot import PREAMBLE, build_snapshot, default_snapshot_path, load_catalog, load_snapshot
+from tests.conftest import ROWS, write_csv
+
+
+@pytest.fixture
+def snapshot_path(csv_path):
+    return build_snapshot(csv_path)
+
+
+def test_snapshot_matches_the_csv(csv_path, snapshot_path):
+    parsed = Catalog(read_csv_rows(csv_path), version=source_digest(csv_path))
+    loaded = load_snapshot(snapshot_path, expected_digest=source_digest(csv_path))
+    assert loaded is not None
+    assert loaded.version == parsed.version
+    assert len(loaded) == len(ROWS)
+    assert loaded.category_names == parsed.category_names
+    assert [dict(row) for row in loaded.rows] == [dict(row) for row in parsed.rows]
+
+    criteria = CatalogFilter(min_subscribers=100e3, sort_by='price')
+    assert loaded.filter(criteria).tolist() == parsed.filter(criteria).tolist()
+    assert loaded.index.search('cheap flights') == pytest.approx(parsed.index.search('cheap flights'))
+    assert loaded.search('bitcoin traders') == parsed.search('bitcoin traders')
+
+
+def test_snapshot_carries_the_context_blocks(csv_path, snapshot_path):
+    loaded = load_snapshot(snapshot_path)
+    assert loaded._context_blocks is not None
+    built = Catalog(read_csv_rows(csv_path)).context_blocks
+    assert loaded.context_blocks.costs.tolist() == built.costs.tolist()
+    assert loaded.context_blocks.blocks == built.blocks
+
+
+def test_context_blocks_packed_under_other_settings_are_rebuilt(csv_path, snapshot_path, monkeypatch):
+    import context_packer
+    monkeypatch.setattr(context_packer, 'DEFAULT_TOKEN_BUDGET', 700)
+    loaded = load_snapshot(snapshot_path)
+    assert loaded._context_blocks is None
+    assert loaded.context_blocks.budget == 700
+
+
+def test_stale_snapshot_is_ignored(csv_path, snapshot_path):
+    write_csv(csv_path, ROWS[:3])
+    assert load_snapshot(snapshot_path, expected_digest=source_digest(csv_path)) is None
+
+    report = StartupReport()
+    catalog = load_catalog(csv_path, report=report)
+    assert len(catalog) == 3
+    assert catalog.version == source_digest(csv_path)
+    assert 'csv_load' in report.stages
+
+
+def test_fresh_snapshot_skips_the_csv_parse(csv_path, snapshot_path):
+    report = StartupReport()
+    catalog = load_catalog(csv_path, report=report)
+    assert len(catalog) == len(ROWS)
+    assert 'snapshot_load' in report.stages and 'csv_load' not in report.stages
+
+
+def test_missing_snapshot_falls_back_to_the_csv(csv_path):
+    assert not os.path.exists(default_snapshot_path(csv_path))
+    assert load_snapshot(default_snapshot_path(csv_path)) is None
+    assert len(load_catalog(csv_path)) == len(ROWS)
+
+
+@pytest.mark.parametrize('contents', [b'', b'NOTASNAPSHOT' + b'\0' * 32, PREAMBLE.pack(b'SIDXSNAP', 1, 2) + b'{}'])
+def test_unreadable_snapshot_falls_back_to_the_csv(csv_path, contents):
+    with open(default_snapshot_path(csv_path), 'wb') as f:
+        f.write(contents)
+    assert load_snapshot(default_snapshot_path(csv_path)) is None
+    assert len(load_catalog(csv_path)) == len(ROWS)
+
+
+def test_truncated_snapshot_falls_back_to_the_csv(csv_path, snapshot_path):
+    with open(snapshot_path, 'rb') as f:
+        data = f.read()
+    _, _, header_length = PREAMBLE.unpack_from(data, 0)
+    header = json.loads(data[PREAMBLE.size:PREAMBLE.size + header_length])
+    assert header['row_count'] == len(ROWS)
+    with open(snapshot_path, 'wb') as f:
+        f.write(data[:PREAMBLE.size + header_length + 16])
+    assert len(load_catalog(csv_path)) == len(ROWS)
@@ -0,0 +1,67 @@
+import gzip
+
+import pytest
+
+import static_assets
+from static_assets import StaticAssets, parse_accept_encoding, write_precompressed
+
+PAGE = b'<html><body>' + b'<p>Newsletter sponsorships for every audience.</p>' * 200 + b'</body></html>'
+
+
+@pytest.fixture
+def frontend(tmp_path):
+    (tmp_path / 'index.html').write_bytes(PAGE)
+    return tmp_path
+
+
+def serve(frontend, accept_encoding=None, if_none_match=None):
+    assets = StaticAssets(str(frontend), {'/': 'index.html'})
+    return assets.respond('/', accept_encoding, if_none_match)
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding('gzip, br;q=0.5, identity;q=0, x;q=bad') == {
+        'gzip': 1.0, 'br': 0.5, 'identity': 0.0, 'x': 0.0}
+    assert parse_accept_encoding(None) == {}
+
+
+@pytest.mark.parametrize('accept, expected', [
+    ('gzip', 'gzip'),
+    ('br;q=0, gzip', 'gzip'),
+    ('*', 'br' if static_assets.brotli is not None else 'gzip'),
+    ('gzip;q=0', 'identity'),
+    (None, 'identity'),
+])
+def test_encoding_negotiation(frontend, accept, expected):
+    status, headers, body = serve(frontend, accept)
+    assert status == 200
+    assert headers.get('Content-Encoding', 'identity') == expected
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert headers['Content-Length'] == str(len(body))
+    if expected == 'gzip':
+        assert gzip.decompress(body) == PAGE
+
+
+def test_unknown_path():
+    assert StaticAssets('/nonexistent', {'/': 'index.html'}).respond('/') is None
+
+
+def test_matching_etag_is_answered_with_304(frontend):
+    _, headers, _ = serve(frontend, 'gzip')
+    status, headers_304, body = serve(frontend, 'gzip', headers['ETag'])
+    assert (status, body) == (304, b'')
+    assert headers_304['ETag'] == headers['ETag']
+    # Each encoding has its own ETag
+    assert serve(frontend, None, headers['ETag'])[0] == 200
+
+
+def test_precompressed_file_is_served(frontend):
+    write_precompressed(str(frontend / 'index.html'))
+    on_disk = (frontend / 'index.html.gz').read_bytes()
+    assert serve(frontend, 'gzip')[2] == on_disk
+
+
+def test_stale_precompressed_file_is_ignored(frontend):
+    (frontend / 'index.html.gz').write_bytes(gzip.compress(b'<html>old page</html>'))
+    _, _, body = serve(frontend, 'gzip')
+    assert gzip.decompress(body) == PAGE
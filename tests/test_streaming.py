@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from streaming import iter_openai_deltas, sse_event
+from tests.conftest import parse_events, stream_chunks
+
+QUESTION = 'Which newsletter suits a vegan snack brand?'
+
+
+@pytest.fixture(autouse=True)
+def retrieve_mode(main_module, monkeypatch):
+    # No category classification call, so the bucket only sees the answer
+    monkeypatch.setattr(main_module, 'PIPELINE_MODE', 'retrieve')
+
+
+def test_sse_event():
+    assert sse_event({'delta': 'hi'}) == 'data: {"delta": "hi"}\n\n'
+    assert sse_event({'response': 'hi'}, event='done') == 'event: done\ndata: {"response": "hi"}\n\n'
+
+
+def test_iter_openai_deltas_reads_content_and_usage():
+    usages = []
+    lines = [
+        b'data: {"choices": [{"delta": {"role": "assistant"}}]}',
+        b'',
+        b'data: {"choices": [{"delta": {"content": "Hello"}}]}',
+        b': keep-alive',
+        'data: {"choices": [{"delta": {"content": " there"}}]}',
+        b'data: {"choices": [], "usage": {"total_tokens": 12}}',
+        b'data: [DONE]',
+        b'data: {"choices": [{"delta": {"content": "ignored"}}]}',
+    ]
+    assert list(iter_openai_deltas(lines, usages.append)) == ['Hello', ' there']
+    assert usages == [{'total_tokens': 12}]
+
+
+def test_chat_stream_sends_deltas_then_done(main_module, client, fake_openai):
+    fake_openai.respond = lambda **kwargs: stream_chunks(['Try ', 'Morning Brew.'])
+    response = client.post('/chat/stream', json={'message': QUESTION})
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/event-stream')
+
+    events = parse_events(response.text)
+    assert events[:-1] == [('message', {'delta': 'Try '}), ('message', {'delta': 'Morning Brew.'})]
+    event, done = events[-1]
+    assert event == 'done' and done['response'] == 'Try Morning Brew.'
+    assert 'first_token' in done['timings'] and 'llm' in done['timings']
+    assert [call['stream'] for call in fake_openai.calls] == [True]
+    # The usage chunk settled the reservation
+    assert main_module.token_bucket.actual_tokens == 52
+
+
+def test_chat_stream_falls_back_to_the_catalog_before_the_first_token(main_module, client, fake_openai):
+    fake_openai.respond = lambda **kwargs: RuntimeError('upstream down')
+    events = parse_events(client.post('/chat/stream', json={'message': QUESTION}).text)
+    event, done = events[-1]
+    assert event == 'done' and done['degraded'] is True
+    # A request that never opened a stream is refunded
+    assert main_module.token_bucket.actual_tokens == 0
+    assert main_module.token_bucket.available() == pytest.approx(main_module.token_bucket.capacity, abs=1)
+
+
+def test_chat_stream_error_after_the_first_token(client, fake_openai):
+    fake_openai.respond = lambda **kwargs: stream_chunks(['Partial'], error=RuntimeError('connection reset'))
+    events = parse_events(client.post('/chat/stream', json={'message': QUESTION}).text)
+    assert events[0] == ('message', {'delta': 'Partial'})
+    assert events[-1][0] == 'error'
+
+
+def prompt_estimate(main_module, context):
+    return main_module.estimate_message_tokens(main_module.build_messages(QUESTION, context, []), 0)
+
+
+def stream_answer(main_module, context, stop_after=None):
+    """Read stream_with_context directly, closing it after `stop_after` deltas."""
+    async def run():
+        read = []
+        stream = main_module.stream_with_context(QUESTION, context, [])
+        try:
+            async for delta in stream:
+                read.append(delta)
+                if stop_after is not None and len(read) >= stop_after:
+                    break
+        finally:
+            await stream.aclose()
+        return read
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def context(main_module):
+    return main_module.prepare_context(main_module.catalog_manager.current, QUESTION, None)[0]
+
+
+def test_stream_failing_to_open_is_refunded(main_module, fake_openai, context):
+    fake_openai.respond = lambda **kwargs: ValueError('bad request')
+    with pytest.raises(ValueError):
+        stream_answer(main_module, context)
+    assert main_module.token_bucket.actual_tokens == 0
+
+
+def test_stream_failing_part_way_is_charged_the_prompt(main_module, fake_openai, context):
+    fake_openai.respond = lambda **kwargs: stream_chunks(['a', 'b'], error=RuntimeError('reset'))
+    with pytest.raises(RuntimeError):
+        stream_answer(main_module, context)
+    assert main_module.token_bucket.actual_tokens == prompt_estimate(main_module, context)
+
+
+def test_stream_closed_early_is_charged_the_prompt(main_module, fake_openai, context):
+    fake_openai.respond = lambda **kwargs: stream_chunks(['a', 'b', 'c'])
+    assert stream_answer(main_module, context, stop_after=1) == ['a']
+    assert main_module.token_bucket.actual_tokens == prompt_estimate(main_module, context)
+
+
+def test_finished_stream_is_charged_its_usage(main_module, fake_openai, context):
+    fake_openai.respond = lambda **kwargs: stream_chunks(['a', 'b', 'c'], prompt_tokens=40)
+    assert stream_answer(main_module, context) == ['a', 'b', 'c']
+    assert main_module.token_bucket.actual_tokens == 43
@@ -0,0 +1,69 @@
+import json
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+from catalog_tools import NO_RESULTS, TOOL_NAME, parse_arguments, run_tool, tool_schema
+from tests.conftest import completion
+
+QUESTION = 'Which newsletter suits a vegan snack brand?'
+
+
+def tool_call(arguments: dict, name: str = TOOL_NAME, call_id: str = 'call_1'):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+
+def test_tool_schema_lists_the_catalog_categories(catalog):
+    function = tool_schema(catalog)['function']
+    assert function['name'] == TOOL_NAME
+    assert function['parameters']['properties']['category']['enum'] == list(catalog.category_names)
+
+
+def test_parse_arguments(catalog):
+    criteria, query = parse_arguments(catalog, json.dumps(
+        {'category': 'finance', 'min_subscribers': '100k', 'max_price': 'cheap', 'sort_by': 'price',
+         'descending': True, 'query': 'retirement'}))
+    assert criteria.category == 'Finance & Investing'
+    assert criteria.min_subscribers == 100e3
+    assert criteria.max_price is None
+    assert (criteria.sort_by, criteria.descending, query) == ('price', True, 'retirement')
+    for bad in ('not json', '[1, 2]', ''):
+        criteria, query = parse_arguments(catalog, bad)
+        assert not criteria.has_constraints() and query == ''
+
+
+def test_run_tool(catalog):
+    found = run_tool(catalog, TOOL_NAME, json.dumps({'category': 'Travel', 'max_price': 1000}), 40, 1500, 'keyword')
+    assert found.rows == 1 and 'Budget Traveler' in found.text
+    none = run_tool(catalog, TOOL_NAME, json.dumps({'category': 'Travel', 'min_subscribers': 1e9}), 40, 1500, 'keyword')
+    assert none.text == NO_RESULTS
+    assert run_tool(catalog, 'delete_everything', '{}', 40, 1500, 'keyword').text == 'Unknown tool: delete_everything'
+
+
+@pytest.fixture
+def tools_mode(main_module, monkeypatch):
+    monkeypatch.setattr(main_module, 'PIPELINE_MODE', 'tools')
+
+
+@pytest.mark.usefixtures('tools_mode')
+def test_model_answers_from_the_context_in_one_call(client, fake_openai):
+    fake_openai.respond = lambda **kwargs: completion('Try Morning Brew.')
+    assert client.post('/chat', json={'message': QUESTION}).json()['response'] == 'Try Morning Brew.'
+    assert len(fake_openai.calls) == 1
+    assert fake_openai.calls[0]['tools'][0]['function']['name'] == TOOL_NAME
+
+
+@pytest.mark.usefixtures('tools_mode')
+def test_tool_call_is_run_in_process_and_answered(client, fake_openai):
+    replies = [completion(None, tool_calls=[tool_call({'category': 'Travel', 'max_price': 1000})]),
+               completion('Budget-friendly travel picks.')]
+    fake_openai.respond = lambda **kwargs: replies.pop(0)
+    assert client.post('/chat', json={'message': QUESTION}).json()['response'] == 'Budget-friendly travel picks.'
+
+    first, second = fake_openai.calls
+    assert first['tools'] and second['tools'] is openai.NOT_GIVEN
+    assistant, tool = second['messages'][-2:]
+    assert assistant['tool_calls'][0]['function']['name'] == TOOL_NAME
+    assert tool['role'] == 'tool' and tool['tool_call_id'] == 'call_1'
+    assert tool['content'].startswith('Category: Travel')